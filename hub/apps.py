@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class HubConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "hub"
+
+    def ready(self):
+        # connect the signals that keep the metadata registry up to date
+        from hub import metadata  # noqa: F401
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+
+import pandas as pd
+import pyarrow.parquet as pq
+import requests
+from mysoc_dataset import get_dataset_url
+
+TIMEOUT = 60
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadError(Exception):
+    pass
+
+
+def hash_key(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def write_atomic(path, write):
+    """
+    call write with the name of a temporary file next to path and then move
+    it into place, so readers never see a partly written file
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(dir=path.parent, suffix=path.suffix, delete=False) as f:
+        pass
+    try:
+        write(f.name)
+        os.replace(f.name, path)
+    except BaseException:
+        os.unlink(f.name)
+        raise
+
+
+class DownloadCache:
+    """
+    Remote files stored on disk by the hash of their contents, with the ETag
+    and Last-Modified of the URL they came from so they are only downloaded
+    again when they have changed. If offline, only stored files are used.
+    Data frames read from the files, and from local Excel files, are also
+    stored as parquet so they can be reloaded quickly with their types
+    """
+
+    def __init__(self, root, offline=False):
+        self.root = root
+        self.offline = offline
+
+    def metadata_path(self, url):
+        return self.root / "urls" / f"{hash_key(url)}.json"
+
+    def content_path(self, digest):
+        return self.root / "content" / digest
+
+    def frame_path(self, digest, read, kwargs):
+        options = json.dumps([read.__name__, kwargs], sort_keys=True, default=str)
+        return self.root / "frames" / f"{digest}-{hash_key(options)[:16]}.parquet"
+
+    def dataset_path(self, key):
+        return self.root / "datasets" / f"{hash_key(key)}.json"
+
+    def get_metadata(self, url):
+        path = self.metadata_path(url)
+        if not path.exists():
+            return None
+        metadata = json.loads(path.read_text())
+        if not self.content_path(metadata["sha256"]).exists():
+            return None
+        return metadata
+
+    def save_metadata(self, url, metadata):
+        write_atomic(
+            self.metadata_path(url),
+            lambda name: Path(name).write_text(json.dumps(metadata)),
+        )
+
+    def store(self, response):
+        """
+        save the body of response under its hash, returning the hash
+        """
+        sha256 = hashlib.sha256()
+        directory = self.root / "content"
+        directory.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=directory, delete=False) as f:
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    f.write(chunk)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        digest = sha256.hexdigest()
+        os.replace(f.name, self.content_path(digest))
+        return digest
+
+    def fetch(self, url, max_age=None):
+        """
+        the path of the stored copy of url, revalidated with a conditional
+        request unless it was checked less than max_age seconds ago
+        """
+        metadata = self.get_metadata(url)
+        if metadata is not None:
+            path = self.content_path(metadata["sha256"])
+            if self.offline or (
+                max_age is not None and time.time() - metadata["checked"] < max_age
+            ):
+                return path
+        elif self.offline:
+            raise DownloadError(f"{url} has not been downloaded and downloads are off")
+
+        headers = {}
+        if metadata is not None:
+            if metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+        try:
+            response = requests.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+            if metadata is None or response.status_code != 304:
+                response.raise_for_status()
+                metadata = {
+                    "url": url,
+                    "sha256": self.store(response),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+        except requests.RequestException as e:
+            if metadata is None:
+                raise DownloadError(f"could not download {url}: {e}") from e
+            # an out of date copy is better than failing the import, but say
+            # so as the data imported may be stale
+            logger.warning(
+                f"could not download {url}, using the copy checked at "
+                f"{time.ctime(metadata['checked'])}: {e}"
+            )
+            return self.content_path(metadata["sha256"])
+
+        metadata["checked"] = time.time()
+        self.save_metadata(url, metadata)
+        return self.content_path(metadata["sha256"])
+
+    def fetch_json(self, url, max_age=None):
+        return json.loads(self.fetch(url, max_age=max_age).read_bytes())
+
+    def read_df(self, digest, read, path, **kwargs):
+        """
+        the data frame read from path, which has contents with hash digest,
+        by read, or the stored parquet copy if it has been read before
+        """
+        frame_path = self.frame_path(digest, read, kwargs)
+        if frame_path.exists():
+            return pd.read_parquet(frame_path)
+
+        df = read(path, **kwargs)
+        try:
+            write_atomic(frame_path, df.to_parquet)
+        except (TypeError, ValueError):
+            # not every frame can be stored as parquet, e.g. if a column has
+            # mixed types, so those are read from the original each time
+            pass
+
+        return df
+
+    def fetch_df(self, url, max_age=None, **kwargs):
+        """
+        the data frame read from the CSV, or parquet, file at url, passing
+        kwargs on to pandas
+        """
+        path = self.fetch(url, max_age=max_age)
+        read = pd.read_parquet if url.endswith(".parquet") else pd.read_csv
+        return self.read_df(path.name, read, path, **kwargs)
+
+    def iter_excel(self, path, chunk_size, **kwargs):
+        """
+        the data frames of at most chunk_size rows in the local Excel file at
+        path, which is only parsed again if the file has changed. The stored
+        copy is read a batch at a time rather than loaded whole
+        """
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+        frame_path = self.frame_path(digest, pd.read_excel, kwargs)
+        if not frame_path.exists():
+            df = self.read_df(digest, pd.read_excel, path, **kwargs)
+            if not frame_path.exists():
+                # the frame couldn't be stored, so split the one in memory
+                for i in range(0, len(df), chunk_size):
+                    yield df.iloc[i : i + chunk_size]
+                return
+            del df
+
+        for batch in pq.ParquetFile(frame_path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    def dataset_url(self, repo_name, package_name, version_name, file_name):
+        """
+        the URL of a file in a mySociety data repository, which is looked up
+        in the repository's data.json and then remembered for offline use
+        """
+        key = "/".join([repo_name, package_name, version_name, file_name])
+        path = self.dataset_path(key)
+        if self.offline:
+            if not path.exists():
+                raise DownloadError(
+                    f"{key} has not been downloaded and downloads are off"
+                )
+            return json.loads(path.read_text())["url"]
+
+        try:
+            url = get_dataset_url(
+                repo_name=repo_name,
+                package_name=package_name,
+                version_name=version_name,
+                file_name=file_name,
+                done_survey=True,
+            )
+        except Exception as e:
+            if not path.exists():
+                raise DownloadError(f"could not find the URL of {key}: {e}") from e
+            return json.loads(path.read_text())["url"]
+
+        write_atomic(
+            path,
+            lambda name: Path(name).write_text(json.dumps({"key": key, "url": url})),
+        )
+        return url
+
+
+def get_download_cache():
+    return DownloadCache(
+        settings.DOWNLOAD_CACHE_ROOT, offline=settings.DOWNLOAD_CACHE_OFFLINE
+    )
+
+
+def fetch(url, max_age=None):
+    return get_download_cache().fetch(url, max_age=max_age)
+
+
+def fetch_json(url, max_age=None):
+    return get_download_cache().fetch_json(url, max_age=max_age)
+
+
+def fetch_df(url, max_age=None, **kwargs):
+    return get_download_cache().fetch_df(url, max_age=max_age, **kwargs)
+
+
+def fetch_dataset_df(repo_name, package_name, version_name, file_name, **kwargs):
+    cache = get_download_cache()
+    url = cache.dataset_url(repo_name, package_name, version_name, file_name)
+    return cache.fetch_df(url, **kwargs)
+
+
+def iter_excel(path, chunk_size, **kwargs):
+    return get_download_cache().iter_excel(path, chunk_size, **kwargs)
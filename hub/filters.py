@@ -1,4 +1,28 @@
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.db.models import (
+    BooleanField,
+    DateTimeField,
+    Exists,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Q,
+)
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+
+
 class Filter:
+    MATRIX_FIELDS = {
+        "date": DateTimeField,
+        "float": FloatField,
+        "int": IntegerField,
+        "bool": BooleanField,
+    }
+
     def __init__(self, dataset, query):
         self.dataset = dataset
         self.query = query
@@ -15,22 +39,122 @@ class Filter:
         else:
             return "data"
 
-    def run(self, name, comparator, value):
-        format_string = "{0}__{1}__{2}"
+    def matrix_value(self, name):
+        value = KeyTextTransform(name, "matrix__data")
+        field = self.MATRIX_FIELDS.get(self.column(), None)
+        if field is not None:
+            value = Cast(value, field())
+        return value
+
+    def run_matrix(self, name, comparator, value):
+        """
+        filter against the value for the area in the AreaMatrix rather than
+        joining to AreaData
+        """
+        alias = "matrix_{0}".format(re.sub(r"\W", "_", name))
+        query = self.query.alias(**{alias: self.matrix_value(name)})
+
         if comparator is None:
             comparator = ""
-            format_string = "{0}__{1}"
         exclude = comparator.startswith("not_")
-        kwargs = {
-            "{0}__data_type__name".format(self.dataset.table): name,
-            format_string.format(
-                self.dataset.table, self.column(), comparator.removeprefix("not_")
-            ): value,
-        }
-        if self.dataset.table == "people__persondata" and self.dataset.person_type:
-            if exclude:
-                return self.query.exclude(**kwargs).filter(
-                    personarea__person_type=self.dataset.person_type
+        comparator = comparator.removeprefix("not_")
+        lookup = "{0}__{1}".format(alias, comparator) if comparator else alias
+        if exclude:
+            # areas with no value are never excluded when filtering AreaData
+            return query.filter(
+                Q(**{"{0}__isnull".format(alias): True}) | ~Q(**{lookup: value})
+            )
+        return query.filter(**{lookup: value})
+
+    def data_type_ids(self, name):
+        return list(
+            apps.get_model("hub", "DataType")
+            .objects.filter(name=name)
+            .values_list("pk", flat=True)
+        )
+
+    def subquery(self, data_type_ids, lookup, value, person_type=None):
+        """
+        a correlated subquery matching the data rows for an area, so each
+        filter is a separate EXISTS rather than another join to the data table
+        """
+        if self.dataset.table == "areadata":
+            rows = apps.get_model("hub", "AreaData").objects.filter(area=OuterRef("pk"))
+        else:
+            # in a single filter call so both conditions apply to the same
+            # PersonArea row
+            kwargs = {"person__personarea__area": OuterRef("pk")}
+            if person_type:
+                kwargs["person__personarea__person_type"] = person_type
+            rows = apps.get_model("hub", "PersonData").objects.filter(**kwargs)
+
+        return Exists(rows.filter(**{"data_type_id__in": data_type_ids, lookup: value}))
+
+    def run(self, name, comparator, value, matrix=False, data_type_ids=None):
+        if matrix:
+            return self.run_matrix(name, comparator, value)
+
+        # matching on the ids rather than joining to DataType by name lets the
+        # planner estimate how many rows each filter matches
+        if data_type_ids is None:
+            data_type_ids = self.data_type_ids(name)
+
+        if comparator is None:
+            comparator = ""
+        exclude = comparator.startswith("not_")
+        comparator = comparator.removeprefix("not_")
+        lookup = (
+            "{0}__{1}".format(self.column(), comparator)
+            if comparator
+            else self.column()
+        )
+
+        person_type = None
+        if self.dataset.table == "people__persondata":
+            person_type = self.dataset.person_type
+
+        if exclude:
+            query = self.query.filter(~self.subquery(data_type_ids, lookup, value))
+            if person_type:
+                query = query.filter(
+                    Exists(
+                        apps.get_model("hub", "PersonArea").objects.filter(
+                            area=OuterRef("pk"), person_type=person_type
+                        )
+                    )
                 )
-            kwargs["personarea__person_type"] = self.dataset.person_type
-        return self.query.exclude(**kwargs) if exclude else self.query.filter(**kwargs)
+            return query
+
+        return self.query.filter(
+            self.subquery(data_type_ids, lookup, value, person_type)
+        )
+
+
+def compile_filters(query, filters, matrix_data_types=()):
+    """
+    apply a list of filters, as returned by FilterMixin.filters(), to an Area
+    query. Each filter becomes an EXISTS subquery, or a condition on the area
+    matrix if the data type is in it, so every extra filter narrows the set
+    of areas rather than adding another join that has to be de-duplicated
+    """
+    data_type_ids = defaultdict(list)
+    names = [f["name"] for f in filters if f["name"] not in matrix_data_types]
+    if names:
+        for name, pk in (
+            apps.get_model("hub", "DataType")
+            .objects.filter(name__in=names)
+            .values_list("name", "pk")
+        ):
+            data_type_ids[name].append(pk)
+
+    for f in filters:
+        query = f["dataset"].filter(
+            query,
+            name=f["name"],
+            comparator=f.get("comparator", None),
+            value=f["value"],
+            matrix=f["name"] in matrix_data_types,
+            data_type_ids=data_type_ids[f["name"]],
+        )
+
+    return query
@@ -0,0 +1,348 @@
+import gzip
+import json
+import os
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+
+from shapely.geometry import LineString
+
+from hub.models import Area
+
+# simplification tolerance, in degrees, for each level of detail we serve.
+# MapIt geometry has already been simplified at 0.001 so full is as imported
+DETAIL_LEVELS = {"full": 0, "medium": 0.002, "low": 0.01}
+
+FORMATS = {"geojson": "json", "topojson": "topojson"}
+
+# number of distinct values along each axis when quantizing coordinates
+QUANTIZATION = 100000
+
+# decimal places kept in coordinates rebuilt from quantized TopoJSON
+COORDINATE_PRECISION = 5
+
+
+def geometry_cache_path(area_type, detail="full", format="geojson"):
+    return settings.GEOMETRY_CACHE_ROOT / (
+        f"{area_type.code}-{detail}.{FORMATS[format]}.gz"
+    )
+
+
+def geometry_etag(path):
+    stat = path.stat()
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def write_geometry_cache(path, content):
+    """
+    write to a temporary file and then move it into place so requests being
+    served while the cache is rebuilt never see a partial file
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(dir=path.parent, delete=False) as f:
+        f.write(gzip.compress(json.dumps(content).encode(), mtime=0))
+    os.replace(f.name, path)
+
+
+def area_features(area_type):
+    """
+    the features served by ExploreGeometryJSON when there is no shader, with
+    every area given the default colour
+    """
+    features = []
+    areas = Area.objects.filter(
+        area_type=area_type, geometry__isnull=False
+    ).values_list("geometry", flat=True)
+    for geometry in areas.order_by("pk"):
+        feature = json.loads(geometry)
+        feature["properties"]["color"] = "#ed6832"
+        feature["properties"]["opacity"] = 0.7
+        features.append(feature)
+
+    return features
+
+
+def feature_collection(features):
+    return {"type": "FeatureCollection", "features": features, "properties": None}
+
+
+class Topology:
+    """
+    Quantize a list of GeoJSON polygon features and split their rings into
+    arcs, with each boundary shared between neighbouring areas stored once.
+
+    Because shared boundaries are a single arc, simplifying the arcs rather
+    than each polygon keeps neighbouring areas meeting without gaps or
+    overlaps at every level of detail.
+    """
+
+    def __init__(self, features, quantization=QUANTIZATION):
+        self.features = features
+        self.arcs = []
+        self.arc_index = {}
+
+        polygons = [self.feature_polygons(feature) for feature in features]
+        coords = [
+            point
+            for feature in polygons
+            if feature is not None
+            for polygon in feature
+            for ring in polygon
+            for point in ring
+        ]
+        if coords:
+            x0 = min(point[0] for point in coords)
+            y0 = min(point[1] for point in coords)
+            x1 = max(point[0] for point in coords)
+            y1 = max(point[1] for point in coords)
+        else:
+            x0 = y0 = x1 = y1 = 0
+        self.bbox = [x0, y0, x1, y1]
+        self.translate = [x0, y0]
+        self.scale = [
+            (x1 - x0) / (quantization - 1) or 1,
+            (y1 - y0) / (quantization - 1) or 1,
+        ]
+
+        # features with nothing left once quantized keep their original
+        # geometry and are left out of the topology
+        quantized = [
+            None if feature is None else self.quantize(feature) or None
+            for feature in polygons
+        ]
+        rings = [
+            ring
+            for feature in quantized
+            if feature is not None
+            for polygon in feature
+            for ring in polygon
+        ]
+        junctions = self.junctions(rings)
+
+        # each feature as a list of polygons, each a list of rings, each a
+        # list of arc indexes, with ~index for an arc used in reverse
+        self.geometries = []
+        for feature in quantized:
+            if feature is None:
+                self.geometries.append(None)
+                continue
+            self.geometries.append(
+                [
+                    [
+                        [self.add_arc(arc) for arc in self.cut(ring, junctions)]
+                        for ring in polygon
+                    ]
+                    for polygon in feature
+                ]
+            )
+
+    def feature_polygons(self, feature):
+        geometry = feature.get("geometry", None) or {}
+        if geometry.get("type", None) == "Polygon":
+            return [geometry["coordinates"]]
+        elif geometry.get("type", None) == "MultiPolygon":
+            return geometry["coordinates"]
+        return None
+
+    def quantize(self, polygons):
+        (sx, sy), (tx, ty) = self.scale, self.translate
+        quantized = []
+        for polygon in polygons:
+            rings = []
+            for ring in polygon:
+                points = []
+                for x, y, *_ in ring:
+                    point = (round((x - tx) / sx), round((y - ty) / sy))
+                    if not points or points[-1] != point:
+                        points.append(point)
+                if points[0] != points[-1]:
+                    points.append(points[0])
+                # rings that collapse when quantized are too small to see
+                if len(points) >= 4:
+                    rings.append(points)
+                elif not rings:
+                    break
+            if rings:
+                quantized.append(rings)
+        return quantized
+
+    def junctions(self, rings):
+        """
+        points where a boundary stops being shared by the same areas, found
+        as points whose neighbours differ between the rings they appear in
+        """
+        neighbours = {}
+        junctions = set()
+        for ring in rings:
+            n = len(ring) - 1
+            for i in range(n):
+                before = ring[i - 1] if i else ring[n - 1]
+                after = ring[i + 1]
+                pair = (before, after) if before <= after else (after, before)
+                seen = neighbours.setdefault(ring[i], pair)
+                if seen != pair:
+                    junctions.add(ring[i])
+        return junctions
+
+    def cut(self, ring, junctions):
+        points = ring[:-1]
+        starts = [i for i, point in enumerate(points) if point in junctions]
+        if not starts:
+            # start from the lowest point so that identical rings, e.g. an
+            # enclave and the hole around it, come out as the same arc
+            i = points.index(min(points))
+            points = points[i:] + points[:i]
+            return [points + [points[0]]]
+
+        points = points[starts[0] :] + points[: starts[0]]
+        points.append(points[0])
+        arcs = []
+        start = 0
+        for i in range(1, len(points)):
+            if points[i] in junctions:
+                arcs.append(points[start : i + 1])
+                start = i
+        return arcs
+
+    def add_arc(self, arc):
+        key = tuple(arc)
+        if key in self.arc_index:
+            return self.arc_index[key]
+        if key[::-1] in self.arc_index:
+            return ~self.arc_index[key[::-1]]
+        self.arc_index[key] = len(self.arcs)
+        self.arcs.append(arc)
+        return self.arc_index[key]
+
+    def arc_points(self, arcs, index):
+        return arcs[index] if index >= 0 else arcs[~index][::-1]
+
+    def simplified_arcs(self, tolerance):
+        if not tolerance:
+            return self.arcs
+
+        tolerance = tolerance / ((self.scale[0] + self.scale[1]) / 2)
+        arcs = []
+        for arc in self.arcs:
+            if len(arc) <= 2:
+                arcs.append(arc)
+                continue
+            line = LineString(arc).simplify(tolerance, preserve_topology=False)
+            arcs.append([(round(x), round(y)) for x, y in line.coords])
+
+        # small rings would collapse if simplified so keep them in full
+        for geometry in self.geometries:
+            for polygon in geometry or []:
+                for ring in polygon:
+                    points = sum(len(self.arc_points(arcs, i)) - 1 for i in ring)
+                    if points < 3:
+                        for i in ring:
+                            arcs[i if i >= 0 else ~i] = self.arcs[i if i >= 0 else ~i]
+        return arcs
+
+    def ring_coordinates(self, arcs, ring):
+        (sx, sy), (tx, ty) = self.scale, self.translate
+        points = []
+        for index in ring:
+            arc = self.arc_points(arcs, index)
+            points.extend(arc[1:] if points else arc)
+        return [
+            [
+                round(x * sx + tx, COORDINATE_PRECISION),
+                round(y * sy + ty, COORDINATE_PRECISION),
+            ]
+            for x, y in points
+        ]
+
+    def geojson(self, tolerance=0):
+        """
+        the features with their geometry rebuilt from the simplified arcs
+        """
+        arcs = self.simplified_arcs(tolerance)
+        features = []
+        for feature, geometry in zip(self.features, self.geometries):
+            feature = {**feature}
+            if geometry is not None:
+                polygons = [
+                    [self.ring_coordinates(arcs, ring) for ring in polygon]
+                    for polygon in geometry
+                ]
+                feature["geometry"] = (
+                    {"type": "Polygon", "coordinates": polygons[0]}
+                    if len(polygons) == 1
+                    else {"type": "MultiPolygon", "coordinates": polygons}
+                )
+            features.append(feature)
+        return feature_collection(features)
+
+    def topojson(self, name, tolerance=0):
+        """
+        a TopoJSON Topology with the features as a single named object, and
+        the arcs delta encoded
+        """
+        arcs = []
+        for arc in self.simplified_arcs(tolerance):
+            encoded = []
+            x0 = y0 = 0
+            for x, y in arc:
+                encoded.append([x - x0, y - y0])
+                x0, y0 = x, y
+            arcs.append(encoded)
+
+        geometries = []
+        for feature, geometry in zip(self.features, self.geometries):
+            properties = feature.get("properties", {})
+            if geometry is None:
+                geometries.append({"type": None, "properties": properties})
+            elif len(geometry) == 1:
+                geometries.append(
+                    {"type": "Polygon", "arcs": geometry[0], "properties": properties}
+                )
+            else:
+                geometries.append(
+                    {"type": "MultiPolygon", "arcs": geometry, "properties": properties}
+                )
+
+        return {
+            "type": "Topology",
+            "bbox": self.bbox,
+            "transform": {"scale": self.scale, "translate": self.translate},
+            "objects": {name: {"type": "GeometryCollection", "geometries": geometries}},
+            "arcs": arcs,
+        }
+
+
+def build_geometry_cache(area_type):
+    """
+    build the GeoJSON and TopoJSON for the area type at every level of detail
+    """
+    features = area_features(area_type)
+    write_geometry_cache(
+        geometry_cache_path(area_type, "full", "geojson"),
+        feature_collection(features),
+    )
+
+    topology = Topology(features)
+    for detail, tolerance in DETAIL_LEVELS.items():
+        write_geometry_cache(
+            geometry_cache_path(area_type, detail, "topojson"),
+            topology.topojson(area_type.code, tolerance),
+        )
+        if tolerance:
+            write_geometry_cache(
+                geometry_cache_path(area_type, detail, "geojson"),
+                topology.geojson(tolerance),
+            )
+
+
+def get_geometry_cache(area_type, detail="full", format="geojson"):
+    """
+    the path of the prebuilt geometry, or None if it hasn't been built. It's
+    built by the area imports and build_geometry_cache rather than here as
+    building it would hold up the request for every area type it's missing
+    for
+    """
+    path = geometry_cache_path(area_type, detail, format)
+    if not path.exists():
+        return None
+    return path
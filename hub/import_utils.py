@@ -1,3 +1,5 @@
+import hashlib
+import json
 from collections.abc import Generator
 from contextlib import contextmanager
 from datetime import date
@@ -7,7 +9,8 @@ from django.core.management.base import BaseCommand
 from django.db.transaction import atomic
 
 import pandas as pd
-from mysoc_dataset import get_dataset_url
+
+from hub.downloads import fetch_dataset_df
 
 council_types = {"STC": ["CTY", "LBO", "MD", "SCO", "NID", "UA", "WPA"], "DIS": ["NMD"]}
 
@@ -37,19 +40,38 @@ class BaseTransactionCommand(BaseCommand):
         return atomic_context
 
 
+def dataframe_hash(df: pd.DataFrame) -> str:
+    """
+    Return a hash of the contents of a dataframe, including its column names and index
+    """
+    sha256 = hashlib.sha256(json.dumps([str(col) for col in df.columns]).encode())
+    try:
+        sha256.update(pd.util.hash_pandas_object(df).values.tobytes())
+    except TypeError:
+        # pandas can't hash columns of lists or dicts
+        sha256.update(df.to_csv().encode())
+    return sha256.hexdigest()
+
+
+def file_hash(path) -> str:
+    """
+    Return a hash of the contents of a file
+    """
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
 @lru_cache
 def get_authority_mapping() -> pd.DataFrame:
     """
     Return a dataframe mapping different names to authority code
     """
-    url = get_dataset_url(
+    return fetch_dataset_df(
         repo_name="uk_local_authority_names_and_codes",
         package_name="uk_la_future",
         version_name="1",
         file_name="lookup_name_to_registry.csv",
-        done_survey=True,
     )
-    return pd.read_csv(url)
 
 
 @lru_cache
@@ -57,14 +79,12 @@ def get_council_df():
     """
     Return a dataframe of councils that are live or historical as of a given date
     """
-    url = get_dataset_url(
+    return fetch_dataset_df(
         repo_name="uk_local_authority_names_and_codes",
         package_name="uk_la_future",
         version_name="1",
         file_name="uk_local_authorities_future.csv",
-        done_survey=True,
     )
-    return pd.read_csv(url)
 
 
 def add_gss_codes(df: pd.DataFrame, code_column: str):
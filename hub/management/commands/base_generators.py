@@ -6,6 +6,8 @@ import pandas as pd
 from tqdm import tqdm
 
 from hub.models import Area
+from hub.postcodes import get_postcode_index
+from hub.spatial import AreaLookup
 from utils.mapit import (
     BadRequestException,
     ForbiddenException,
@@ -36,6 +38,8 @@ class BaseLatLonGeneratorCommand(BaseCommand):
     location_col = "lat_lon"
     legacy_col = "area"
     cols = ["WMC", "WMC23", "STC", "DIS"]
+    _area_lookup = None
+    _area_names = None
 
     tqdm.pandas()
 
@@ -55,25 +59,19 @@ class BaseLatLonGeneratorCommand(BaseCommand):
         if (self.uses_postcodes and not pd.isna(postcode)) or (
             not pd.isna(lat) and not pd.isna(lon)
         ):
-            areas = {}
+            if not self.uses_postcodes and self.get_area_lookup().is_available:
+                return self.lookup_locations([lat], [lon]).iloc[0]
+            if self.uses_postcodes:
+                areas = self.lookup_postcodes([postcode]).iloc[0]
+                if not areas.isna().all():
+                    return areas
+
             try:
                 mapit = MapIt()
                 if self.uses_postcodes:
                     gss_codes = mapit.postcode_point_to_gss_codes_with_type(postcode)
                 else:
                     gss_codes = mapit.wgs84_point_to_gss_codes_with_type(lon, lat)
-
-                for area_type, code in gss_codes.items():
-                    if mapit_types.get(area_type, None) is not None:
-                        if self.uses_gss:
-                            areas[mapit_types[area_type]] = code
-                        else:
-                            area = Area.objects.filter(
-                                gss=code, area_type__code=mapit_types[area_type]
-                            ).first()
-                            areas[mapit_types[area_type]] = area.name
-                    else:
-                        continue
             except (
                 NotFoundException,
                 BadRequestException,
@@ -92,13 +90,156 @@ class BaseLatLonGeneratorCommand(BaseCommand):
                 sleep(60)
                 return False
 
-            areas[self.legacy_col] = areas.get("WMC", None)
-            vals = [areas.get(t, None) for t in cols]
-            return pd.Series(vals, index=cols)
+            return self.mapit_areas(gss_codes)
         else:
             self.stderr.write(f"missing location data for row {row_name}")
             return pd.Series([None for t in cols], index=cols)
 
+    def mapit_areas(self, gss_codes):
+        """
+        the columns for the areas MapIt returned, from gss codes keyed by
+        MapIt area type
+        """
+        areas = {}
+        for area_type, code in gss_codes.items():
+            if mapit_types.get(area_type, None) is not None:
+                if self.uses_gss:
+                    areas[mapit_types[area_type]] = code
+                else:
+                    area = Area.objects.filter(
+                        gss=code, area_type__code=mapit_types[area_type]
+                    ).first()
+                    areas[mapit_types[area_type]] = area.name
+
+        cols = [self.legacy_col, *self.cols]
+        areas[self.legacy_col] = areas.get("WMC", None)
+        return pd.Series([areas.get(t, None) for t in cols], index=cols)
+
+    def get_area_lookup(self):
+        # only the area types MapIt's types are mapped to so the results are
+        # the same as from MapIt
+        if self._area_lookup is None:
+            self._area_lookup = AreaLookup(sorted(set(mapit_types.values())))
+        return self._area_lookup
+
+    def lookup_locations(self, lats, lons):
+        """
+        find the areas of many locations at once in the local spatial index,
+        with the same columns as _process_location returns
+        """
+        field = "gss" if self.uses_gss else "names"
+        areas = self.get_area_lookup().points_to_areas(lons, lats, field=field)
+        missing = [None] * len(lats)
+        areas[self.legacy_col] = areas.get("WMC", missing)
+
+        return pd.DataFrame(
+            {col: areas.get(col, missing) for col in [self.legacy_col, *self.cols]}
+        )
+
+    def get_area_names(self):
+        if self._area_names is None:
+            self._area_names = {
+                (area_type, gss): name
+                for area_type, gss, name in Area.objects.filter(
+                    area_type__code__in=self.cols
+                ).values_list("area_type__code", "gss", "name")
+            }
+        return self._area_names
+
+    def lookup_postcodes(self, postcodes):
+        """
+        find the areas of postcodes in the postcode index, with the same
+        columns as _process_location returns and no areas for postcodes that
+        aren't in the index
+        """
+        rows = []
+        for codes in get_postcode_index().lookup_many(postcodes):
+            areas = {}
+            for area_type, code in (codes or {}).items():
+                if area_type not in self.cols:
+                    continue
+                if self.uses_gss:
+                    areas[area_type] = code
+                else:
+                    areas[area_type] = self.get_area_names().get((area_type, code))
+            areas[self.legacy_col] = areas.get("WMC", None)
+            rows.append(areas)
+
+        return pd.DataFrame(rows, columns=[self.legacy_col, *self.cols])
+
+    def process_postcodes(self, df):
+        """
+        look up all the postcodes in the postcode index at once, and only
+        the ones that aren't in it in MapIt
+        """
+        postcodes = [
+            self.get_location_from_row(row).get("postcode") for _, row in df.iterrows()
+        ]
+        areas = self.lookup_postcodes(postcodes)
+        areas.index = df.index
+        missing = areas.isna().all(axis=1)
+        if missing.any():
+            areas.loc[missing] = df[missing].progress_apply(
+                lambda row: self.process_location(
+                    row_name=row[self.row_name], **self.get_location_from_row(row)
+                ),
+                axis=1,
+            )
+
+        return areas
+
+    def get_lats_lons(self, df):
+        locations = [self.get_location_from_row(row) or {} for _, row in df.iterrows()]
+        lat_lons = [location.get("lat_lon") or [None, None] for location in locations]
+        lats = pd.to_numeric(pd.Series([lat for lat, _ in lat_lons]), errors="coerce")
+        lons = pd.to_numeric(pd.Series([lon for _, lon in lat_lons]), errors="coerce")
+
+        for row_name in df[self.row_name][(lats.isna() | lons.isna()).values]:
+            self.stderr.write(f"missing location data for row {row_name}")
+
+        return lats.values, lons.values
+
+    def process_locations(self, df):
+        lats, lons = self.get_lats_lons(df)
+        areas = self.lookup_locations(lats, lons)
+        areas.index = df.index
+        return areas
+
+    def process_locations_with_mapit(self, df):
+        """
+        look up all the locations in MapIt at once, with rows that are still
+        rate limited after MapIt's retries looked up again one at a time
+        """
+        lats, lons = self.get_lats_lons(df)
+        valid = ~(pd.isna(lats) | pd.isna(lons))
+        results = iter(
+            MapIt().points_to_gss_many(
+                [(lon, lat) for lon, lat in zip(lons[valid], lats[valid])]
+            )
+        )
+
+        cols = [self.legacy_col, *self.cols]
+        rows = []
+        for i, (_, row) in enumerate(df.iterrows()):
+            result = next(results) if valid[i] else None
+            if result is None:
+                rows.append(pd.Series([None for t in cols], index=cols))
+            elif isinstance(result, RateLimitException):
+                rows.append(
+                    self.process_location(
+                        row_name=row[self.row_name], **self.get_location_from_row(row)
+                    )
+                )
+            elif isinstance(result, Exception):
+                self.stderr.write(
+                    f"Error fetching row {row[self.row_name]} with {[lats[i], lons[i]]}: {result}"
+                )
+                rows.append(pd.Series([None for t in cols], index=cols))
+            else:
+                rows.append(self.mapit_areas(result))
+
+        return pd.DataFrame(rows, index=df.index, columns=cols)
+
     def process_location(self, lat_lon=None, postcode=None, row_name=None):
         success = self._process_location(
             lat_lon=lat_lon, postcode=postcode, row_name=row_name
@@ -144,14 +285,20 @@ class BaseLatLonGeneratorCommand(BaseCommand):
             except FileNotFoundError:
                 self.stderr.write("No existing file.")
 
-        df = df.join(
-            df.progress_apply(
+        if self.uses_postcodes and len(get_postcode_index()):
+            areas = self.process_postcodes(df)
+        elif self.uses_postcodes:
+            areas = df.progress_apply(
                 lambda row: self.process_location(
                     row_name=row[self.row_name], **self.get_location_from_row(row)
                 ),
                 axis=1,
             )
-        )
+        elif self.get_area_lookup().is_available:
+            areas = self.process_locations(df)
+        else:
+            areas = self.process_locations_with_mapit(df)
+        df = df.join(areas)
 
         return df
 
@@ -1,25 +1,36 @@
+import hashlib
+import json
+from collections import defaultdict
+from contextlib import nullcontext
 from datetime import date
-from time import sleep
 from typing import Optional
 
 from django.contrib.sites.models import Site
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Upper
+from django.db.transaction import atomic
 
 import duckdb
 import pandas as pd
-import requests
 from tqdm import tqdm
 
-from hub.models import Area, AreaData, AreaType, DataSet, DataType, PersonData
-from hub.transformers import DataTypeConverter
-from utils.mapit import (
-    BadRequestException,
-    ForbiddenException,
-    InternalServerErrorException,
-    MapIt,
-    NotFoundException,
-    RateLimitException,
+from hub.downloads import fetch_json
+from hub.import_utils import dataframe_hash, file_hash
+from hub.models import (
+    Area,
+    AreaData,
+    AreaMatrix,
+    AreaType,
+    DataSet,
+    DataType,
+    ImportRecord,
+    Person,
+    PersonData,
+    cast_value,
 )
+from hub.spatial import AreaLookup
+from hub.transformers import DataTypeConverter
+from utils.mapit import MapIt
 
 party_map = {
     "CON": "Conservative Party",
@@ -98,6 +109,9 @@ class MultipleAreaTypesMixin:
 class BaseImportCommand(BaseCommand):
     site = None
     all_sites = None
+    # the importers that need to have been run before this one, used by
+    # run_all_import_scripts to decide which importers can run in parallel
+    depends_on = ["import_areas"]
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -152,6 +166,11 @@ class BaseImportCommand(BaseCommand):
             for site in self.all_sites:
                 obj.sites.add(site)
 
+    def update_person_profiles(self):
+        if not self._quiet:
+            self.stdout.write("Updating person profiles")
+        Person.update_profiles()
+
     def handle(
         self,
         all_sites: bool = False,
@@ -169,10 +188,16 @@ class BaseImportCommand(BaseCommand):
 
 
 class BaseAreaImportCommand(BaseImportCommand):
+    # country data is used to exclude areas when filling in blanks
+    depends_on = ["import_area_countries"]
     area_type = "WMC"
     uses_gss = False
     skip_delete = False
     skip_countries = []
+    # whether process_data removes the values for areas that are no longer
+    # in the data itself, rather than everything being deleted beforehand.
+    # Importers with their own delete_data still have it called first
+    diff_updates = False
 
     def __init__(self):
         super().__init__()
@@ -187,6 +212,16 @@ class BaseAreaImportCommand(BaseImportCommand):
             action="store_true",
             help="do not auto convert to new constituency data",
         )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="import the data even if it hasn't changed since the last import",
+        )
+        parser.add_argument(
+            "--staged",
+            action="store_true",
+            help="write the data in one transaction, so it only replaces the existing data once it is all imported",
+        )
 
     def add_to_dict(self, df):
         names = df.area.tolist()
@@ -205,8 +240,8 @@ class BaseAreaImportCommand(BaseImportCommand):
         if old_cons:
             cons_filter = "end_date == '2024-07-03'"
 
-        response = requests.get(TWFY_CONSTITUENCIES_DATA_URL)
-        df = pd.DataFrame.from_records(response.json()["posts"])
+        people = fetch_json(TWFY_CONSTITUENCIES_DATA_URL)
+        df = pd.DataFrame.from_records(people["posts"])
         df = df.query(cons_filter)["area"].reset_index()
         df = (
             df["area"]
@@ -236,6 +271,9 @@ class BaseAreaImportCommand(BaseImportCommand):
                 data_type=data_type, area__area_type__code=self.area_type
             ).delete()
 
+    def has_own_delete_data(self):
+        return type(self).delete_data is not BaseAreaImportCommand.delete_data
+
     def get_area_type(self):
         return AreaType.objects.get(code=self.area_type)
 
@@ -307,66 +345,101 @@ class BaseAreaImportCommand(BaseImportCommand):
             self.data_types[name] = data_type
 
     def _fill_empty_entries(self):
-        for data_type in self.data_types.values():
+        data_types = [
+            data_type
+            for data_type in self.data_types.values()
+            if data_type.data_type in ["integer", "float", "percent", "boolean"]
+            and data_type.data_set.table == "areadata"
+            and data_type.data_set.fill_blanks
+        ]
+        if not data_types:
+            return
+
+        area_ids = list(
+            Area.objects.filter(area_type__code=self.area_type).values_list(
+                "pk", flat=True
+            )
+        )
+        # the country of each area, as areas in excluded countries shouldn't
+        # have their values filled in
+        area_countries = dict(
+            AreaData.objects.filter(
+                data_type__name="country", area__area_type__code=self.area_type
+            ).values_list("area_id", "data")
+        )
+
+        for data_type in data_types:
             datum_example = AreaData.objects.filter(data_type=data_type).first()
-            if (
-                data_type.data_type
-                in [
-                    "integer",
-                    "float",
-                    "percent",
-                    "boolean",
-                ]
-                and data_type.data_set.table == "areadata"
-                and data_type.data_set.fill_blanks
-                and datum_example is not None
-            ):
-                value = 0
-                if datum_example.float:
-                    key = "float"
-                elif datum_example.int:
-                    key = "int"
-                elif datum_example.is_boolean:
-                    key = "bool"
-                    value = False
-                else:
-                    key = "data"
-                defaults = {key: value}
-                areas_with_values = [
-                    areadata.area.name
-                    for areadata in AreaData.objects.filter(data_type=data_type)
-                ]
-                # If some countries are set to be excluded, their values should not be filled in
-                excluded_countries = (
-                    data_type.data_set.exclude_countries + self.skip_countries
+            if datum_example is None:
+                continue
+
+            value = 0
+            if datum_example.float:
+                key = "float"
+            elif datum_example.int:
+                key = "int"
+            elif datum_example.is_boolean:
+                key = "bool"
+                value = False
+            else:
+                key = "data"
+
+            excluded_countries = set(
+                data_type.data_set.exclude_countries + self.skip_countries
+            )
+            areas_with_values = set(
+                AreaData.objects.filter(data_type=data_type).values_list(
+                    "area_id", flat=True
                 )
-                if excluded_countries != []:
-                    for country in excluded_countries:
-                        areas_with_values.extend(
-                            [
-                                areadata.area.name
-                                for areadata in AreaData.objects.filter(
-                                    data_type__name="country"
-                                ).filter(data=country)
-                            ]
-                        )
+            )
+            AreaData.objects.bulk_create(
+                [
+                    AreaData(area_id=area_id, data_type=data_type, **{key: value})
+                    for area_id in area_ids
+                    if area_id not in areas_with_values
+                    and area_countries.get(area_id) not in excluded_countries
+                ],
+                ignore_conflicts=True,
+            )
 
-                areas_without_values = Area.objects.exclude(
-                    name__in=areas_with_values
-                ).filter(area_type__code=self.area_type)
-                for area in areas_without_values:
-                    data, created = AreaData.objects.update_or_create(
-                        area=area, data_type=data_type, defaults=defaults
-                    )
+    def save_area_counts(self, data_type, counts, batch_size=1000):
+        """
+        add counts, the number of points in each area keyed by area id, to the
+        existing values of data_type for the areas in one bulk upsert
+        """
+        existing = dict(
+            AreaData.objects.filter(
+                data_type=data_type, area_id__in=counts.index.tolist()
+            ).values_list("area_id", "int")
+        )
+        AreaData.objects.bulk_create(
+            [
+                AreaData(
+                    area_id=area_id,
+                    data_type=data_type,
+                    int=int(count) + (existing.get(area_id) or 0),
+                )
+                for area_id, count in counts.items()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["area", "data_type"],
+            update_fields=["int"],
+        )
 
     def update_averages(self):
         self._fill_empty_entries()
-        for data_type in self.data_types.values():
-            data_type.update_average()
+        DataType.update_stats(self.data_types.values(), ["average"])
 
     def update_max_min(self):
+        DataType.update_stats(self.data_types.values(), ["maximum", "minimum"])
+
+    def update_matrix(self):
+        data_types = defaultdict(list)
         for data_type in self.data_types.values():
-            data_type.update_max_min()
+            data_types[data_type.area_type].append(data_type)
+        for area_type, area_type_data_types in data_types.items():
+            AreaMatrix.refresh(area_type, area_type_data_types)
 
     def convert_to_new_con(self):
         if self.do_not_convert or self.area_type == "WMC23":
@@ -376,15 +449,80 @@ class BaseAreaImportCommand(BaseImportCommand):
             self.stdout.write("Converting to WMC23 constituency data")
 
         converter = DataTypeConverter()
-        for data_type in self.data_types.values():
-            if (
-                data_type.area_type == converter.old_area_type
-                and data_type.data_set.unit_distribution == "people_in_area"
-                and data_type.data_set.unit_type == "percentage"
-            ):
-                converter.convert_datatype_to_new_geography(
-                    data_type, delete_old=True, quiet=self._quiet
-                )
+        data_types = [
+            data_type
+            for data_type in self.data_types.values()
+            if data_type.area_type == converter.old_area_type
+            and data_type.data_set.unit_distribution == "people_in_area"
+            and data_type.data_set.unit_type == "percentage"
+        ]
+        if data_types:
+            converter.convert_datatypes_to_new_geography(
+                data_types, delete_old=True, quiet=self._quiet
+            )
+            AreaMatrix.refresh(converter.new_con_at)
+
+    def get_import_name(self):
+        return self.__module__.rsplit(".", 1)[-1]
+
+    def get_source_hash(self, df):
+        """
+        a hash of the data being imported, to tell if it has changed since the
+        last import
+        """
+        return dataframe_hash(df)
+
+    def get_fingerprint(self, df):
+        config = json.dumps(self.data_sets, sort_keys=True, default=str)
+        return {
+            "source_hash": self.get_source_hash(df),
+            "config_hash": hashlib.sha256(config.encode()).hexdigest(),
+            "row_count": len(df),
+        }
+
+    def get_data_count(self, data_type_ids):
+        return (
+            AreaData.objects.filter(data_type_id__in=data_type_ids).count()
+            + PersonData.objects.filter(data_type_id__in=data_type_ids).count()
+        )
+
+    def is_unchanged(self, fingerprint):
+        """
+        whether the data and config are the same as the last import, and none
+        of the imported data has been removed since. This is checked before
+        the data sets are added so a skipped import doesn't update them
+        """
+        record = ImportRecord.objects.filter(
+            importer=self.get_import_name(), area_type=self.area_type
+        ).first()
+        if record is None:
+            return False
+
+        return all(
+            getattr(record, key) == value for key, value in fingerprint.items()
+        ) and record.data_count == self.get_data_count(record.data_type_ids)
+
+    def save_fingerprint(self, fingerprint):
+        data_type_ids = sorted(data_type.pk for data_type in self.data_types.values())
+        ImportRecord.objects.update_or_create(
+            importer=self.get_import_name(),
+            area_type=self.area_type,
+            defaults={
+                **fingerprint,
+                "data_count": self.get_data_count(data_type_ids),
+                "data_type_ids": data_type_ids,
+            },
+        )
+
+    def get_import_context(self, staged):
+        """
+        a transaction for a staged import, so the data and stats aren't seen
+        until they have all been updated, and the previous data is kept if
+        the import fails
+        """
+        if staged:
+            return atomic()
+        return nullcontext()
 
     def get_df(self) -> Optional[pd.DataFrame]:
         raise NotImplementedError()
@@ -392,23 +530,43 @@ class BaseAreaImportCommand(BaseImportCommand):
     def process_data(self, df: pd.DataFrame):
         raise NotImplementedError()
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, force=False, staged=False, **kwargs):
         super(BaseAreaImportCommand, self).handle(*args, **kwargs)
         df = self.get_df()
         if df is None or df.empty:
             if not self._quiet:
                 self.stdout.write(f"missing data for {self.message} ({self.area_type})")
             return
+
+        fingerprint = self.get_fingerprint(df)
+        if not force and self.is_unchanged(fingerprint):
+            if not self._quiet:
+                self.stdout.write(
+                    f"{self.get_import_name()} ({self.area_type}) is unchanged since the last import, skipping"
+                )
+            return
+
         self.add_data_sets(df)
-        self.delete_data()
-        self.process_data(df)
-        self.update_averages()
-        self.update_max_min()
-        self.convert_to_new_con()
+
+        with self.get_import_context(staged):
+            if not self.diff_updates or self.has_own_delete_data():
+                self.delete_data()
+            self.process_data(df)
+            self.update_averages()
+            self.update_max_min()
+            self.update_matrix()
+            self.convert_to_new_con()
+            self.save_fingerprint(fingerprint)
 
 
 class BaseImportFromDataFrameCommand(BaseAreaImportCommand):
     uses_gss = True
+    batch_size = 1000
+    diff_updates = True
+    value_fields = ["data", "date", "float", "int", "json", "bool"]
+    # the rest of the data after the data frame from get_df, for data that
+    # is read a chunk at a time
+    chunks = ()
 
     def get_row_data(self, row, conf):
         return row[conf["col"]]
@@ -433,13 +591,92 @@ class BaseImportFromDataFrameCommand(BaseAreaImportCommand):
 
         return data, created
 
+    def get_defaults(self, dt, value):
+        if dt.data_type in ["json", "url"]:
+            return {"json": value}
+        elif dt.data_type == "boolean":
+            return {"bool": value}
+        return cast_value(dt, value)
+
+    def get_areas(self):
+        """
+        all the areas of the area type, keyed by GSS code or by lower cased
+        name, so rows can be matched to areas without a query each
+        """
+        areas = Area.objects.filter(area_type__code=self.area_type).defer("geometry")
+        if self.uses_gss:
+            return {area.gss: area for area in areas}
+        return {area.name.lower(): area for area in areas}
+
+    def get_values(self, area_data):
+        return tuple(
+            AreaData._meta.get_field(field).to_python(getattr(area_data, field))
+            for field in self.value_fields
+        )
+
+    def get_existing_values(self, data_types):
+        """
+        the id and values of the existing AreaData for data_types and the area
+        type, keyed by area id and data type id
+        """
+        rows = AreaData.objects.filter(
+            data_type__in=data_types, area__area_type__code=self.area_type
+        ).values_list("id", "area_id", "data_type_id", *self.value_fields)
+        return {
+            (area_id, data_type_id): (pk, tuple(values))
+            for pk, area_id, data_type_id, *values in rows
+        }
+
+    def save_area_data(self, area_data, existing):
+        """
+        write the AreaData for each data type in bulk, only writing the values
+        that have changed from existing, and removing the areas written from
+        existing. Returns the number of values written
+        """
+        objs = []
+        for name, values in area_data.items():
+            for area, defaults in values.items():
+                obj = AreaData(area=area, data_type=self.data_types[name], **defaults)
+                current = existing.pop((area.pk, obj.data_type_id), None)
+                if current is None or current[1] != self.get_values(obj):
+                    objs.append(obj)
+
+        if objs:
+            AreaData.objects.bulk_create(
+                objs,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=["area", "data_type"],
+                update_fields=self.value_fields,
+            )
+
+        return len(objs)
+
+    def remove_area_data(self, existing):
+        """
+        remove the existing values for areas that weren't in the data,
+        returning the number removed
+        """
+        if self.skip_delete:
+            return 0
+
+        removed = [pk for pk, values in existing.values()]
+        if removed:
+            AreaData.objects.filter(pk__in=removed).delete()
+
+        return len(removed)
+
+    def get_chunks(self, df):
+        yield df
+        yield from self.chunks
+
     def process_data(self, df):
         if not self._quiet:
             self.stdout.write(self.message)
 
         areas_to_skip = None
         if self.skip_countries:
-            areas_to_skip = list(
+            areas_to_skip = set(
                 AreaData.objects.filter(
                     data_type__name="country",
                     data__in=self.skip_countries,
@@ -447,46 +684,66 @@ class BaseImportFromDataFrameCommand(BaseAreaImportCommand):
                 ).values_list("area_id", flat=True)
             )
 
-        for index, row in tqdm(df.iterrows(), disable=self._quiet, total=df.shape[0]):
-            if type(self.cons_row) is int:
-                cons = row.iloc[self.cons_row]
-            else:
-                cons = row[self.cons_row]
+        areas = self.get_areas()
+        existing = self.get_existing_values(
+            [self.data_types[name] for name in self.data_sets]
+        )
+        written = 0
+        error = None
+        for chunk in self.get_chunks(df):
+            # AreaData to write for each data set, keyed by area so that a
+            # later row for the same area replaces an earlier one
+            area_data = {name: {} for name in self.data_sets}
+            for index, row in tqdm(
+                chunk.iterrows(), disable=self._quiet, total=chunk.shape[0]
+            ):
+                if type(self.cons_row) is int:
+                    cons = row.iloc[self.cons_row]
+                else:
+                    cons = row[self.cons_row]
+
+                if pd.isna(cons):
+                    continue
 
-            if not pd.isna(cons):
                 if self.uses_gss:
-                    area = Area.get_by_gss(cons, area_type=self.area_type)
+                    area = areas.get(str(cons), None)
                 else:
                     cons = cons.replace(" & ", " and ")
                     cons = self.cons_map.get(cons, cons)
-                    area = Area.get_by_name(cons, area_type=self.area_type)
+                    area = areas.get(cons.lower(), None)
 
-            if area is None:
-                if self.uses_gss:
-                    self.stdout.write(f"Failed to find area with code {cons}")
-                else:
-                    self.stdout.write(f"no matching area for {cons}")
-                continue
-
-            if areas_to_skip and area.pk in areas_to_skip:
-                continue
-
-            try:
-                for name, conf in self.data_sets.items():
-                    if self.data_types[name].data_type in ["json", "url"]:
-                        defaults = {"json": self.get_row_data(row, conf)}
-                    elif self.data_types[name].data_type == "boolean":
-                        defaults = {"bool": self.get_row_data(row, conf)}
+                if area is None:
+                    if self.uses_gss:
+                        self.stdout.write(f"Failed to find area with code {cons}")
                     else:
-                        defaults = {"data": self.get_row_data(row, conf)}
-
-                    area_data, created = self.add_data(
-                        self.data_types[name], area, defaults, row
-                    )
-
-            except Exception as e:
-                print(f"issue with {cons}: {e}")
-                break
+                        self.stdout.write(f"no matching area for {cons}")
+                    continue
+
+                if areas_to_skip and area.pk in areas_to_skip:
+                    continue
+
+                try:
+                    for name, conf in self.data_sets.items():
+                        dt = self.data_types[name]
+                        defaults = self.get_defaults(dt, self.get_row_data(row, conf))
+                        if dt.data_set.table == "areadata":
+                            area_data[name][area] = defaults
+                        else:
+                            self.add_data(dt, area, defaults, row)
+
+                except Exception as e:
+                    error = f"issue with {cons}: {e}"
+                    break
+
+            written += self.save_area_data(area_data, existing)
+            if error is not None:
+                # stop before the values for the rows that weren't reached are
+                # removed, and the import is recorded as done
+                raise CommandError(error)
+
+        removed = self.remove_area_data(existing)
+        if not self._quiet:
+            self.stdout.write(f"{written} values written, {removed} removed")
 
     def get_dataframe(self) -> Optional[pd.DataFrame]:
         raise NotImplementedError()
@@ -494,6 +751,12 @@ class BaseImportFromDataFrameCommand(BaseAreaImportCommand):
     def get_df(self):
         return self.get_dataframe()
 
+    def has_person_data(self):
+        return any(
+            config["defaults"].get("table") == "people__persondata"
+            for config in self.data_sets.values()
+        )
+
     def handle(
         self,
         skip_new_areatype_conversion=False,
@@ -503,51 +766,80 @@ class BaseImportFromDataFrameCommand(BaseAreaImportCommand):
         if not hasattr(self, "do_not_convert"):
             self.do_not_convert = skip_new_areatype_conversion
         super(BaseImportFromDataFrameCommand, self).handle(*args, **options)
+        if self.has_person_data():
+            self.update_person_profiles()
 
 
 class BaseLatLongImportCommand(BaseAreaImportCommand):
-    def _process_lat_long(self, lat=None, lon=None, row_name=None):
-        if not pd.isna(lat) and not pd.isna(lon):
-            try:
-                mapit = MapIt()
-                gss_codes = mapit.wgs84_point_to_gss_codes(lon, lat)
-
-                areas = Area.objects.filter(gss__in=gss_codes)
-                areas = list(areas)
-            except (
-                NotFoundException,
-                BadRequestException,
-                InternalServerErrorException,
-                ForbiddenException,
-            ) as error:
-                print(f"Error fetching row {row_name} with {lat}, {lon}: {error}")
-                return None
-            except RateLimitException as error:
-                print(f"Mapit Error - {error}, waiting for a minute")
-                sleep(60)
-                return False
-        else:
-            print(f"missing lat or lon for row {row_name}")
-            return None
+    lat_col = "lat"
+    lon_col = "lon"
+    _area_lookup = None
 
-        for area in areas:
-            area, created = AreaData.objects.get_or_create(
-                data_type=self.data_type,
-                area=area,
-            )
-            if created:
-                area.int = 1
+    def get_area_lookup(self):
+        if self._area_lookup is None:
+            codes = AreaType.objects.values_list("code", flat=True)
+            self._area_lookup = AreaLookup(sorted(codes))
+        return self._area_lookup
+
+    def points_to_gss_codes(self, lats, lons, row_names):
+        """
+        the gss codes of the areas each point is in, from the local spatial
+        index if there is one or MapIt if not
+        """
+        lookup = self.get_area_lookup()
+        if lookup.is_available:
+            areas = lookup.points_to_areas(lons, lats)
+            return [
+                [codes[i] for codes in areas.values() if codes[i] is not None]
+                for i in range(len(lats))
+            ]
+
+        gss_codes = []
+        results = MapIt().points_to_gss_many(list(zip(lons, lats)))
+        for result, lat, lon, row_name in zip(results, lats, lons, row_names):
+            if isinstance(result, Exception):
+                print(f"Error fetching row {row_name} with {lat}, {lon}: {result}")
+                gss_codes.append([])
             else:
-                area.int = area.value() + 1
-            area.save()
+                gss_codes.append(list(result.values()))
+
+        return gss_codes
+
+    def process_lat_longs(self, lats, lons, row_names):
+        """
+        find the areas all the points are in and then add the number of
+        points in each area to its count in one go
+        """
+        lats = pd.to_numeric(pd.Series(list(lats)), errors="coerce")
+        lons = pd.to_numeric(pd.Series(list(lons)), errors="coerce")
+        row_names = pd.Series(list(row_names))
+        missing = lats.isna() | lons.isna()
+        for row_name in row_names[missing]:
+            print(f"missing lat or lon for row {row_name}")
+
+        gss_codes = pd.Series(
+            self.points_to_gss_codes(
+                lats[~missing].tolist(),
+                lons[~missing].tolist(),
+                row_names[~missing].tolist(),
+            ),
+            dtype=object,
+        ).explode()
+
+        area_ids = {}
+        for gss, area_id in Area.objects.filter(
+            gss__in=set(gss_codes.dropna())
+        ).values_list("gss", "id"):
+            area_ids.setdefault(gss, []).append(area_id)
 
-        return True
+        counts = gss_codes.map(area_ids).dropna().explode().value_counts()
+        self.save_area_counts(self.data_type, counts)
 
     def process_lat_long(self, lat=None, lon=None, row_name=None):
-        success = self._process_lat_long(lat=lat, lon=lon, row_name=row_name)
-        # retry once if it fails so we can catch rate limit errors
-        if success is False:
-            self._process_lat_long(lat=lat, lon=lon, row_name=row_name)
+        self.process_lat_longs([lat], [lon], [row_name])
+
+    def process_data(self, df: pd.DataFrame):
+        self.process_lat_longs(df[self.lat_col], df[self.lon_col], df.index)
 
 
 class BaseConstituencyGroupListImportCommand(BaseAreaImportCommand):
@@ -599,25 +891,66 @@ class BaseConstituencyGroupListImportCommand(BaseAreaImportCommand):
 class BaseConstituencyCountImportCommand(BaseAreaImportCommand):
     do_not_convert = True
 
+    def add_arguments(self, parser):
+        super(BaseConstituencyCountImportCommand, self).add_arguments(parser)
+        parser.add_argument(
+            "--chunk_size",
+            action="store",
+            type=int,
+            help="Read the data file this many rows at a time, for files too big to read at once",
+        )
+
     def set_data_type(self):
         self.data_type = list(self.data_types.values())[0]
 
+    def prepare_df(self, df):
+        return df.astype({self.get_cons_col(): "str"})
+
     def get_df(self):
         if not self.data_file.exists():
             return None
 
-        df = pd.read_csv(self.data_file)
-        df = df.astype({self.get_cons_col(): "str"})
-        return df
+        # when reading in chunks the first is used as the data frame, and the
+        # rest read as they are processed
+        self.chunks = iter([])
+        if self._chunk_size:
+            self.chunks = pd.read_csv(self.data_file, chunksize=self._chunk_size)
+            df = next(self.chunks, pd.DataFrame(columns=[self.get_cons_col()]))
+        else:
+            df = pd.read_csv(self.data_file)
 
-    def _get_areas_from_row(self, row):
-        value = row[self.get_cons_col()]
+        return self.prepare_df(df)
+
+    def get_source_hash(self, df):
+        # only the first chunk is read up front, so hash the whole file
+        return file_hash(self.data_file)
+
+    def get_chunks(self, df):
+        yield df
+        for chunk in self.chunks:
+            yield self.prepare_df(chunk)
+
+    def get_area_ids(self, values):
+        """
+        the ids of the areas each of values is for, matching comma separated
+        GSS codes or case insensitive names, with a row for each area
+        """
         if self.uses_gss:
-            areas = Area.objects.filter(gss__in=value.split(","))
+            keys = values.str.split(",").explode()
+            areas = Area.objects.filter(gss__in=set(keys)).values_list("gss", "id")
         else:
-            areas = Area.objects.filter(name__iexact=value)
+            keys = values.str.upper()
+            areas = (
+                Area.objects.annotate(upper_name=Upper("name"))
+                .filter(upper_name__in=set(keys))
+                .values_list("upper_name", "id")
+            )
 
-        return list(areas)
+        area_ids = {}
+        for key, area_id in areas:
+            area_ids.setdefault(key, []).append(area_id)
+
+        return keys.map(area_ids).dropna().explode()
 
     def process_data(self, df):
         if not hasattr(self, "data_type"):
@@ -626,24 +959,20 @@ class BaseConstituencyCountImportCommand(BaseAreaImportCommand):
         if not self._quiet:
             self.stdout.write(f"{self.message} ({self.area_type})")
 
-        for index, row in tqdm(df.iterrows(), disable=self._quiet, total=df.shape[0]):
-            areas = self._get_areas_from_row(row)
-            for area in areas:
-                area, created = AreaData.objects.get_or_create(
-                    data_type=self.data_type,
-                    area=area,
-                )
-                if created:
-                    area.int = 1
-                else:
-                    area.int = area.value() + 1
-                area.save()
+        counts = pd.Series(dtype=int)
+        for chunk in tqdm(self.get_chunks(df), disable=self._quiet):
+            area_ids = self.get_area_ids(chunk[self.get_cons_col()])
+            counts = counts.add(area_ids.value_counts(), fill_value=0)
 
-    def handle(self, *args, **options):
+        self.save_area_counts(self.data_type, counts)
+
+    def handle(self, chunk_size=None, *args, **options):
+        self._chunk_size = chunk_size
         super(BaseConstituencyCountImportCommand, self).handle(*args, **options)
 
 
 class BaseMPAPPGMembershipImportCommand(BaseImportCommand):
+    depends_on = ["import_mps"]
     source_base = "https://pages.mysociety.org/appg-membership/data/appg_groups_and_memberships/latest/"
     register_source = source_base + "register.parquet"
     categories_source = source_base + "categories.parquet"
@@ -738,3 +1067,4 @@ class BaseMPAPPGMembershipImportCommand(BaseImportCommand):
         results, appgs = self.get_results()
         data_type = self.create_data_type(appgs)
         self.add_results(results, data_type)
+        self.update_person_profiles()
@@ -0,0 +1,139 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from hub.filters import compile_filters
+from hub.import_utils import rollback_atomic
+from hub.models import Area, AreaType, DataSet, DataType
+
+
+class Command(BaseCommand):
+    help = "Time stacked explore filters against synthetic AreaData"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            action="store",
+            type=int,
+            default=1_000_000,
+            help="Number of synthetic AreaData rows to generate",
+        )
+        parser.add_argument(
+            "--filters",
+            action="store",
+            type=int,
+            default=5,
+            help="Number of data types to generate and stack filters on",
+        )
+        parser.add_argument(
+            "--repeat",
+            action="store",
+            type=int,
+            default=3,
+            help="Number of times to run each query, the fastest run is reported",
+        )
+
+    def create_data(self, rows, filters):
+        area_type = AreaType.objects.create(
+            code="BENCH",
+            area_type="westminster_constituency",
+            name_singular="Benchmark area",
+            name_plural="Benchmark areas",
+            short_name_singular="area",
+            short_name_plural="areas",
+            description="Synthetic areas for benchmarking",
+        )
+
+        data_types = []
+        for i in range(filters):
+            ds = DataSet.objects.create(
+                name=f"benchmark_{i}",
+                label=f"Benchmark {i}",
+                data_type="float",
+                table="areadata",
+                source="benchmark",
+            )
+            ds.areas_available.add(area_type)
+            data_types.append(
+                DataType.objects.create(
+                    data_set=ds,
+                    name=f"benchmark_{i}",
+                    data_type="float",
+                    area_type=area_type,
+                )
+            )
+
+        areas = max(rows // filters, 1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO hub_area (gss, name, area_type_id)
+                SELECT 'B' || g, 'Benchmark area ' || g, %s
+                FROM generate_series(1, %s) AS g
+                """,
+                [area_type.pk, areas],
+            )
+            cursor.execute(
+                """
+                INSERT INTO hub_areadata (area_id, data_type_id, data, float)
+                SELECT a.id, dt.id, '', random() * 100
+                FROM hub_area a CROSS JOIN hub_datatype dt
+                WHERE a.area_type_id = %s AND dt.area_type_id = %s
+                """,
+                [area_type.pk, area_type.pk],
+            )
+            cursor.execute("ANALYZE hub_area")
+            cursor.execute("ANALYZE hub_areadata")
+
+        return area_type, data_types
+
+    def time_query(self, query, repeat):
+        fastest = None
+        for _ in range(repeat):
+            start = perf_counter()
+            count = len(list(query.values_list("pk", flat=True)))
+            taken = perf_counter() - start
+            if fastest is None or taken < fastest:
+                fastest = taken
+
+        return count, fastest
+
+    def joined_query(self, query, filters):
+        """
+        the previous approach of a join to AreaData per filter followed by a
+        distinct, for comparison
+        """
+        for f in filters:
+            query = query.filter(
+                areadata__data_type__name=f["name"],
+                areadata__float__gt=f["value"],
+            )
+        return query.distinct("pk")
+
+    def handle(self, rows=None, filters=None, repeat=None, *args, **options):
+        with rollback_atomic():
+            self.stdout.write(f"Generating {rows} AreaData rows")
+            area_type, data_types = self.create_data(rows, filters)
+
+            base = Area.objects.filter(area_type=area_type)
+            stacked = []
+            for data_type in data_types:
+                stacked.append(
+                    {
+                        "dataset": data_type.data_set,
+                        "name": data_type.name,
+                        "comparator": "gt",
+                        "value": 50,
+                    }
+                )
+                count, exists_time = self.time_query(
+                    compile_filters(base, stacked).order_by("pk"), repeat
+                )
+                _, joined_time = self.time_query(
+                    self.joined_query(base, stacked), repeat
+                )
+                self.stdout.write(
+                    f"{len(stacked)} filters: {count} areas, "
+                    f"exists {exists_time:.3f}s, joined {joined_time:.3f}s"
+                )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from hub.geometry import build_geometry_cache
+from hub.models import AreaType
+from hub.spatial import build_spatial_index
+
+
+class Command(BaseCommand):
+    help = "Prebuild the area geometry served on the explore page, and the spatial index used to look up points"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--area_types",
+            action="store",
+            help="Comma separated list of area type codes to build, defaults to all",
+        )
+        parser.add_argument(
+            "-q", "--quiet", action="store_true", help="Silence progress messages."
+        )
+
+    def handle(self, area_types=None, quiet=False, *args, **options):
+        types = AreaType.objects.all()
+        if area_types:
+            types = types.filter(code__in=area_types.split(","))
+
+        for area_type in types:
+            build_geometry_cache(area_type)
+            index = build_spatial_index(area_type)
+            if not quiet:
+                self.stdout.write(
+                    f"Built geometry and a spatial index of {len(index)} areas for {area_type.code}"
+                )
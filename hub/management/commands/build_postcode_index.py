@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+
+import pandas as pd
+
+from hub.postcodes import (
+    POSTCODE_LENGTH,
+    PostcodeIndex,
+    load_postcode_index,
+    postcode_index_path,
+)
+
+
+class Command(BaseCommand):
+    help = "Build the postcode to area index from an ONS Postcode Directory CSV"
+
+    # ONSPD column names
+    postcode_col = "pcds"
+    terminated_col = "doterm"
+    constituency_col = "pcon"
+    county_col = "oscty"
+    district_col = "oslaua"
+    police_col = "pfa"
+
+    chunk_size = 100000
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="ONSPD CSV file to build the index from")
+        parser.add_argument(
+            "--include_terminated",
+            action="store_true",
+            help="Include postcodes that are no longer in use",
+        )
+        parser.add_argument(
+            "-q", "--quiet", action="store_true", help="Silence progress messages."
+        )
+
+    def get_code(self, codes):
+        # areas that don't apply to a postcode, e.g. the county of a postcode
+        # in a unitary authority, have pseudo codes like E99999999, and blank
+        # codes are missing values
+        pseudo = codes.str.endswith("99999999", na=False)
+        return codes.where(codes.notna() & ~pseudo, None)
+
+    def process_chunk(self, df, include_terminated=False):
+        if not include_terminated:
+            df = df[df[self.terminated_col].isna()]
+
+        postcodes = df[self.postcode_col].str.replace(r"\s+", "", regex=True)
+        df = df[postcodes.str.len().between(1, POSTCODE_LENGTH)]
+        postcodes = postcodes[df.index].str.upper()
+
+        county = self.get_code(df[self.county_col])
+        district = self.get_code(df[self.district_col])
+        # postcodes in two tier areas are in a county council and a district
+        # council, and everywhere else just in a single tier council
+        return postcodes, {
+            "WMC23": self.get_code(df[self.constituency_col]),
+            "STC": county.where(county.notna(), district),
+            "DIS": district.where(county.notna(), None),
+            "PFA": self.get_code(df[self.police_col]),
+        }
+
+    def handle(self, file, include_terminated=False, quiet=False, *args, **options):
+        usecols = [
+            self.postcode_col,
+            self.terminated_col,
+            self.constituency_col,
+            self.county_col,
+            self.district_col,
+            self.police_col,
+        ]
+        postcodes = []
+        codes = {}
+        for chunk in pd.read_csv(
+            file, usecols=usecols, dtype=str, chunksize=self.chunk_size
+        ):
+            chunk_postcodes, chunk_codes = self.process_chunk(
+                chunk, include_terminated=include_terminated
+            )
+            postcodes.extend(chunk_postcodes)
+            for area_type, values in chunk_codes.items():
+                codes.setdefault(area_type, []).extend(values)
+            if not quiet:
+                self.stdout.write(f"Read {len(postcodes)} postcodes")
+
+        index = PostcodeIndex.from_codes(postcodes, codes)
+        index.save(postcode_index_path())
+        load_postcode_index.cache_clear()
+
+        if not quiet:
+            self.stdout.write(f"Built an index of {len(index)} postcodes")
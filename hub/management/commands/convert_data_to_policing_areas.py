@@ -1,4 +1,4 @@
-from hub.models import DataSet, DataType
+from hub.models import AreaMatrix, DataSet, DataType
 from hub.transformers import CouncilToPFADataTypeConverter
 
 from .base_importers import BaseImportCommand
@@ -43,13 +43,15 @@ class Command(BaseImportCommand):
                         self.stdout.write(
                             f"  Converting {dt.name} ({dt.area_type.code})"
                         )
-                    converter.convert_datatype_to_new_geography(
-                        dt, quiet=self._quiet, method=method
-                    )
+                converter.convert_datatypes_to_new_geography(
+                    list(data_types), quiet=self._quiet, method=method
+                )
 
             except DataSet.DoesNotExist:
                 self.stdout.write(f"Dataset not found: {ds_name}")
 
+        AreaMatrix.refresh(converter.new_con_at)
+
     def handle(self, quiet=False, *args, **options):
         self._quiet = quiet
         self.convert()
@@ -48,12 +48,12 @@ class Command(BaseImportFromDataFrameCommand):
         for data_type in data_types.values():
             if not self._quiet:
                 self.stdout.write(f"Converting {data_type.name} to council data")
-            dis_converter.convert_datatype_to_new_geography(
-                data_type, quiet=self._quiet
-            )
-            stc_converter.convert_datatype_to_new_geography(
-                data_type, quiet=self._quiet
-            )
+        dis_converter.convert_datatypes_to_new_geography(
+            list(data_types.values()), quiet=self._quiet
+        )
+        stc_converter.convert_datatypes_to_new_geography(
+            list(data_types.values()), quiet=self._quiet
+        )
 
     def handle(self, quiet=False, *args, **options):
         self._quiet = quiet
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from hub.models import DataSet, DataType
+from hub.models import AreaMatrix, DataSet, DataType
 from hub.transformers import DataTypeConverter
 
 
@@ -23,10 +23,15 @@ class Command(BaseCommand):
 
         for ds in sets:
             print(ds.label, ds.unit_type)
-            for dt in DataType.objects.filter(
-                data_set=ds, area_type=converter.old_area_type
-            ):
-                converter.convert_datatype_to_new_geography(dt)
+            converter.convert_datatypes_to_new_geography(
+                list(
+                    DataType.objects.filter(
+                        data_set=ds, area_type=converter.old_area_type
+                    )
+                )
+            )
+
+        AreaMatrix.refresh(converter.new_con_at)
 
     def handle(self, quiet=False, *args, **options):
         self._quiet = quiet
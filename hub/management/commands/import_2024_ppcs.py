@@ -14,6 +14,8 @@ class Command(BaseCommand):
     help = "Import Parliamentary Prospective Candidates for 2024 election"
 
     area_type = "WMC23"
+    # uses the party data type from import_mps
+    depends_on = ["import_mps"]
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -106,3 +108,5 @@ class Command(BaseCommand):
                 parties.append(dict(title=party[0], shader=shade))
 
             dataset.update(options=parties)
+
+        Person.update_profiles()
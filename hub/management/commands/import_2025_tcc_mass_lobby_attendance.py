@@ -7,6 +7,7 @@ from .base_importers import BaseImportFromDataFrameCommand
 
 class Command(BaseImportFromDataFrameCommand):
     help = "Import MP and constituent attendance of TCC’s 2025 Mass Lobby in London"
+    depends_on = ["import_area_countries", "import_mps"]
 
     message = "importing TCC 2025 Mass Lobby attendance"
     cons_row = "constituency_name"
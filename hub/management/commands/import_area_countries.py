@@ -10,6 +10,7 @@ from .base_importers import BaseImportFromDataFrameCommand, MultipleAreaTypesMix
 
 class Command(MultipleAreaTypesMixin, BaseImportFromDataFrameCommand):
     help = "Import countries of areas from MapIt"
+    depends_on = ["import_areas"]
     message = "Importing constituency countries"
     cons_row = "gss-code"
     uses_gss = True
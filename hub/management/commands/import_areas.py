@@ -5,7 +5,9 @@ from django.core.management.base import CommandError
 
 from tqdm import tqdm
 
+from hub.geometry import build_geometry_cache
 from hub.models import Area, AreaType
+from hub.spatial import build_spatial_index
 from utils.mapit import MapIt, NotFoundException
 
 from .base_importers import BaseImportCommand
@@ -13,6 +15,7 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import basic area information from MaPit"
+    depends_on = []
 
     _site_name = None
 
@@ -134,11 +137,17 @@ class Command(BaseImportCommand):
             if diagnostics or not quiet:
                 print(f"Importing {b_type['name_plural']}")
             disable = quiet or diagnostics
-            for area in tqdm(areas, disable=disable):
+            geometries = mapit_client.areas_geometry_many(
+                [area["id"] for area in areas]
+            )
+            for area, geom in tqdm(
+                zip(areas, geometries), total=len(areas), disable=disable
+            ):
                 if diagnostics:
                     print(f"looking at {area['name']}, mapit type {area['type']}")
                 try:
-                    geom = mapit_client.area_geometry(area["id"])
+                    if isinstance(geom, Exception):
+                        raise geom
                     geom = {
                         "type": "Feature",
                         "geometry": geom,
@@ -177,5 +186,8 @@ class Command(BaseImportCommand):
                 if diagnostics:
                     print("--")
 
+            build_geometry_cache(area_type)
+            build_spatial_index(area_type)
+
             if diagnostics:
                 print("\n\033[31m######################\033[0m\n")
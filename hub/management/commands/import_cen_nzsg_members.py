@@ -10,10 +10,12 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import CEN and NZSG Members"
+    depends_on = ["import_mps"]
 
     def handle(self, *args, **options):
         super(Command, self).handle(*args, **options)
         self.import_results()
+        self.update_person_profiles()
 
     def get_df(self):
         file_loc = Path("data", "cen_nzsg_members.csv")
@@ -1,5 +1,4 @@
-from mysoc_dataset import get_dataset_df
-
+from hub.downloads import fetch_dataset_df
 from hub.import_utils import add_gss_codes, filter_authority_type
 from hub.models import DataSet
 
@@ -142,12 +141,11 @@ class Command(MultipleAreaTypesMixin, BaseImportFromDataFrameCommand):
         return row[conf["col"]] * 100
 
     def get_dataframe(self):
-        df = get_dataset_df(
+        df = fetch_dataset_df(
             repo_name="climate_mrp_polling",
             package_name="local_authority_climate_polling",
             version_name="latest",
             file_name="local_authority_climate_polling.csv",
-            done_survey=True,
         )
 
         df = add_gss_codes(df, "local-authority-code")
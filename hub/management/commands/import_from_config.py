@@ -1,9 +1,12 @@
+import hashlib
 import json
 
 from django.conf import settings
 
 import pandas as pd
 
+from hub.downloads import iter_excel
+from hub.import_utils import file_hash
 from hub.models import AreaData, DataSet
 
 from .base_importers import BaseImportFromDataFrameCommand, party_shades
@@ -117,6 +120,8 @@ class Command(BaseImportFromDataFrameCommand):
         self.url_prefix = row.get("url_prefix", False)
         self.url_label = row.get("url_label", False)
         self.skip_countries = row.get("skip_countries", [])
+        self.chunk_size = row.get("chunk_size")
+        self.conf = row
 
         if row["uses_gss"]:
             self.uses_gss = True
@@ -187,23 +192,30 @@ class Command(BaseImportFromDataFrameCommand):
 
         self.data_sets = {import_name: {"defaults": defaults, "col": row["data_col"]}}
 
-    def get_dataframe(self):
+    def read_data_file(self):
+        """
+        the data file as a data frame or, if chunk_size is set, as an iterator
+        of data frames of at most chunk_size rows
+        """
+        kwargs = {}
+        if self.header_row:
+            kwargs["header"] = int(self.header_row)
+
         if self.file_type == "csv":
-            kwargs = {}
-            if self.header_row:
-                kwargs["header"] = int(self.header_row)
-            df = pd.read_csv(self.data_file, **kwargs)
-        elif self.file_type == "excel":
-            kwargs = {}
-            if self.sheet:
-                kwargs["sheet_name"] = self.sheet
-            if self.header_row:
-                kwargs["header"] = int(self.header_row)
-            df = pd.read_excel(self.data_file, **kwargs)
-        else:
-            self.stderr.write(f"Unknown file type: {self.file_type}")
-            return None
+            if self.chunk_size:
+                kwargs["chunksize"] = int(self.chunk_size)
+            return pd.read_csv(self.data_file, **kwargs)
+
+        if self.sheet:
+            kwargs["sheet_name"] = self.sheet
+        if not self.chunk_size:
+            return pd.read_excel(self.data_file, **kwargs)
 
+        # parsing big Excel files is slow, so they are only parsed again if
+        # they have changed
+        return iter_excel(self.data_file, int(self.chunk_size), **kwargs)
+
+    def prepare_df(self, df):
         if self.replace_columns:
             if len(df.columns) > len(self.replace_columns):
                 df = df.iloc[:, 0 : len(self.replace_columns)]
@@ -228,12 +240,40 @@ class Command(BaseImportFromDataFrameCommand):
                 df[self.data_col] = df[self.data_col].fillna(0)
 
         if self.party_data:
-            df[self.data_col] = df[self.data_col].map(lambda x: self.party_data[x])
+            missing = ~df[self.data_col].isin(self.party_data.keys())
+            if missing.any():
+                raise KeyError(df[self.data_col][missing].iloc[0])
+            df[self.data_col] = df[self.data_col].map(self.party_data)
 
         if self.gss_map:
-            df[self.cons_col] = df[self.cons_col].map(lambda x: self.gss_map.get(x, x))
+            df[self.cons_col] = (
+                df[self.cons_col].map(self.gss_map).fillna(df[self.cons_col])
+            )
         return df
 
+    def get_dataframe(self):
+        if self.file_type not in ["csv", "excel"]:
+            self.stderr.write(f"Unknown file type: {self.file_type}")
+            return None
+
+        data = self.read_data_file()
+        if isinstance(data, pd.DataFrame):
+            self.chunks = ()
+            return self.prepare_df(data)
+
+        # the first chunk is returned and the rest prepared as they are read
+        self.chunks = (self.prepare_df(chunk) for chunk in data)
+        return next(self.chunks, None)
+
+    def get_source_hash(self, df):
+        if not self.chunk_size:
+            return super().get_source_hash(df)
+
+        # only the first chunk has been read, so use the file and the config
+        # used to read it
+        conf = json.dumps(self.conf, sort_keys=True, default=str)
+        return hashlib.sha256(f"{file_hash(self.data_file)}{conf}".encode()).hexdigest()
+
     def get_row_data(self, row, conf):
         value = super().get_row_data(row, conf)
         if conf["defaults"]["data_type"] == "url":
@@ -249,6 +289,9 @@ class Command(BaseImportFromDataFrameCommand):
 
         return value
 
+    def get_import_name(self):
+        return f"{super().get_import_name()}:{','.join(self.data_sets)}"
+
     def initial_delete(self, conf):
         AreaData.objects.filter(
             data_type__name=conf["name"], area__area_type__code=self.area_type
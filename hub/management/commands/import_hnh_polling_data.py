@@ -1,6 +1,5 @@
 from django.conf import settings
-from django.db.models import Avg, FloatField, Max, Min
-from django.db.models.functions import Cast, Coalesce
+from django.db.models import FloatField
 
 import pandas as pd
 from tqdm import tqdm
@@ -417,9 +416,13 @@ class Command(BaseImportFromDataFrameCommand):
                         )
 
             converter = DataTypeConverter()
-            for data_type in data_types.values():
-                if data_type.area_type == converter.old_area_type:
-                    converter.convert_datatype_to_new_geography(data_type)
+            converter.convert_datatypes_to_new_geography(
+                [
+                    data_type
+                    for data_type in data_types.values()
+                    if data_type.area_type == converter.old_area_type
+                ]
+            )
 
     def delete_data(self):
         self.log("Deleting existing AreaData objects for DataTypes:")
@@ -432,8 +435,8 @@ class Command(BaseImportFromDataFrameCommand):
                     self.log(f"    {data_type_slug}")
                     AreaData.objects.filter(data_type__name=data_type_slug).delete()
 
-    def update_averages(self):
-        self.log("Calculating averages for DataTypes:")
+    def imported_data_types(self):
+        data_types = []
         for file in self.files:
 
             file_loc = settings.BASE_DIR / "data" / file["source_filename"]
@@ -448,58 +451,21 @@ class Command(BaseImportFromDataFrameCommand):
                         file["data_set_name"], col["slug"]
                     )
                     self.log(f"    {data_type_slug}")
-                    data_type = DataType.objects.get(
-                        name=data_type_slug,
-                        area_type__code=self.area_type,
-                    )
-                    average = (
-                        AreaData.objects.filter(data_type=data_type)
-                        .annotate(
-                            cast_data=Cast(
-                                Coalesce("int", "float"), output_field=self.cast_field()
-                            )
+                    data_types.append(
+                        DataType.objects.get(
+                            name=data_type_slug,
+                            area_type__code=self.area_type,
                         )
-                        .all()
-                        .aggregate(Avg("cast_data"))
                     )
+        return data_types
 
-                    data_type.average = average["cast_data__avg"]
-                    data_type.save()
+    def update_averages(self):
+        self.log("Calculating averages for DataTypes:")
+        DataType.update_stats(self.imported_data_types(), ["average"])
 
     def update_max_min(self):
         self.log("Calculating min/max values for DataTypes:")
-        for file in self.files:
-
-            file_loc = settings.BASE_DIR / "data" / file["source_filename"]
-
-            if not file_loc.exists():
-                self.log(f"File {file_loc} not found - not calculating average")
-                continue
-
-            for col in file["source_cols"]:
-                if col["label"] is not None:
-                    data_type_slug = self.get_data_type_slug(
-                        file["data_set_name"], col["slug"]
-                    )
-                    self.log(f"    {data_type_slug}")
-                    data_type = DataType.objects.get(
-                        name=data_type_slug,
-                        area_type__code=self.area_type,
-                    )
-                    base = (
-                        AreaData.objects.filter(data_type=data_type)
-                        .annotate(
-                            cast_data=Cast(
-                                Coalesce("int", "float"), output_field=self.cast_field()
-                            )
-                        )
-                        .all()
-                    )
-                    max = base.aggregate(Max("cast_data"))
-                    min = base.aggregate(Min("cast_data"))
-                    data_type.maximum = max["cast_data__max"]
-                    data_type.minimum = min["cast_data__min"]
-                    data_type.save()
+        DataType.update_stats(self.imported_data_types(), ["maximum", "minimum"])
 
     def handle(self, quiet=False, *args, **options):
         self._quiet = quiet
@@ -10,6 +10,7 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import contact details for UK Members of Parliament"
+    depends_on = ["import_mps"]
 
     area_type = "WMC23"
 
@@ -26,6 +27,7 @@ class Command(BaseImportCommand):
             self.area_type = options["area_type"]
 
         self.import_results()
+        self.update_person_profiles()
 
     def get_results(self):
         mps = PersonData.objects.filter(
@@ -13,6 +13,8 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import relevant MP EDM signatures"
+    # mp_first_elected is set by import_mps_election_results
+    depends_on = ["import_mps", "import_mps_election_results"]
 
     edm_list = settings.BASE_DIR / "data" / "relevant_edms.csv"
     early_day_motion_ids = []
@@ -40,6 +42,7 @@ class Command(BaseImportCommand):
         self.data_types = self.create_data_types(edms)
         self.delete_data()
         self.import_results(edms)
+        self.update_person_profiles()
 
     @cache
     def get_parlid_lookup(self):
@@ -10,6 +10,7 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import MP engagement (open letters)"
+    depends_on = ["import_mps"]
     data_file = settings.BASE_DIR / "data" / "open_letters.csv"
 
     def handle(self, *args, **options):
@@ -23,6 +24,7 @@ class Command(BaseImportCommand):
                 )
             return
         self.import_results(df)
+        self.update_person_profiles()
 
     def get_person_from_id(self, id):
         try:
@@ -10,12 +10,14 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import MP Job titles"
+    depends_on = ["import_mps"]
 
     area_type = "WMC23"
 
     def handle(self, *args, **options):
         super(Command, self).handle(*args, **options)
         self.import_results()
+        self.update_person_profiles()
 
     def get_area_type(self):
         return AreaType.objects.get(code=self.area_type)
@@ -13,6 +13,7 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import relevant MP written questions, be default fetches data from previous day."
+    depends_on = ["import_mps"]
 
     departments = [
         "Department for Environment, Food and Rural Affairs",
@@ -162,3 +163,4 @@ class Command(BaseImportCommand):
 
         self.data_types = self.create_data_types()
         self.import_results(wrans)
+        self.update_person_profiles()
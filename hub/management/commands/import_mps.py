@@ -36,6 +36,7 @@ class Command(BaseImportCommand):
         self.import_mps()
         self.check_for_duplicate_mps()
         self.import_mp_images()
+        self.update_person_profiles()
 
     # these are separate functions so we can mock them in tests
     def get_twfy_df(self):
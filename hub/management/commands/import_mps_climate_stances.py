@@ -11,6 +11,7 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import relevant MP climate stances from TWFY votes"
+    depends_on = ["import_mps"]
 
     policy_ids = [
         6741,
@@ -76,6 +77,7 @@ class Command(BaseImportCommand):
         self.data_types = self.create_data_types(policy_map)
         self.delete_data()
         self.import_results(policies)
+        self.update_person_profiles()
 
     def get_policy(self, policy_id, positions):
         p = positions.loc[positions["policy_id"] == policy_id]
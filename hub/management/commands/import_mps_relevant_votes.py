@@ -10,6 +10,8 @@ from .base_importers import BaseImportCommand
 
 class Command(BaseImportCommand):
     help = "Import relevant MP votes + support on amendments, etc"
+    # mp_first_elected is set by import_mps_election_results
+    depends_on = ["import_mps", "import_mps_election_results"]
 
     vote_division_ids = [1116, 1372]
     early_day_motion_ids = [58953, 60083]
@@ -31,6 +33,7 @@ class Command(BaseImportCommand):
         self.data_types = self.create_data_types(votes, edms)
         self.delete_data()
         self.import_results(votes, edms)
+        self.update_person_profiles()
 
     @cache
     def get_parlid_lookup(self):
@@ -13,10 +13,12 @@ COMMITTEE_REQUEST_URL = "https://committees-api.parliament.uk/api/Committees"
 
 class Command(BaseImportCommand):
     help = "Import select committee memberships for UK Members of Parliament"
+    depends_on = ["import_mps"]
 
     def handle(self, *args, **options):
         super(Command, self).handle(*args, **options)
         self.import_results()
+        self.update_person_profiles()
 
     def get_df(self):
         if not self._quiet:
@@ -37,6 +37,7 @@ class Command(BaseCommand):
             return
         self.data_types = self.create_data_types()
         self.import_results(df)
+        Person.update_profiles()
 
     def get_person_from_name(self, name):
         name = self.name_map.get(name, name)
@@ -19,6 +19,7 @@ from .base_importers import BaseImportCommand, party_shades, standardise_party_n
 
 class Command(BaseImportCommand):
     help = "Import Police & Crime Commissioners"
+    depends_on = ["import_policing_areas"]
 
     area_type = "PFA"
     # https://candidates.democracyclub.org.uk/data/export_csv/?election_date=2024-05-02&election_id=%5Epcc.%2A&format=csv&field_group=results&results=True
@@ -68,6 +69,7 @@ class Command(BaseImportCommand):
         self.import_pccs()
         self.import_election_results()
         self.import_turnout()
+        self.update_person_profiles()
 
     def get_area_map(self):
         """Create a mapping from post_label variants to PFA area GSS codes"""
@@ -282,8 +284,7 @@ class Command(BaseImportCommand):
                 )
 
         # Update statistics
-        majority_dt.update_average()
-        majority_dt.update_max_min()
+        DataType.update_stats([majority_dt])
 
         # Create DataSet for second placed party
         second_party_ds, _ = DataSet.objects.update_or_create(
@@ -442,5 +443,4 @@ class Command(BaseImportCommand):
             self.stdout.write(f"Imported turnout for {len(turnout_df)} areas")
 
         # Update statistics
-        turnout_dt.update_average()
-        turnout_dt.update_max_min()
+        DataType.update_stats([turnout_dt])
@@ -11,7 +11,9 @@ from shapely.geometry import MultiPolygon, Polygon, shape
 from shapely.ops import unary_union
 from tqdm import tqdm
 
+from hub.geometry import build_geometry_cache
 from hub.models import Area, AreaOverlap, AreaType
+from hub.spatial import build_spatial_index
 
 from .base_importers import BaseImportCommand
 
@@ -263,5 +265,8 @@ class Command(BaseImportCommand):
             if diagnostics:
                 print(f"  Created {len(la_areas)} AreaOverlap relationships")
 
+        build_geometry_cache(area_type)
+        build_spatial_index(area_type)
+
         if diagnostics or not quiet:
             print("Policing areas import complete")
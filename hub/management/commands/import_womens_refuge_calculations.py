@@ -9,6 +9,8 @@ class Command(MultipleAreaTypesMixin, BaseImportFromDataFrameCommand):
     help = "Calculate Council of Europe womens refuge recommendations from area populations"
 
     area_types = ["WMC23", "STC", "DIS"]
+    # the populations are read from cons_population and council_population_count
+    depends_on = ["import_area_countries", "import_from_config", "import_council_data"]
 
     message = "Importing womens refuge recommendations"
     do_not_convert = True
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from hub.models import AreaMatrix, AreaType
+
+
+class Command(BaseCommand):
+    help = "Rebuild the area matrix used for filtering on the explore page"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--area_types",
+            action="store",
+            help="Comma separated list of area type codes to refresh, defaults to all",
+        )
+        parser.add_argument(
+            "-q", "--quiet", action="store_true", help="Silence progress messages."
+        )
+
+    def handle(self, area_types=None, quiet=False, *args, **options):
+        types = AreaType.objects.all()
+        if area_types:
+            types = types.filter(code__in=area_types.split(","))
+
+        for area_type in types:
+            if not quiet:
+                self.stdout.write(f"Refreshing area matrix for {area_type.code}")
+            AreaMatrix.refresh(area_type)
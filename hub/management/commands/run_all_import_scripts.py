@@ -1,18 +1,44 @@
+import json
+import multiprocessing
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime
+from graphlib import CycleError, TopologicalSorter
 from os import listdir
 from os.path import isfile, join
+from pathlib import Path
+from time import perf_counter
 
-from django.core.management import call_command
-from django.core.management.base import BaseCommand
+import django
+from django.conf import settings
+from django.core.management import call_command, load_command_class
+from django.core.management.base import BaseCommand, CommandError
+
+# for importers that don't say what they depend on
+DEFAULT_DEPENDS_ON = ["import_areas"]
+
+
+def run_importer(importer, options, log_file):
+    """
+    run an importer in a worker process with its output going to log_file,
+    returning how long it took and the error if it failed
+    """
+    start = perf_counter()
+    error = None
+    with open(log_file, "w") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            call_command(importer, stdout=log, stderr=log, **options)
+        except Exception as e:
+            traceback.print_exc(file=log)
+            error = str(e) or type(e).__name__
+
+    return perf_counter() - start, error
 
 
 class Command(BaseCommand):
     help = "Run all of the import scripts"
 
-    priority_imports = [
-        "import_areas",
-        "import_mps",
-        "import_mps_election_results",
-    ]
     skip_imports = [
         "import_2024_ppcs",  # no longer relevant post-election
         "import_mps_appg_data",  # hasn't been updated for Autumn 2024 APPGs
@@ -60,6 +86,35 @@ class Command(BaseCommand):
             help="Add dataset to all sites",
         )
 
+        parser.add_argument(
+            "-w",
+            "--workers",
+            action="store",
+            type=int,
+            default=4,
+            help="Number of importers to run at the same time",
+        )
+
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip importers that succeeded in the previous run",
+        )
+
+        parser.add_argument(
+            "--state_file",
+            action="store",
+            default=settings.BASE_DIR / "data" / "import_state.json",
+            help="File to record the state of the run in, for --resume",
+        )
+
+        parser.add_argument(
+            "--log_dir",
+            action="store",
+            default=settings.BASE_DIR / "data" / "import_logs",
+            help="Directory to write the output of each importer to",
+        )
+
     def run_generator_scripts(self, generators, *args, **options):
         total = str(len(generators))
         failed_generators = {}
@@ -77,41 +132,147 @@ class Command(BaseCommand):
         for generator, e in failed_generators.items():
             print(f"    {generator}: {e}")
 
-    def run_importer_scripts(self, imports, *args, **options):
-        total = str(len(imports))
-        i = 1
-        failed_imports = {}
-        for importer in self.priority_imports:
-            imports.remove(importer)
-            print(f"Running command: {importer} ({str(i)}/{total})")
-            try:
-                call_command(importer, (), **options)
-            except Exception as e:
-                print(f"Error raised: {e}")
-                print("Moving to next importer...")
-                failed_imports[importer] = e
-            print("\n")
-            i += 1
-        if failed_imports != {}:
-            print("One of the priority importers failed. Please fix, and try again")
-            exit()
+    def get_dependencies(self, imports):
+        """
+        the importers in imports that each importer depends on. Dependencies
+        that aren't being run, e.g. skipped importers, are ignored
+        """
+        dependencies = {}
         for importer in imports:
-            print(f"Running command: {importer} ({str(i)}/{total})")
-            try:
-                call_command(importer, (), **options)
-            except Exception as e:
-                print(f"Error raised: {e}")
-                print("Moving to next importer...")
-                failed_imports[importer] = e
-            print("\n")
-            i += 1
+            command = load_command_class("hub", importer)
+            depends_on = getattr(command, "depends_on", DEFAULT_DEPENDS_ON)
+            dependencies[importer] = {
+                dependency
+                for dependency in depends_on
+                if dependency in imports and dependency != importer
+            }
+
+        return dependencies
+
+    def read_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def write_state(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_file, "w") as f:
+            json.dump(self.state, f, indent=2)
+
+    def finish(self, importer, status, duration=0, error=None):
+        self.state[importer] = {
+            "status": status,
+            "duration": round(duration, 1),
+            "error": error,
+            "finished": datetime.now().isoformat(),
+        }
+        self.write_state()
+        message = f"{status}: {importer} ({duration:.1f}s)"
+        if error:
+            message = f"{message} - {error}"
+        print(message)
 
-        print("Failed importers:")
-        for importer, e in failed_imports.items():
-            print(f"    {importer}: {e}")
+    def get_executor(self, workers):
+        # spawn rather than fork so that workers don't share the database
+        # connection of this process
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    def run_importer_scripts(self, imports, workers=4, resume=False, **options):
+        self.dependencies = self.get_dependencies(imports)
+        try:
+            sorter = TopologicalSorter(self.dependencies)
+            sorter.prepare()
+        except CycleError as e:
+            raise CommandError(f"Importers depend on each other: {e.args[1]}")
+
+        previous = self.read_state() if resume else {}
+        self.state = {}
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+
+        total = len(imports)
+        running = {}
+        with self.get_executor(workers) as executor:
+            while sorter.is_active():
+                for importer in sorter.get_ready():
+                    failed = [
+                        dependency
+                        for dependency in self.dependencies[importer]
+                        if self.state[dependency]["status"] != "done"
+                    ]
+                    if failed:
+                        self.finish(
+                            importer,
+                            "skipped",
+                            error=f"depends on {', '.join(sorted(failed))}",
+                        )
+                        sorter.done(importer)
+                    elif previous.get(importer, {}).get("status") == "done":
+                        self.state[importer] = previous[importer]
+                        sorter.done(importer)
+                    else:
+                        count = len(self.state) + len(running) + 1
+                        print(f"Running command: {importer} ({count}/{total})")
+                        future = executor.submit(
+                            run_importer,
+                            importer,
+                            options,
+                            str(self.log_dir / f"{importer}.log"),
+                        )
+                        running[future] = importer
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    importer = running.pop(future)
+                    try:
+                        duration, error = future.result()
+                    except Exception as e:
+                        duration, error = 0, str(e) or type(e).__name__
+                    self.finish(
+                        importer, "failed" if error else "done", duration, error
+                    )
+                    sorter.done(importer)
 
-    def handle(self, generate=False, *args, **options):
+        self.print_summary(imports)
+
+    def print_summary(self, imports):
+        print("\nImporter summary:")
+        width = max(len(importer) for importer in imports)
+        for importer in imports:
+            state = self.state[importer]
+            line = f"    {importer:<{width}}  {state['status']:<7}  {state['duration']:>8.1f}s"
+            if state["error"]:
+                line = f"{line}  {state['error']}"
+            print(line)
+
+        failed = [i for i in imports if self.state[i]["status"] != "done"]
+        if failed:
+            print(f"\n{len(failed)} importers did not complete, see {self.log_dir}")
+            print("Fix them and run again with --resume to carry on from here")
+
+    def handle(
+        self,
+        generate=False,
+        workers=4,
+        resume=False,
+        state_file=None,
+        log_dir=None,
+        *args,
+        **options,
+    ):
+        self.state_file = Path(state_file)
+        self.log_dir = Path(log_dir)
         scripts = self.get_scripts()
         if generate:
             self.run_generator_scripts(generators=scripts["generators"])
-        self.run_importer_scripts(imports=scripts["importers"], **options)
+        self.run_importer_scripts(
+            imports=scripts["importers"], workers=workers, resume=resume, **options
+        )
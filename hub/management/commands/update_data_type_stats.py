@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from hub.models import DataType
+
+
+class Command(BaseCommand):
+    help = "Recalculate the average, maximum and minimum of data types"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--data_sets",
+            action="store",
+            help="Comma separated list of data set names to update, defaults to all",
+        )
+        parser.add_argument(
+            "--area_types",
+            action="store",
+            help="Comma separated list of area type codes to update, defaults to all",
+        )
+        parser.add_argument(
+            "-q", "--quiet", action="store_true", help="Silence progress messages."
+        )
+
+    def handle(self, data_sets=None, area_types=None, quiet=False, *args, **options):
+        data_types = DataType.objects.filter(data_set__table="areadata")
+        if data_sets:
+            data_types = data_types.filter(data_set__name__in=data_sets.split(","))
+        if area_types:
+            data_types = data_types.filter(area_type__code__in=area_types.split(","))
+
+        updated = DataType.update_stats(data_types)
+        if not quiet:
+            self.stdout.write(f"Updated stats for {updated} data types")
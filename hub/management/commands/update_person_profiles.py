@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from hub.models import Person
+
+
+class Command(BaseCommand):
+    help = "Rebuild the profile snapshots of people from their data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--person_types",
+            action="store",
+            help="Comma separated list of person types to update, defaults to all",
+        )
+        parser.add_argument(
+            "-q", "--quiet", action="store_true", help="Silence progress messages."
+        )
+
+    def handle(self, person_types=None, quiet=False, *args, **options):
+        people = Person.objects.all()
+        if person_types:
+            people = people.filter(person_type__in=person_types.split(","))
+
+        updated = Person.update_profiles(people)
+        if not quiet:
+            self.stdout.write(f"Updated profiles for {updated} people")
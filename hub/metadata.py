@@ -0,0 +1,164 @@
+import threading
+from collections import defaultdict
+from time import monotonic
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.dispatch import receiver
+
+from hub.models import AreaType, DataSet, DataType, SiteDataSet
+
+VERSION_KEY = "metadata_registry_version"
+
+# the version key is only shared between processes if the cache is, so also
+# reload after this many seconds to pick up changes made by imports
+MAX_AGE = 60
+
+
+def bump_version():
+    """
+    mark the metadata as changed so registries reload it on their next use
+    """
+    cache.set(VERSION_KEY, uuid4().hex, None)
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+class MetadataRegistry:
+    """
+    all the AreaTypes, visible DataSets and DataTypes, and which sites and
+    area types the data sets are available for, loaded once and indexed so
+    that requests can look them up without querying the database
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.loaded_at = None
+        self.index = None
+
+    def load(self):
+        area_types = {area_type.code: area_type for area_type in AreaType.objects.all()}
+
+        data_sets = {}
+        data_sets_by_id = {}
+        for data_set in DataSet.objects.filter(visible=True):
+            data_sets[data_set.name] = data_set
+            data_sets_by_id[data_set.pk] = data_set
+
+        data_set_area_types = defaultdict(set)
+        for (
+            data_set_id,
+            area_type_id,
+        ) in DataSet.areas_available.through.objects.values_list(
+            "dataset_id", "areatype_id"
+        ):
+            data_set_area_types[data_set_id].add(area_type_id)
+
+        data_set_sites = defaultdict(set)
+        for data_set_id, site_id in SiteDataSet.objects.values_list(
+            "dataset_id", "site_id"
+        ):
+            data_set_sites[data_set_id].add(site_id)
+
+        data_types = {}
+        for data_type in DataType.objects.filter(data_set__visible=True):
+            # share the data set so using it doesn't need a query
+            data_type.data_set = data_sets_by_id[data_type.data_set_id]
+            data_types[(data_type.name, data_type.area_type_id)] = data_type
+
+        return {
+            "area_types": area_types,
+            "data_sets": data_sets,
+            "data_set_area_types": data_set_area_types,
+            "data_set_sites": data_set_sites,
+            "data_types": data_types,
+        }
+
+    def is_stale(self, version):
+        return (
+            self.index is None
+            or version != self.version
+            or monotonic() - self.loaded_at > MAX_AGE
+        )
+
+    def get_index(self):
+        version = current_version()
+        if self.is_stale(version):
+            with self.lock:
+                if self.is_stale(version):
+                    # build the new index before swapping it in so other
+                    # threads never see a partly loaded one
+                    index = self.load()
+                    self.version = version
+                    self.loaded_at = monotonic()
+                    self.index = index
+
+        return self.index
+
+    def clear(self):
+        with self.lock:
+            self.index = None
+            self.version = None
+            self.loaded_at = None
+
+    def area_type(self, code):
+        return self.get_index()["area_types"].get(code)
+
+    def data_set(self, name, area_type, site=None):
+        """
+        the visible data set called name that is available for area_type and,
+        if set, on site
+        """
+        index = self.get_index()
+        data_set = index["data_sets"].get(name)
+        if data_set is None or area_type is None:
+            return None
+        if area_type.pk not in index["data_set_area_types"][data_set.pk]:
+            return None
+        if site is not None and site.pk not in index["data_set_sites"][data_set.pk]:
+            return None
+        return data_set
+
+    def data_type(self, name, area_type, site=None):
+        """
+        the data type called name for area_type in a visible data set that is,
+        if set, on site
+        """
+        index = self.get_index()
+        data_type = index["data_types"].get((name, getattr(area_type, "pk", None)))
+        if data_type is None:
+            return None
+        if (
+            site is not None
+            and site.pk not in index["data_set_sites"][data_type.data_set_id]
+        ):
+            return None
+        return data_type
+
+
+registry = MetadataRegistry()
+
+
+@receiver(models.signals.post_save, sender=AreaType)
+@receiver(models.signals.post_delete, sender=AreaType)
+@receiver(models.signals.post_save, sender=DataSet)
+@receiver(models.signals.post_delete, sender=DataSet)
+@receiver(models.signals.post_save, sender=DataType)
+@receiver(models.signals.post_delete, sender=DataType)
+@receiver(models.signals.post_save, sender=SiteDataSet)
+@receiver(models.signals.post_delete, sender=SiteDataSet)
+@receiver(models.signals.m2m_changed, sender=DataSet.areas_available.through)
+@receiver(models.signals.m2m_changed, sender=DataSet.sites.through)
+def metadata_changed(sender, *args, **kwargs):
+    bump_version()
+    # and again once any staged import is committed, in case a registry has
+    # reloaded the metadata from before it in the meantime
+    transaction.on_commit(bump_version)
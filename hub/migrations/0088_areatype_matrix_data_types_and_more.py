@@ -0,0 +1,55 @@
+# Generated by Django 4.2.29 on 2026-10-18 10:40
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hub", "0087_alter_areaoverlap_area_from_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="areatype",
+            name="matrix_data_types",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="areatype",
+            name="matrix_last_update",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="AreaMatrix",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("last_update", models.DateTimeField(auto_now=True)),
+                (
+                    "area",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="matrix",
+                        to="hub.area",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.29 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hub", "0088_areatype_matrix_data_types_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="areadata",
+            index=models.Index(
+                fields=["area", "data_type"], name="hub_areadat_area_id_7c9ab0_idx"
+            ),
+        ),
+    ]
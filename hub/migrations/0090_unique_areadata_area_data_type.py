@@ -0,0 +1,54 @@
+# Generated by Django 4.2.29 on 2026-10-18 15:02
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def check_duplicates(apps, schema_editor):
+    """
+    the unique constraint can't be added while an area has more than one
+    value for a data type, and which to keep can't be decided here, so stop
+    and list the data types for them to be imported again
+    """
+    AreaData = apps.get_model("hub", "AreaData")
+    duplicates = (
+        AreaData.objects.values(
+            "area_id",
+            "data_type_id",
+            "data_type__name",
+            "data_type__area_type__code",
+        )
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+    )
+    data_types = sorted(
+        {
+            f"{row['data_type__name']} ({row['data_type__area_type__code']})"
+            for row in duplicates
+        }
+    )
+    if data_types:
+        raise RuntimeError(
+            "areas have more than one value for these data types: "
+            + ", ".join(data_types)
+            + ". Delete their data and import it again before migrating."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hub", "0089_areadata_hub_areadat_area_id_7c9ab0_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="areadata",
+            name="hub_areadat_area_id_7c9ab0_idx",
+        ),
+        migrations.AlterUniqueTogether(
+            name="areadata",
+            unique_together={("area", "data_type")},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.29 on 2026-10-18 16:10
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hub", "0090_unique_areadata_area_data_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="person",
+            name="profile",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                encoder=django.core.serializers.json.DjangoJSONEncoder,
+            ),
+        ),
+    ]
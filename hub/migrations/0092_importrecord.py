@@ -0,0 +1,37 @@
+# Generated by Django 4.2.29 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hub", "0091_person_profile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("importer", models.CharField(max_length=200)),
+                ("area_type", models.CharField(max_length=20)),
+                ("source_hash", models.CharField(max_length=64)),
+                ("config_hash", models.CharField(max_length=64)),
+                ("row_count", models.IntegerField()),
+                ("data_count", models.IntegerField()),
+                ("last_update", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "unique_together": {("importer", "area_type")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.29 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hub", "0092_importrecord"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importrecord",
+            name="data_type_ids",
+            field=models.JSONField(default=list),
+        ),
+    ]
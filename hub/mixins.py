@@ -1,9 +1,19 @@
 from collections import defaultdict
-from functools import cache
+from datetime import datetime
 
-from django.db.models import Q
+from django.db.models import F, Q
 
-from hub.models import Area, AreaData, AreaType, DataSet, DataType, Person, PersonData
+from hub.filters import compile_filters
+from hub.metadata import registry
+from hub.models import (
+    Area,
+    AreaData,
+    AreaMatrix,
+    DataType,
+    Person,
+    PersonArea,
+    PersonData,
+)
 
 
 class CobrandTemplateMixin:
@@ -35,7 +45,8 @@ class TitleMixin:
 
 
 class FilterMixin:
-    @cache
+    # these are all dictionary lookups in the metadata registry so aren't
+    # cached, caching methods would keep every view instance alive
     def filters(self):
         site = self.request.site
         is_non_member = self.request.user.is_anonymous
@@ -63,10 +74,8 @@ class FilterMixin:
                 comparator = None
                 value = False
 
-            try:
-                dataset = DataSet.objects.get(
-                    name=name, areas_available=area_type, visible=True, sites=site
-                )
+            dataset = registry.data_set(name, area_type, site=site)
+            if dataset is not None:
                 if is_non_member and not dataset.is_public:
                     continue
                 filters.append(
@@ -80,30 +89,23 @@ class FilterMixin:
                         "header_label": dataset.label,
                     }
                 )
-            except DataSet.DoesNotExist:  # pragma: nocover
-                try:
-                    datatype = DataType.objects.get(
-                        name=name,
-                        area_type=area_type,
-                        data_set__visible=True,
-                        data_set__sites=site,
-                    )
-                    filters.append(
-                        {
-                            "dataset": datatype.data_set,
-                            "name": datatype.name,
-                            "label": datatype.label,
-                            "comparator": comparator,
-                            "value": value,
-                            "value_col": datatype.value_col,
-                            "header_label": f"{datatype.data_set.label} - {datatype.label}",
-                        }
-                    )
-                except DataType.DoesNotExist:  # pragma: nocover
-                    pass
+                continue
+
+            datatype = registry.data_type(name, area_type, site=site)
+            if datatype is not None:  # pragma: nocover
+                filters.append(
+                    {
+                        "dataset": datatype.data_set,
+                        "name": datatype.name,
+                        "label": datatype.label,
+                        "comparator": comparator,
+                        "value": value,
+                        "value_col": datatype.value_col,
+                        "header_label": f"{datatype.data_set.label} - {datatype.label}",
+                    }
+                )
         return filters
 
-    @cache
     def columns(self, mp_name=False):
         is_non_member = self.request.user.is_anonymous
 
@@ -122,10 +124,8 @@ class FilterMixin:
                 columns.append({"name": col, "label": col_label_map[col]})
                 continue
 
-            try:
-                dataset = DataSet.objects.get(
-                    name=col, areas_available=area_type, visible=True
-                )
+            dataset = registry.data_set(col, area_type)
+            if dataset is not None:
                 if is_non_member and not dataset.is_public:
                     continue
                 columns.append(
@@ -137,54 +137,42 @@ class FilterMixin:
                         "header_label": dataset.label,
                     }
                 )
-            except DataSet.DoesNotExist:
-                try:
-                    datatype = DataType.objects.get(
-                        name=col, area_type=area_type, data_set__visible=True
-                    )
-                    columns.append(
-                        {
-                            "dataset": datatype.data_set,
-                            "name": datatype.name,
-                            "value_col": datatype.value_col,
-                            "label": datatype.label,
-                            "header_label": f"{datatype.data_set.label} - {datatype.label}",
-                        }
-                    )
-                except DataType.DoesNotExist:
-                    pass
+                continue
+
+            datatype = registry.data_type(col, area_type)
+            if datatype is not None:
+                columns.append(
+                    {
+                        "dataset": datatype.data_set,
+                        "name": datatype.name,
+                        "value_col": datatype.value_col,
+                        "label": datatype.label,
+                        "header_label": f"{datatype.data_set.label} - {datatype.label}",
+                    }
+                )
 
         return columns
 
-    @cache
     def area_type(self):
         if self.kwargs.get("area_type", None) is not None:
             code = self.kwargs["area_type"]
         else:
             code = self.request.GET.get("area_type", "WMC")
-        try:
-            area_type = AreaType.objects.get(code=code)
-        except AreaType.DoesNotExist:
-            return None
 
-        return area_type
+        return registry.area_type(code)
 
     def query(self):
         query = Area.objects
         area_type = self.area_type()
+        matrix_data_types = set()
         if area_type is not None:
             query = query.filter(area_type=area_type)
+            if self.filters() and area_type.matrix_is_current:
+                matrix_data_types = set(area_type.matrix_data_types)
 
-        for f in self.filters():
-            query = f["dataset"].filter(
-                query,
-                name=f["name"],
-                comparator=f.get("comparator", None),
-                value=f["value"],
-            )
-
-        query = query.distinct("pk")
-        return query
+        # filters are EXISTS subqueries so each area only appears once
+        query = compile_filters(query, self.filters(), matrix_data_types)
+        return query.order_by("pk")
 
     def format_value(self, type, value):
         if type == "percent":
@@ -194,6 +182,158 @@ class FilterMixin:
 
         return value
 
+    # ordering by every value column in turn sorts the rows for each data type
+    # by whichever column holds its value, as only one of them will be set
+    value_ordering = ["float", "int", "date", "bool", "data", "json"]
+
+    def matrix_column_values(self, names, area_ids, as_dict=False):
+        """
+        the values for the area data columns in names from the area matrix,
+        which has a single row per area, in the same form and order as
+        reading them from AreaData
+        """
+        data_types = dict(
+            DataType.objects.filter(
+                area_type=self.area_type(), name__in=names
+            ).values_list("name", "data_type")
+        )
+        rows = list(
+            AreaMatrix.objects.filter(area_id__in=area_ids)
+            .order_by("area_id")
+            .values_list("area__name", "data")
+        )
+
+        values = {}
+        for name in names:
+            data_type = DataType(data_type=data_types.get(name))
+            column = []
+            for area_name, data in rows:
+                if name not in data:
+                    continue
+                value = data[name]
+                # dates are stored as strings in the matrix
+                if data_type.is_date and value is not None:
+                    value = datetime.fromisoformat(value)
+                column.append((area_name, value))
+
+            # missing values sort last, as they do in the database
+            column.sort(key=lambda row: (row[1] is None, row[1]))
+
+            values[name] = []
+            for area_name, value in column:
+                if value is None and data_type.is_number:
+                    value = 0
+                if as_dict:
+                    value = self.format_value(data_type.data_type, value)
+                values[name].append((area_name, str(value)))
+
+        return values
+
+    def column_values(self, cols, area_ids, as_dict=False):
+        """
+        fetch the values for all the area and person data columns in a fixed
+        number of queries rather than one per column, and return them grouped
+        by column name as (area name, value) pairs in column value order.
+        Area data is read from the area matrix where it's up to date
+        """
+        area_type = self.area_type()
+        values = defaultdict(list)
+
+        area_cols = set()
+        person_cols = set()
+        mp_person_cols = set()
+        for col in cols:
+            dataset = col.get("dataset", None)
+            if dataset is None:
+                continue
+            if dataset.table == "areadata":
+                area_cols.add(col["name"])
+            elif dataset.person_type is not None:
+                mp_person_cols.add(col["name"])
+            else:
+                person_cols.add(col["name"])
+
+        if area_cols and area_type is not None and area_type.matrix_is_current:
+            matrix_cols = area_cols.intersection(area_type.matrix_data_types)
+            values.update(self.matrix_column_values(matrix_cols, area_ids, as_dict))
+            area_cols -= matrix_cols
+
+        def format_row(row):
+            value = row.value()
+            if as_dict:
+                value = self.format_value(row.data_type.data_type, value)
+            return str(value)
+
+        if area_cols:
+            rows = (
+                AreaData.objects.filter(
+                    area_id__in=area_ids, data_type__name__in=area_cols
+                )
+                .select_related("data_type")
+                .annotate(area_name=F("area__name"))
+                .order_by(*self.value_ordering)
+            )
+            for row in rows:
+                values[row.data_type.name].append((row.area_name, format_row(row)))
+
+        """
+        Mostly person data is area agnostic but the odd thing, e.g. majority is area
+        type specific so only get data that is for the area type or does not have an
+        area type.
+        """
+        person_area_type_filter = Q(data_type__area_type=area_type) | Q(
+            data_type__area_type__isnull=True
+        )
+        person_rows = []
+        for names, mp_only in ((person_cols, False), (mp_person_cols, True)):
+            if not names:
+                continue
+            filter = {
+                "person__personarea__area_id__in": area_ids,
+                "data_type__name__in": names,
+            }
+            if mp_only:
+                filter["person__personarea__person_type"] = "MP"
+            pd = PersonData.objects.filter(**filter).filter(person_area_type_filter)
+            person_rows.extend(
+                pd.select_related("data_type").order_by(*self.value_ordering)
+            )
+
+        if person_rows:
+            person_areas = defaultdict(list)
+            for person_id, area_name in (
+                PersonArea.objects.filter(
+                    person_id__in={row.person_id for row in person_rows},
+                    area__area_type=area_type,
+                )
+                .order_by("pk")
+                .values_list("person_id", "area__name")
+            ):
+                person_areas[person_id].append(area_name)
+
+            for row in person_rows:
+                value = format_row(row)
+                for area_name in person_areas[row.person_id]:
+                    values[row.data_type.name].append((area_name, value))
+
+        return values
+
+    def mp_names(self, area_ids):
+        """
+        return (area id, area name, MP name) for all the areas of the current
+        area type represented by a current MP of one of the areas in area_ids
+        """
+        mps = Person.objects.filter(
+            personarea__person_type="MP",
+            areas__in=area_ids,
+            personarea__end_date__isnull=True,
+        )
+        return list(
+            PersonArea.objects.filter(person__in=mps, area__area_type=self.area_type())
+            .order_by("area_id", "pk")
+            .values_list("area_id", "area__name", "person__name")
+        )
+
     def data(self, as_dict=False, mp_name=False):
         area_type = self.area_type()
 
@@ -207,15 +347,9 @@ class FilterMixin:
 
         area_data = defaultdict(lambda: defaultdict(list))
 
-        """
-        it is not really possible in django to do multiple joins to a table
-        so it's easiest to construct this by doing one query per column we want
-        to add, limited by the set of areas we've already filtered down to
-        """
-        area_ids = self.query().values_list("pk", flat=True)
+        area_ids = list(self.query().values_list("pk", flat=True))
         cols = self.filters().copy()
         cols.extend(self.columns(mp_name=mp_name))
-        area_type = self.area_type()
 
         """
         shortcut if no filters/columns were requested: just return a single
@@ -233,79 +367,47 @@ class FilterMixin:
                 return area_data
             return data
 
-        """
-        Mostly person data is area agnostic but the odd thing, e.g. majority is area
-        type specific so only get data that is for the area type or does not have an
-        area type.
-        """
-        person_area_type_filter = Q(data_type__area_type=area_type) | Q(
-            data_type__area_type__isnull=True
+        areas = list(
+            Area.objects.filter(id__in=area_ids)
+            .select_related("area_type")
+            .defer("geometry")
+            .order_by("pk")
         )
+
         """
-        first for each column we want gather the data and store it against the
-        area
+        gather the data for all the columns up front and then for each column
+        store it against the area, in column order so the rows come out in the
+        same order as the data
         """
+        column_values = self.column_values(cols, area_ids, as_dict=as_dict)
         for col in cols:
             if col["name"] == "mp_name":
-                has_mp = []
-                for row in Person.objects.filter(
-                    personarea__person_type="MP",
-                    areas__in=area_ids,
-                    personarea__end_date__isnull=True,
-                ):
-                    has_mp.extend([a.id for a in row.areas.filter(area_type=area_type)])
-                    for area in row.areas.filter(area_type=area_type):
-                        area_data[area.name]["MP Name"].append(row.name)
-
-                if len(has_mp) < len(area_ids):
-                    missing_areas = set(area_ids).difference(has_mp)
-                    for row in Area.objects.filter(id__in=missing_areas):
-                        area_data[row.name]["MP Name"].append("No current MP")
+                has_mp = set()
+                for area_id, area_name, name in self.mp_names(area_ids):
+                    has_mp.add(area_id)
+                    area_data[area_name]["MP Name"].append(name)
+
+                for area in areas:
+                    if area.id not in has_mp:
+                        area_data[area.name]["MP Name"].append("No current MP")
 
                 continue
             elif col["name"] == "gss":
-                for row in self.query():
-                    area_data[row.name]["GSS"].append(row.gss)
+                for area in areas:
+                    area_data[area.name]["GSS"].append(area.gss)
                 continue
             elif col["name"] == "url":
-                for row in self.query():
-                    area_data[row.name]["URL"].append(
-                        f"{self.request.build_absolute_uri(row.get_absolute_url())}"
+                for area in areas:
+                    area_data[area.name]["URL"].append(
+                        f"{self.request.build_absolute_uri(area.get_absolute_url())}"
                     )
                 continue
 
-            dataset = col["dataset"]
-            if dataset.table == "areadata":
-                for row in (
-                    AreaData.objects.filter(
-                        area_id__in=area_ids, data_type__name=col["name"]
-                    )
-                    .order_by(col["value_col"])
-                    .select_related("area", "data_type")
-                ):
-                    value = row.value()
-                    if as_dict:
-                        value = self.format_value(row.data_type.data_type, row.value())
-                    area_data[row.area.name][col["label"]].append(str(value))
-            else:
-                filter = {
-                    "person__personarea__area_id__in": area_ids,
-                    "data_type__name": col["name"],
-                }
-                if dataset.person_type is not None:
-                    filter["person__personarea__person_type"] = "MP"
-                pd = PersonData.objects.filter(**filter)
-                pd = pd.filter(person_area_type_filter)
-
-                for row in pd.order_by(col["value_col"]).select_related("data_type"):
-                    value = row.value()
-                    if as_dict:
-                        value = self.format_value(row.data_type.data_type, row.value())
-                    for area in row.person.areas.filter(area_type=area_type):
-                        area_data[area.name][col["label"]].append(str(value))
+            for area_name, value in column_values[col["name"]]:
+                area_data[area_name][col["label"]].append(value)
 
         if as_dict:
-            for area in Area.objects.filter(id__in=area_ids):
+            for area in areas:
                 area_data[area.name]["area"] = area
             return area_data
 
@@ -323,14 +425,5 @@ class FilterMixin:
     def shader(self):
         name = self.request.GET.get("shader")
         area_type = self.area_type()
-        try:
-            return DataSet.objects.get(
-                name=name, areas_available=area_type, visible=True
-            )
-        except DataSet.DoesNotExist:
-            try:
-                return DataType.objects.get(
-                    name=name, area_type=area_type, data_set__visible=True
-                )
-            except DataType.DoesNotExist:
-                return None
+
+        return registry.data_set(name, area_type) or registry.data_type(name, area_type)
@@ -1,16 +1,24 @@
+import hashlib
+import json
 import re
+from collections import defaultdict
 from datetime import datetime, timezone
 from operator import itemgetter
 
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import Avg, FloatField, IntegerField, Max, Min
+from django.db.models import Avg, Case, F, FloatField, IntegerField, Max, Min, When
 from django.db.models.functions import Cast, Coalesce
 from django.dispatch import receiver
 from django.template import TemplateDoesNotExist
 from django.template.loader import get_template
+from django.utils.timezone import now
 
+import numpy as np
+import pandas as pd
 from django_jsonform.models.fields import JSONField
 
 import utils as lih_utils
@@ -142,6 +150,13 @@ class ShaderMixin:
         "orange-300": "#FFB74D",
     }
 
+    # the raw value columns fetched when shading, see CommonData
+    VALUE_COLUMNS = ["data", "date", "float", "int", "json", "bool"]
+
+    # colours are cached against the last update of the data so this only
+    # bounds how long data changed without updating its data type is stale
+    COLOURS_CACHE_TIMEOUT = 60 * 60
+
     @property
     def shader_table(self):
         return self.table
@@ -150,6 +165,12 @@ class ShaderMixin:
     def shader_filter(self):
         return {"data_type__data_set": self}
 
+    @property
+    def shader_last_update(self):
+        return DataType.objects.filter(data_set=self).aggregate(
+            last_update=Max("last_update")
+        )["last_update"]
+
     def shade(self, val, cmin, cmax):
         if val == "":
             return None
@@ -163,10 +184,78 @@ class ShaderMixin:
             shade = 0
         return self.shades[shade]
 
+    def shade_indexes(self, values, cmin, cmax):
+        """
+        the index into shades for each of values, as shade() does per value,
+        or -1 for values that aren't numbers, e.g. blank strings, so they are
+        left with the default colour
+        """
+        values = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+        values = values.to_numpy(dtype=float)
+        if cmax == cmin:
+            x = np.full(len(values), 0.5)
+        else:
+            x = (values - cmin) / (cmax - cmin)
+
+        indexes = np.clip(
+            np.trunc(np.nan_to_num(x) * 9).astype(int) - 1, 0, len(self.shades) - 1
+        )
+        indexes[np.isnan(values)] = -1
+        return indexes
+
+    def opacity(self, value, is_number, min, max):
+        """
+        as CommonData.opacity but for a value fetched with shader_value
+        """
+        if is_number:
+            inc = (max - min) / 100
+            if max == min:
+                opacity = 100
+            elif value == min:
+                opacity = min / inc
+            else:
+                opacity = (value - min) / inc
+            return opacity / 100
+        return 100
+
+    def colours_cache_key(self, areas):
+        last_update = max(
+            filter(None, [self.last_update, self.shader_last_update]),
+            default=None,
+        )
+        gss = sorted(area.gss for area in areas)
+        digest = hashlib.md5(",".join(gss).encode(), usedforsecurity=False)
+        return ":".join(
+            [
+                "colours",
+                self._meta.model_name,
+                str(self.pk),
+                str(areas[0].area_type_id),
+                last_update.isoformat() if last_update else "",
+                digest.hexdigest(),
+            ]
+        )
+
     def colours_for_areas(self, areas):
+        """
+        the colour for each of areas along with the legend for the shader.
+
+        As switching shaders on the explore page asks for the same areas
+        again this is cached against the areas and the last update of the
+        shader's data.
+        """
         if len(areas) == 0:
             return {"properties": {"no_areas": True}}
 
+        key = self.colours_cache_key(areas)
+        colours = cache.get(key)
+        if colours is None:
+            colours = self.calculate_colours(areas)
+            cache.set(key, colours, self.COLOURS_CACHE_TIMEOUT)
+
+        return colours
+
+    def calculate_colours(self, areas):
         values, mininimum, maximum = self.shader_value(areas)
         legend = {}
         if self.is_boolean:
@@ -200,48 +289,84 @@ class ShaderMixin:
                     "shades": self.shades,
                 }
             }
+
+        # later options with the same title win, as they did when each value
+        # was checked against every option
+        options = {}
+        if not self.is_boolean and hasattr(self, "options"):
+            options = {option["title"]: option for option in self.options}
+
+        shades = None
+        if self.is_number and len(values) > 0 and mininimum is not None:
+            shades = self.shade_indexes(
+                [data for _, data, _ in values], mininimum, maximum
+            )
+
         colours = {}
-        for value in values:
-            data = value.value()
+        for i, (gss, data, is_number) in enumerate(values):
             if self.is_boolean:
                 val = "Yes" if data else "No"
-                colours[value.gss] = {
+                colours[gss] = {
                     "colour": legend[val],
-                    "opacity": value.opacity(mininimum, maximum) or 0.7,
+                    "opacity": self.opacity(data, is_number, mininimum, maximum) or 0.7,
                     "value": val,
                     "label": self.label,
                 }
-            elif hasattr(self, "options"):
-                for option in self.options:
-                    if option["title"] == data:
-                        colours[value.gss] = {
-                            "colour": self.COLOUR_NAMES.get(
-                                option["shader"], option["shader"]
-                            ),
-                            "opacity": value.opacity(mininimum, maximum) or 0.7,
-                            "value": data,
-                            "label": self.label,
-                        }
-
-            if self.is_number and colours.get(value.gss, None) is None:
-                shade = self.shade(data, mininimum, maximum)
-                if shade is not None:
-                    colours[value.gss] = {
-                        "colour": shade,
-                        "opacity": 0.7,
-                        "label": self.label,
-                        "value": data,
-                    }
+                continue
+
+            try:
+                option = options.get(data, None)
+            except TypeError:  # unhashable values, e.g. json
+                option = None
+            if option is not None:
+                colours[gss] = {
+                    "colour": self.COLOUR_NAMES.get(option["shader"], option["shader"]),
+                    "opacity": self.opacity(data, is_number, mininimum, maximum) or 0.7,
+                    "value": data,
+                    "label": self.label,
+                }
+            elif shades is not None and shades[i] >= 0 and gss not in colours:
+                colours[gss] = {
+                    "colour": self.shades[shades[i]],
+                    "opacity": 0.7,
+                    "label": self.label,
+                    "value": data,
+                }
 
         # if there is no data for an area then need to set the shader to opacity 0 otherwise
         # they will end up as the default
-        missing = {}
-        for area in areas:
-            if colours.get(area.gss, None) is None:
-                missing[area.gss] = {"colour": "#ed6832", "opacity": 0}
+        missing = {
+            area.gss: {"colour": "#ed6832", "opacity": 0}
+            for area in areas
+            if area.gss not in colours
+        }
 
         return {**colours, **missing, **props}
 
+    def shader_rows(self, data):
+        """
+        (gss, value, is_number) for each row of data, with the value as
+        CommonData.value would return it
+        """
+        types = {}
+        rows = []
+        for gss, data_type, *columns in data.values_list(
+            "gss", "data_type__data_type", *self.VALUE_COLUMNS
+        ):
+            if data_type not in types:
+                data_type_obj = DataType(data_type=data_type)
+                types[data_type] = (
+                    self.VALUE_COLUMNS.index(data_type_obj.value_col),
+                    data_type_obj.is_number,
+                )
+            column, is_number = types[data_type]
+            value = columns[column]
+            if is_number and value is None:
+                value = 0
+            rows.append((gss, value, is_number))
+
+        return rows
+
     def shader_value(self, area):
         if self.shader_table == "areadata":
             if self.is_boolean:
@@ -257,14 +382,12 @@ class ShaderMixin:
                 shader_min = min_max["min"]
                 shader_max = min_max["max"]
 
-            data = (
-                AreaData.objects.filter(area__in=area, **self.shader_filter)
-                .select_related("area", "data_type")
-                .annotate(
-                    gss=models.F("area__gss"),
-                )
+            data = AreaData.objects.filter(
+                area__in=area, **self.shader_filter
+            ).annotate(
+                gss=models.F("area__gss"),
             )
-            return data, shader_min, shader_max
+            return self.shader_rows(data), shader_min, shader_max
         else:
             pd = PersonData.objects.filter(
                 person__areas__in=area,
@@ -277,10 +400,8 @@ class ShaderMixin:
                 min=models.Min(self.value_col),
             )
 
-            data = pd.select_related("data_type").annotate(
-                gss=models.F("person__areas__gss")
-            )
-            return data, min_max["min"], min_max["max"]
+            data = pd.annotate(gss=models.F("person__areas__gss"))
+            return self.shader_rows(data), min_max["min"], min_max["max"]
 
         return None, None, None
 
@@ -493,10 +614,36 @@ class AreaType(models.Model):
     short_name_plural = models.CharField(max_length=50)  # eg: "constituency"
     description = models.CharField(max_length=300)
     sites = models.ManyToManyField(Site, through=SiteAreaType)
+    matrix_last_update = models.DateTimeField(null=True, blank=True)
+    matrix_data_types = models.JSONField(default=list, blank=True)
 
     def __str__(self):
         return self.code
 
+    @property
+    def matrix_is_current(self):
+        """
+        The area matrix can only be used in place of AreaData if it was built
+        after the last time data for any of the area type's DataTypes changed
+        """
+        return self.matrix_is_current_except([])
+
+    def matrix_is_current_except(self, data_types):
+        """
+        whether the area matrix is up to date for all the area type's
+        DataTypes apart from data_types
+        """
+        if self.matrix_last_update is None:
+            return False
+
+        data_last_update = (
+            DataType.objects.filter(area_type=self)
+            .exclude(pk__in=[data_type.pk for data_type in data_types])
+            .aggregate(Max("last_update"))["last_update__max"]
+        )
+
+        return data_last_update is None or data_last_update <= self.matrix_last_update
+
 
 class DataType(TypeMixin, ShaderMixin, models.Model):
     data_set = models.ForeignKey(DataSet, on_delete=models.CASCADE)
@@ -516,6 +663,8 @@ class DataType(TypeMixin, ShaderMixin, models.Model):
     )
     auto_converted_text = models.TextField(blank=True, null=True)
 
+    STATS_FIELDS = ["average", "maximum", "minimum"]
+
     def __str__(self):
         name = self.name
         if self.label:
@@ -526,34 +675,62 @@ class DataType(TypeMixin, ShaderMixin, models.Model):
 
         return name
 
-    def update_average(self):
-        average = (
-            AreaData.objects.filter(area__area_type=self.area_type, data_type=self)
-            .annotate(
-                cast_data=Cast(Coalesce("int", "float"), output_field=self.cast_field())
-            )
-            .all()
-            .aggregate(Avg("cast_data"))
+    @classmethod
+    def update_stats(cls, data_types, fields=STATS_FIELDS):
+        """
+        calculate the average, maximum and minimum of the AreaData for each
+        of data_types with a single grouped query and save them in bulk.
+        fields limits which of the stats are updated
+        """
+        data_types = list(data_types)
+        if not data_types:
+            return 0
+
+        value = Coalesce("int", "float")
+        cast_data = Case(
+            When(
+                data_type__data_type__in=["float", "percent"],
+                then=Cast(value, output_field=FloatField()),
+            ),
+            default=Cast(
+                Cast(value, output_field=IntegerField()), output_field=FloatField()
+            ),
         )
+        aggregates = {
+            "average": Avg(cast_data),
+            "maximum": Max(cast_data),
+            "minimum": Min(cast_data),
+        }
+        stats = {
+            row["data_type"]: row
+            for row in AreaData.objects.filter(
+                data_type__in=data_types, area__area_type=F("data_type__area_type")
+            )
+            .values("data_type")
+            .annotate(**{field: aggregates[field] for field in fields})
+        }
 
-        self.average = average["cast_data__avg"]
-        self.save()
+        updated = now()
+        for data_type in data_types:
+            row = stats.get(data_type.pk, {})
+            for field in fields:
+                setattr(data_type, field, row.get(field, None))
+            data_type.last_update = updated
 
-    def update_max_min(self):
-        base = (
-            AreaData.objects.filter(area__area_type=self.area_type, data_type=self)
-            .annotate(
-                cast_data=Cast(Coalesce("int", "float"), output_field=self.cast_field())
-            )
-            .all()
-        )
+        updated = cls.objects.bulk_update(data_types, [*fields, "last_update"])
 
-        max = base.aggregate(Max("cast_data"))
-        min = base.aggregate(Min("cast_data"))
+        # bulk_update doesn't send post_save so let the metadata registry know
+        from hub.metadata import bump_version
 
-        self.maximum = max["cast_data__max"]
-        self.minimum = min["cast_data__min"]
-        self.save()
+        bump_version()
+
+        return updated
+
+    def update_average(self):
+        DataType.update_stats([self], ["average"])
+
+    def update_max_min(self):
+        DataType.update_stats([self], ["maximum", "minimum"])
 
     @property
     def cast_field(self):
@@ -570,6 +747,10 @@ class DataType(TypeMixin, ShaderMixin, models.Model):
     def shader_filter(self):
         return {"data_type": self}
 
+    @property
+    def shader_last_update(self):
+        return max(self.last_update, self.data_set.last_update)
+
     @property
     def auto_conversion_disclaimer(self):
         text = None
@@ -751,6 +932,124 @@ class AreaOverlap(models.Model):
 class AreaData(CommonData):
     area = models.ForeignKey(Area, on_delete=models.CASCADE)
 
+    class Meta:
+        unique_together = ["area", "data_type"]
+
+
+class ImportRecord(models.Model):
+    """
+    A fingerprint of the data an importer last imported for an area type, so
+    the import can be skipped if neither the data nor its config has changed.
+    """
+
+    importer = models.CharField(max_length=200)
+    area_type = models.CharField(max_length=20)
+    source_hash = models.CharField(max_length=64)
+    config_hash = models.CharField(max_length=64)
+    row_count = models.IntegerField()
+    data_count = models.IntegerField()
+    # the DataTypes imported, so the data can be checked without them being
+    # created or updated
+    data_type_ids = models.JSONField(default=list)
+    last_update = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["importer", "area_type"]
+
+
+class AreaMatrix(models.Model):
+    """
+    A wide copy of the filterable AreaData values for an area, keyed by
+    DataType name, so that explore filters and columns can be read from a
+    single row per area rather than joining to AreaData once per dataset.
+    """
+
+    EXCLUDED_DATA_TYPES = ["json", "url"]
+
+    area = models.OneToOneField(Area, on_delete=models.CASCADE, related_name="matrix")
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    last_update = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def refresh(cls, area_type, data_types=None):
+        """
+        rebuild the matrix for area_type, or only the columns for data_types
+        if the rest of it is up to date
+        """
+        if data_types is not None and not area_type.matrix_is_current_except(
+            data_types
+        ):
+            data_types = None
+        refreshed = now()
+
+        # in order of area so that concurrent refreshes lock rows in the same
+        # order
+        matrix = {
+            area_id: {}
+            for area_id in Area.objects.filter(area_type=area_type)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        }
+
+        names = None
+        if data_types is not None:
+            names = {data_type.name for data_type in data_types}
+            for area_id, data in cls.objects.filter(area_id__in=matrix).values_list(
+                "area_id", "data"
+            ):
+                matrix[area_id] = {
+                    name: value for name, value in data.items() if name not in names
+                }
+
+        value_cols = {}
+        multi_valued = set()
+        rows = (
+            AreaData.objects.filter(
+                area__area_type=area_type, data_type__data_set__table="areadata"
+            )
+            .exclude(data_type__data_type__in=cls.EXCLUDED_DATA_TYPES)
+            .values(
+                "area_id",
+                "data_type__name",
+                "data_type__data_type",
+                "data",
+                "date",
+                "float",
+                "int",
+                "bool",
+            )
+        )
+        if names is not None:
+            rows = rows.filter(data_type__name__in=names)
+        for row in rows.iterator():
+            name = row["data_type__name"]
+            data_type = row["data_type__data_type"]
+            if data_type not in value_cols:
+                value_cols[data_type] = DataType(data_type=data_type).value_col
+            if name in matrix[row["area_id"]]:
+                multi_valued.add(name)
+            matrix[row["area_id"]][name] = row[value_cols[data_type]]
+
+        # an area only has one value per data type, but data types in
+        # different data sets can share a name and a single column can't
+        # represent both, so leave those for filtering against AreaData
+        for data in matrix.values():
+            for name in multi_valued.intersection(data):
+                del data[name]
+
+        cls.objects.bulk_create(
+            [cls(area_id=area_id, data=data) for area_id, data in matrix.items()],
+            update_conflicts=True,
+            unique_fields=["area"],
+            update_fields=["data", "last_update"],
+        )
+
+        area_type.matrix_data_types = sorted(
+            set().union(*matrix.values()) - multi_valued
+        )
+        area_type.matrix_last_update = refreshed
+        area_type.save(update_fields=["matrix_last_update", "matrix_data_types"])
+
 
 class SiteAreaAction(models.Model):
     action = models.ForeignKey("AreaAction", on_delete=models.CASCADE)
@@ -809,17 +1108,96 @@ class Person(models.Model):
     photo = models.ImageField(null=True, upload_to="person")
     start_date = models.DateField(null=True)
     end_date = models.DateField(null=True)
+    # snapshot of the person's data so pages can show it without querying
+    # PersonData, see update_profiles
+    profile = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
 
     def __str__(self):
         return self.name
 
     def party(self):
-        if self.person_type == "PCC":
-            data_type = DataType.objects.get(name="pcc_party")
-        else:
-            data_type = DataType.objects.get(name="party")
+        name = "pcc_party" if self.person_type == "PCC" else "party"
+        for entry in self.profile_data():
+            if entry["name"] == name:
+                return entry["value"]
+
+        raise PersonData.DoesNotExist
+
+    @classmethod
+    def update_profiles(cls, people=None):
+        """
+        rebuild the profile snapshot of people, or of everyone if not set,
+        from their PersonData. Data from data sets that aren't public is kept
+        separately so it can be left out for non-members. Returns the number
+        of people updated
+        """
+        if people is None:
+            people = cls.objects.all()
+        people = {person.pk: person for person in people}
+
+        sites = defaultdict(list)
+        for data_set_id, site_id in SiteDataSet.objects.filter(
+            enabled=True
+        ).values_list("dataset_id", "site_id"):
+            sites[data_set_id].append(site_id)
+
+        profiles = {pk: {"public": [], "members": []} for pk in people}
+        data = (
+            PersonData.objects.filter(person__in=people.keys())
+            .select_related("data_type", "data_type__data_set")
+            .order_by("pk")
+        )
+        for datum in data.iterator():
+            data_type = datum.data_type
+            data_set = data_type.data_set
+            partition = "public" if data_set.is_public else "members"
+            profiles[datum.person_id][partition].append(
+                {
+                    "id": datum.pk,
+                    "name": data_type.name,
+                    "data_type": data_type.data_type,
+                    "area_type": data_type.area_type_id,
+                    "label": data_set.label,
+                    "subcategory": data_set.subcategory,
+                    "visible": data_set.visible,
+                    "sites": sorted(sites[data_set.pk]),
+                    "value": datum.value(),
+                }
+            )
 
-        return PersonData.objects.get(person=self, data_type=data_type).value()
+        for pk, person in people.items():
+            # match what's read back from the database, e.g. dates as strings
+            person.profile = json.loads(json.dumps(profiles[pk], cls=DjangoJSONEncoder))
+        cls.objects.bulk_update(people.values(), ["profile"], batch_size=500)
+
+        return len(people)
+
+    def profile_data(self, site=None, area_type=None, is_non_member=False):
+        """
+        the data in the person's profile snapshot, which is built when their
+        data is imported. If site or area_type are set only data shown for
+        them is included, and data that isn't public is left out if
+        is_non_member
+        """
+        partitions = ["public"] if is_non_member else ["public", "members"]
+        data = []
+        for partition in partitions:
+            for entry in self.profile.get(partition, []):
+                if site is not None and (
+                    not entry["visible"] or site.pk not in entry["sites"]
+                ):
+                    continue
+                if area_type is not None and entry["area_type"] not in (
+                    None,
+                    area_type.pk,
+                ):
+                    continue
+                # dates come back from the database as strings
+                if entry["data_type"] == "date" and entry["value"]:
+                    entry = {**entry, "value": datetime.fromisoformat(entry["value"])}
+                data.append(entry)
+
+        return sorted(data, key=itemgetter("id"))
 
     class Meta:
         unique_together = ("external_id", "id_type")
@@ -837,16 +1215,48 @@ class Token(models.Model):
     domain_id = models.IntegerField()
 
 
+def cast_value(data_type, data):
+    """
+    the columns to set for data with data_type, with dates and numbers moved
+    out of data into their own column
+    """
+    if data:
+        if data_type.is_date:
+            date = datetime.fromisoformat(data)
+            # parliament API does not add timezones to things that are dates so we
+            # need to add them
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=timezone.utc)
+            return {"date": date, "data": ""}
+        elif data_type.is_float:
+            return {"float": float(data), "data": ""}
+        elif data_type.is_number:
+            return {"int": int(data), "data": ""}
+
+    return {"data": data}
+
+
+@receiver(models.signals.post_save, sender=DataSet)
+@receiver(models.signals.post_save, sender=SiteDataSet)
+@receiver(models.signals.post_delete, sender=SiteDataSet)
+def rebuild_person_profiles(sender, instance, *args, **kwargs):
+    """
+    profiles include details of the data set so rebuild the profiles of
+    people with data in it
+    """
+    data_set_id = instance.pk if sender is DataSet else instance.dataset_id
+    people = Person.objects.filter(
+        persondata__data_type__data_set_id=data_set_id
+    ).distinct()
+    if people.exists():
+        Person.update_profiles(people)
+
+
 @receiver(models.signals.pre_save, sender=AreaData)
 @receiver(models.signals.pre_save, sender=PersonData)
 def cast_data(sender, instance, *args, **kwargs):
     if instance.is_date and instance.date is None and instance.data:
-        date = datetime.fromisoformat(instance.data)
-        # parliament API does not add timezones to things that are dates so we
-        # need to add them
-        if date.tzinfo is None:
-            date = date.replace(tzinfo=timezone.utc)
-        instance.date = date
+        instance.date = cast_value(instance.data_type, instance.data)["date"]
         instance.data = ""
 
     elif instance.is_float and instance.float is None and instance.data:
@@ -0,0 +1,149 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hub.downloads import fetch_df
+from hub.models import AreaOverlap
+from utils.constituency_mapping import get_overlap_url
+
+OVERLAP_COLUMNS = {"population": "overlap_pop", "area": "overlap_area"}
+
+
+class OverlapMatrix:
+    """
+    The weight of each input area in each output area it overlaps, stored as
+    the list of overlapping pairs as almost all pairs of areas don't overlap.
+    Values for the input areas are converted to the output areas by
+    multiplying by the matrix, which converts any number of data types at once
+    """
+
+    def __init__(self, input_codes, output_codes, input_index, output_index, weights):
+        self.input_codes = pd.Index(input_codes)
+        self.output_codes = pd.Index(output_codes)
+
+        # sorted by output so the values for each output are summed in one go
+        order = np.argsort(output_index, kind="stable")
+        self.input_index = np.asarray(input_index)[order]
+        self.output_index = np.asarray(output_index)[order]
+        self.weights = np.asarray(weights, dtype=float)[order]
+        self.outputs, self.starts = np.unique(self.output_index, return_index=True)
+
+    @classmethod
+    def from_pairs(cls, inputs, outputs, weights):
+        pairs = pd.DataFrame(
+            {"input": list(inputs), "output": list(outputs), "weight": weights}
+        ).dropna()
+        input_index, input_codes = pd.factorize(pairs["input"], sort=True)
+        output_index, output_codes = pd.factorize(pairs["output"], sort=True)
+        return cls(
+            input_codes, output_codes, input_index, output_index, pairs["weight"]
+        )
+
+    @classmethod
+    def from_overlap_csv(
+        cls,
+        input_geography,
+        output_geography,
+        overlap_measure="population",
+        input_values_type="percentage",
+    ):
+        """
+        the matrix from mySociety's overlap CSV for the geographies, with the
+        weights used by convert_data_geographies. Absolute values are divided
+        by the population of their input area so they are shared out between
+        the output areas
+        """
+        overlaps = load_overlaps(input_geography, output_geography)
+        weights = overlaps[OVERLAP_COLUMNS[overlap_measure]].astype(float)
+        if input_values_type == "absolute":
+            weights = weights / overlaps["original_pop"]
+
+        return cls.from_pairs(
+            overlaps[input_geography], overlaps[output_geography], weights.values
+        )
+
+    @classmethod
+    def from_area_overlaps(cls, from_area_types, to_area_type, overlap_measure=None):
+        """
+        the matrix from AreaOverlap, keyed by gss code, with the percentage of
+        the population or area of each input area in each output area as the
+        weights, or weights of one if overlap_measure is None
+        """
+        overlaps = AreaOverlap.objects.filter(
+            area_from__area_type__code__in=from_area_types,
+            area_to__area_type=to_area_type,
+        ).values_list(
+            "area_from__gss",
+            "area_to__gss",
+            "population_overlap",
+            "area_overlap",
+        )
+        df = pd.DataFrame(
+            list(overlaps), columns=["input", "output", "population", "area"]
+        )
+        if overlap_measure is None:
+            weights = np.ones(len(df))
+        else:
+            weights = df[overlap_measure].values / 100.0
+
+        return cls.from_pairs(df["input"], df["output"], weights)
+
+    def convert(self, df, average=True):
+        """
+        convert df, with a column of values for each data type indexed by the
+        code of the input area, to the output areas. Averages are weighted by
+        the overlap and only include the input areas with values, otherwise
+        the weighted values are summed. Output areas that don't overlap any
+        input area with a value are left out
+        """
+        values = np.full((len(self.input_codes), len(df.columns)), np.nan)
+        positions = self.input_codes.get_indexer(df.index)
+        found = positions >= 0
+        values[positions[found]] = df.values[found].astype(float)
+
+        present = ~np.isnan(values)
+        contributions = np.nan_to_num(values)[self.input_index] * self.weights[:, None]
+        present = present[self.input_index]
+
+        converted = np.empty((len(self.outputs), len(df.columns)))
+        has_values = np.zeros((len(self.outputs), len(df.columns)), dtype=bool)
+        if len(self.weights):
+            converted = np.add.reduceat(contributions, self.starts, axis=0)
+            has_values = np.add.reduceat(present, self.starts, axis=0) > 0
+            if average:
+                totals = np.add.reduceat(
+                    present * self.weights[:, None], self.starts, axis=0
+                )
+                np.divide(converted, totals, out=converted, where=totals > 0)
+
+        converted[~has_values] = np.nan
+        result = pd.DataFrame(
+            converted, index=self.output_codes[self.outputs], columns=df.columns
+        )
+        return result.dropna(how="all")
+
+
+def load_overlaps(input_geography, output_geography):
+    """
+    the overlap CSV for the geographies, which is only downloaded again if it
+    has changed
+    """
+    columns = [input_geography, output_geography, *OVERLAP_COLUMNS.values()]
+    columns.append("original_pop")
+    overlaps = fetch_df(
+        get_overlap_url(input_geography, output_geography), usecols=columns
+    )
+    return overlaps.dropna(subset=[input_geography, output_geography])
+
+
+@lru_cache
+def get_overlap_matrix(
+    input_geography, output_geography, overlap_measure, input_values_type
+):
+    return OverlapMatrix.from_overlap_csv(
+        input_geography,
+        output_geography,
+        overlap_measure=overlap_measure,
+        input_values_type=input_values_type,
+    )
@@ -0,0 +1,187 @@
+import json
+import os
+import shutil
+from functools import lru_cache
+from tempfile import mkdtemp
+
+from django.conf import settings
+
+import numpy as np
+
+# the longest postcode once the space is taken out, e.g. SW1A1AA
+POSTCODE_LENGTH = 7
+
+AREA_TYPES = ["WMC23", "STC", "DIS", "PFA"]
+
+
+def normalise_postcode(postcode):
+    return "".join(str(postcode).split()).upper()
+
+
+def postcode_index_path():
+    return settings.POSTCODE_INDEX_ROOT
+
+
+class PostcodeIndex:
+    """
+    The gss codes of the areas each postcode is in, as a sorted array of
+    postcodes and an array of the position of each postcode's areas in the
+    list of gss codes for each area type. The arrays are memory mapped when
+    loaded so the index doesn't need to be read into every process
+    """
+
+    def __init__(self, postcodes, areas, area_types, gss):
+        self.postcodes = postcodes
+        self.areas = areas
+        self.area_types = area_types
+        self.gss = {
+            area_type: np.array(gss[area_type], dtype=object)
+            for area_type in area_types
+        }
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.array([], dtype=f"S{POSTCODE_LENGTH}"),
+            np.zeros((0, 0), dtype=np.int32),
+            [],
+            {},
+        )
+
+    @classmethod
+    def from_codes(cls, postcodes, codes):
+        """
+        build an index from a list of postcodes and a dict of the gss code of
+        the area of each area type each postcode is in, with None where it
+        isn't in one
+        """
+        postcodes = np.array(
+            [normalise_postcode(postcode).encode() for postcode in postcodes],
+            dtype=f"S{POSTCODE_LENGTH}",
+        )
+        area_types = list(codes.keys())
+        gss = {}
+        areas = np.full((len(postcodes), len(area_types)), -1, dtype=np.int32)
+        for i, area_type in enumerate(area_types):
+            values = np.array(codes[area_type], dtype=object)
+            present = np.array([value is not None for value in values], dtype=bool)
+            unique, areas[present, i] = np.unique(
+                values[present].astype(str), return_inverse=True
+            )
+            gss[area_type] = unique.tolist()
+
+        # keep the last of any duplicate postcodes
+        order = np.argsort(postcodes, kind="stable")
+        postcodes, areas = postcodes[order], areas[order]
+        last = np.append(postcodes[1:] != postcodes[:-1], True)
+
+        return cls(postcodes[last], areas[last], area_types, gss)
+
+    @classmethod
+    def load(cls, path):
+        with open(path / "index.json") as f:
+            meta = json.load(f)
+
+        return cls(
+            np.load(path / "postcodes.npy", mmap_mode="r"),
+            np.load(path / "areas.npy", mmap_mode="r"),
+            meta["area_types"],
+            meta["gss"],
+        )
+
+    def save(self, path):
+        """
+        write the index to a new directory and then move it into place, so
+        lookups never read an index that is part old and part new
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = mkdtemp(dir=path.parent)
+        np.save(os.path.join(tmp, "postcodes.npy"), self.postcodes)
+        np.save(os.path.join(tmp, "areas.npy"), self.areas)
+        with open(os.path.join(tmp, "index.json"), "w") as f:
+            json.dump(
+                {
+                    "area_types": self.area_types,
+                    "gss": {
+                        area_type: gss.tolist() for area_type, gss in self.gss.items()
+                    },
+                },
+                f,
+            )
+
+        old = None
+        if path.exists():
+            old = mkdtemp(dir=path.parent)
+            os.replace(path, os.path.join(old, "index"))
+        os.replace(tmp, path)
+        if old:
+            shutil.rmtree(old)
+
+    def find(self, postcodes):
+        """
+        the position in the index of each postcode, or -1 for postcodes that
+        aren't in it
+        """
+        # one character longer than any postcode in the index so that longer
+        # ones aren't truncated into a match
+        postcodes = np.array(
+            [
+                normalise_postcode(postcode).encode("ascii", "replace")
+                for postcode in postcodes
+            ],
+            dtype=f"S{POSTCODE_LENGTH + 1}",
+        )
+        found = np.full(len(postcodes), -1)
+        if len(self) == 0 or len(postcodes) == 0:
+            return found
+
+        positions = np.searchsorted(self.postcodes, postcodes)
+        in_range = positions < len(self)
+        matches = np.zeros(len(postcodes), dtype=bool)
+        matches[in_range] = self.postcodes[positions[in_range]] == postcodes[in_range]
+        found[matches] = positions[matches]
+
+        return found
+
+    def lookup_many(self, postcodes):
+        """
+        the gss codes of the areas each postcode is in, keyed by area type, or
+        None for postcodes that aren't in the index
+        """
+        results = []
+        for position in self.find(postcodes):
+            if position < 0:
+                results.append(None)
+                continue
+
+            results.append(
+                {
+                    area_type: self.gss[area_type][area]
+                    for area_type, area in zip(self.area_types, self.areas[position])
+                    if area >= 0
+                }
+            )
+
+        return results
+
+    def lookup(self, postcode):
+        return self.lookup_many([postcode])[0]
+
+
+@lru_cache
+def load_postcode_index(path, mtime):
+    return PostcodeIndex.load(path)
+
+
+def get_postcode_index():
+    """
+    the index built by build_postcode_index, which is empty if it hasn't been
+    built so every postcode is looked up in MapIt
+    """
+    path = postcode_index_path()
+    if not (path / "index.json").exists():
+        return PostcodeIndex.empty()
+    return load_postcode_index(path, path.stat().st_mtime_ns)
@@ -0,0 +1,161 @@
+import json
+import os
+from functools import lru_cache
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from hub.models import Area
+
+
+def spatial_index_path(code):
+    return settings.GEOMETRY_CACHE_ROOT / "spatial" / f"{code}.npz"
+
+
+class AreaIndex:
+    """
+    An STRtree of the boundaries of the areas of one area type, for finding
+    which area points are in without asking MapIt
+    """
+
+    def __init__(self, gss, names, geometries):
+        self.gss = np.array(gss, dtype=object)
+        self.names = np.array(names, dtype=object)
+        self.geometries = np.array(geometries, dtype=object)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def __len__(self):
+        return len(self.gss)
+
+    @classmethod
+    def from_database(cls, code):
+        gss, names, geometries = [], [], []
+        areas = Area.objects.filter(
+            area_type__code=code, geometry__isnull=False
+        ).values_list("gss", "name", "geometry")
+        for area_gss, name, geometry in areas.order_by("pk"):
+            geometry = json.loads(geometry).get("geometry")
+            if not geometry:
+                continue
+            gss.append(area_gss)
+            names.append(name)
+            geometries.append(shape(geometry))
+
+        return cls(gss, names, geometries)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            wkb = data["wkb"].tobytes()
+            offsets = data["offsets"]
+            geometries = shapely.from_wkb(
+                [wkb[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+            )
+            return cls(data["gss"].tolist(), data["names"].tolist(), geometries)
+
+    def save(self, path):
+        """
+        save the geometries as WKB in a numpy archive, writing to a temporary
+        file first so lookups never read a partial index
+        """
+        wkb = shapely.to_wkb(self.geometries).tolist()
+        offsets = np.cumsum([0, *map(len, wkb)])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=path.parent, suffix=".npz", delete=False) as f:
+            np.savez_compressed(
+                f,
+                gss=np.array(self.gss, dtype=str),
+                names=np.array(self.names, dtype=str),
+                offsets=offsets,
+                wkb=np.frombuffer(b"".join(wkb), dtype=np.uint8),
+            )
+        os.replace(f.name, path)
+
+    def lookup(self, lons, lats):
+        """
+        the position in the index of the area each point is in, or -1 for
+        points that aren't in any area. Points on a boundary get the first
+        of the areas it is between
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        found = np.full(len(lons), -1)
+        valid = np.flatnonzero(~(np.isnan(lons) | np.isnan(lats)))
+        if len(self) == 0 or len(valid) == 0:
+            return found
+
+        points = shapely.points(lons[valid], lats[valid])
+        point_index, area_index = self.tree.query(points, predicate="intersects")
+        points_found, first = np.unique(point_index, return_index=True)
+        found[valid[points_found]] = area_index[first]
+
+        return found
+
+
+def build_spatial_index(area_type):
+    index = AreaIndex.from_database(area_type.code)
+    index.save(spatial_index_path(area_type.code))
+    load_spatial_index.cache_clear()
+    return index
+
+
+@lru_cache
+def load_spatial_index(code, mtime):
+    return AreaIndex.load(spatial_index_path(code))
+
+
+def get_spatial_index(code):
+    """
+    the saved index for the area type with code, which is empty if it hasn't
+    been built by build_spatial_index
+    """
+    path = spatial_index_path(code)
+    if not path.exists():
+        return AreaIndex([], [], [])
+    return load_spatial_index(code, path.stat().st_mtime_ns)
+
+
+class AreaLookup:
+    """
+    Find the areas of each of area_types that points are in, as a local
+    replacement for MapIt point lookups
+    """
+
+    def __init__(self, area_types):
+        self.indexes = {code: get_spatial_index(code) for code in area_types}
+
+    @property
+    def is_available(self):
+        """
+        whether there are boundaries for all of the area types, without which
+        points would be looked up as not in any area of the missing types
+        """
+        return all(len(index) for index in self.indexes.values())
+
+    def points_to_areas(self, lons, lats, field="gss"):
+        """
+        the gss code, or name if field is "names", of the area each point is
+        in for every area type, as arrays with None for points not in an area
+        """
+        areas = {}
+        for code, index in self.indexes.items():
+            found = index.lookup(lons, lats)
+            values = np.full(len(found), None, dtype=object)
+            values[found >= 0] = getattr(index, field)[found[found >= 0]]
+            areas[code] = values
+
+        return areas
+
+    def point_to_gss_codes(self, lon, lat):
+        """
+        the gss codes of the areas the point is in, keyed by area type
+        """
+        return {
+            code: gss[0]
+            for code, gss in self.points_to_areas([lon], [lat]).items()
+            if gss[0] is not None
+        }
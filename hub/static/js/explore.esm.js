@@ -125,10 +125,17 @@ const app = createApp({
 
       var area_type = this.area_type
 
-      return fetch(url.href)
-        .then(response => response.json())
-        .then((datasets) => {
+      // favourites are fetched separately so the list of datasets can be
+      // cached for everyone
+      const favouritesUrl = new URL(window.location.origin + '/explore/favourites.json')
+
+      return Promise.all([
+        fetch(url.href).then(response => response.json()),
+        fetch(favouritesUrl.href).then(response => response.json())
+      ])
+        .then(([datasets, favourites]) => {
           datasets.forEach(function(d) {
+            d.is_favourite = favourites.includes(d.name)
             if ("stats" in d && area_type in d["stats"]) {
               if (d["stats"][area_type]["defaultValue"]) {
                 d["defaultValue"] = d["stats"][area_type]["defaultValue"]
@@ -340,6 +347,10 @@ const app = createApp({
 
       if (["WMC", "WMC23", "DIS", "STC", "PFA"].includes(this.area_type)) {
         url = new URL(window.location.origin + '/exploregeometry/' + this.area_type + '.json')
+        // small screens don't need boundaries at full detail
+        if (window.matchMedia('(max-width: 767px)').matches) {
+          url.searchParams.set('detail', 'medium')
+        }
       }
 
       return url
@@ -0,0 +1,107 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+import pandas as pd
+import requests
+
+from hub.downloads import DownloadCache, DownloadError
+
+URL = "https://example.com/data.csv"
+
+
+def mock_response(status_code=200, content=b"", headers=None):
+    response = mock.MagicMock(status_code=status_code, headers=headers or {})
+    response.iter_content.return_value = [content]
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(str(status_code))
+    return response
+
+
+@mock.patch("hub.downloads.requests.get")
+class DownloadCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.cache = DownloadCache(Path(self.tmp.name))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_revalidate(self, get):
+        get.return_value = mock_response(content=b"a,b\n1,2\n", headers={"ETag": "1"})
+        path = self.cache.fetch(URL)
+        self.assertEqual(path.read_bytes(), b"a,b\n1,2\n")
+        self.assertEqual(get.call_args.kwargs["headers"], {})
+
+        # unchanged files aren't downloaded again
+        get.return_value = mock_response(status_code=304)
+        self.assertEqual(self.cache.fetch(URL), path)
+        self.assertEqual(get.call_args.kwargs["headers"], {"If-None-Match": "1"})
+
+        get.return_value = mock_response(content=b"a,b\n3,4\n", headers={"ETag": "2"})
+        df = self.cache.fetch_df(URL)
+        self.assertEqual(df.to_dict("records"), [{"a": 3, "b": 4}])
+
+        # recently checked files aren't revalidated
+        get.reset_mock()
+        self.cache.fetch(URL, max_age=60)
+        get.assert_not_called()
+
+    def test_offline(self, get):
+        self.cache.offline = True
+        with self.assertRaises(DownloadError):
+            self.cache.fetch(URL)
+
+        self.cache.offline = False
+        get.return_value = mock_response(content=b'{"posts": []}')
+        self.cache.fetch(URL)
+
+        get.reset_mock()
+        self.cache.offline = True
+        self.assertEqual(self.cache.fetch_json(URL), {"posts": []})
+        get.assert_not_called()
+
+    def test_download_failure(self, get):
+        get.return_value = mock_response(status_code=500)
+        with self.assertRaises(DownloadError):
+            self.cache.fetch(URL)
+
+        get.return_value = mock_response(content=b"a\n1\n")
+        path = self.cache.fetch(URL)
+
+        # the stored copy is used if the file can't be downloaded again, with
+        # a warning that it may be out of date
+        get.return_value = mock_response(status_code=500)
+        with self.assertLogs("hub.downloads", "WARNING"):
+            self.assertEqual(self.cache.fetch(URL), path)
+
+    @mock.patch("hub.downloads.get_dataset_url", return_value=URL)
+    def test_dataset_url(self, get_dataset_url, get):
+        args = ["repo", "package", "latest", "data.csv"]
+        self.assertEqual(self.cache.dataset_url(*args), URL)
+
+        # the URL is remembered for when the data repository can't be reached
+        get_dataset_url.side_effect = Exception("offline")
+        self.assertEqual(self.cache.dataset_url(*args), URL)
+        self.cache.offline = True
+        self.assertEqual(self.cache.dataset_url(*args), URL)
+        with self.assertRaises(DownloadError):
+            self.cache.dataset_url("repo", "package", "latest", "other.csv")
+
+    def test_iter_excel(self, get):
+        path = Path(self.tmp.name) / "data.xlsx"
+        pd.DataFrame({"a": range(5), "b": list("vwxyz")}).to_excel(path, index=False)
+
+        chunks = list(self.cache.iter_excel(path, 2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[2].to_dict("records"), [{"a": 4, "b": "z"}])
+
+        # the stored copy is read in batches without parsing the file again
+        with mock.patch("hub.downloads.pd.read_excel") as read_excel:
+            read_excel.__name__ = "read_excel"
+            chunks = list(self.cache.iter_excel(path, 3))
+        read_excel.assert_not_called()
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 2])
+        self.assertEqual(list(chunks[0]["b"]), ["v", "w", "x"])
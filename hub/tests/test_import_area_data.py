@@ -1,14 +1,23 @@
 from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import mock
 
 from django.contrib.sites.models import Site
 from django.core.management import call_command
+from django.core.management.base import CommandError, OutputWrapper
 from django.test import TestCase
 
 import pandas as pd
 
-from hub.management.commands.base_importers import BaseAreaImportCommand
-from hub.models import Area, AreaData, AreaType, DataSet, DataType
+from hub.management.commands.base_importers import (
+    BaseAreaImportCommand,
+    BaseConstituencyCountImportCommand,
+    BaseImportFromDataFrameCommand,
+    BaseLatLongImportCommand,
+)
+from hub.models import Area, AreaData, AreaType, DataSet, DataType, ImportRecord
+from utils.mapit import NotFoundException
 
 
 class ImportTestCase(TestCase):
@@ -88,6 +97,344 @@ class ImportNumericalDataWithMissingValuesTestCase(TestCase):
             Area.objects.all().count(),
         )
 
+    def test_missing_data_excluded_countries(self):
+        country = DataType.objects.create(
+            data_set=DataSet.objects.create(name="country"),
+            name="country",
+            area_type=AreaType.objects.get(code="WMC"),
+        )
+        for area in Area.objects.filter(name__in=["C", "D"]):
+            AreaData.objects.create(area=area, data_type=country, data="Scotland")
+        self.command.skip_countries = ["Scotland"]
+
+        self.command._fill_empty_entries()
+        self.assertEqual(
+            sorted(
+                AreaData.objects.filter(data_type__label="Data Type 1").values_list(
+                    "area__name", flat=True
+                )
+            ),
+            ["A", "B"],
+        )
+
+        # the same number of queries however many areas are filled in
+        self.command.skip_countries = []
+        with self.assertNumQueries(5):
+            self.command._fill_empty_entries()
+        self.assertEqual(
+            AreaData.objects.filter(data_type__label="Data Type 1").count(), 4
+        )
+
+
+class ImportFromDataFrameTestCase(TestCase):
+    fixtures = ["areas.json", "sites.json"]
+
+    def setUp(self):
+        self.command = BaseImportFromDataFrameCommand()
+        self.out = StringIO()
+        self.command.stdout = OutputWrapper(self.out)
+        self.command._quiet = True
+        self.command.site = Site.objects.get(name="lih")
+        self.command.message = "Importing test data"
+        self.command.cons_row = "gss"
+        self.command.data_sets = {
+            "test_float": {
+                "defaults": {
+                    "label": "Test float",
+                    "data_type": "float",
+                    "table": "areadata",
+                    "comparators": DataSet.numerical_comparators(),
+                },
+                "col": "float",
+            },
+            "test_text": {
+                "defaults": {
+                    "label": "Test text",
+                    "data_type": "text",
+                    "table": "areadata",
+                    "is_filterable": False,
+                    "comparators": DataSet.string_comparators(),
+                },
+                "col": "text",
+            },
+        }
+        self.command.add_data_sets()
+
+    def test_process_data(self):
+        df = pd.DataFrame(
+            {
+                "gss": ["E10000001", "E10000002", "E40000001", "E10000001"],
+                "float": ["1.5", "2.5", "3.5", "4.5"],
+                "text": ["one", "two", "three", "four"],
+            }
+        )
+        # one query for the areas, one for the existing values and one to
+        # write the data, however many rows and columns there are
+        with self.assertNumQueries(3):
+            self.command.process_data(df)
+
+        self.assertEqual(
+            self.out.getvalue(), "Failed to find area with code E40000001\n"
+        )
+        self.assertEqual(AreaData.objects.count(), 4)
+
+        # later rows for the same area replace earlier ones
+        south = AreaData.objects.get(
+            area__gss="E10000001", data_type__name="test_float"
+        )
+        self.assertEqual(south.float, 4.5)
+        self.assertEqual(south.data, "")
+        self.assertEqual(
+            AreaData.objects.get(
+                area__gss="E10000002", data_type__name="test_text"
+            ).value(),
+            "two",
+        )
+
+        # and importing again updates the existing values
+        self.command.process_data(df.replace({"2.5": "5"}))
+        self.assertEqual(AreaData.objects.count(), 4)
+        self.assertEqual(
+            AreaData.objects.get(
+                area__gss="E10000002", data_type__name="test_float"
+            ).value(),
+            5,
+        )
+
+    def test_process_data_changes(self):
+        df = pd.DataFrame(
+            {
+                "gss": ["E10000001", "E10000002"],
+                "float": [1.5, 2.5],
+                "text": ["one", "two"],
+            }
+        )
+        self.command.process_data(df)
+
+        # nothing is written if none of the values have changed
+        with self.assertNumQueries(2):
+            self.command.process_data(df)
+
+        # values for areas that are no longer in the data are removed
+        self.command.process_data(df.iloc[[1]].replace({"two": "three"}))
+        self.assertEqual(
+            sorted(
+                AreaData.objects.values_list("area__gss", "data_type__name", "data")
+            ),
+            [("E10000002", "test_float", ""), ("E10000002", "test_text", "three")],
+        )
+
+    def test_process_data_error(self):
+        df = pd.DataFrame(
+            {
+                "gss": ["E10000001", "E10000002"],
+                "float": [1.5, 2.5],
+                "text": ["one", "two"],
+            }
+        )
+        self.command.process_data(df)
+
+        # values for the rows after one that can't be imported are kept
+        with self.assertRaises(CommandError):
+            self.command.process_data(df.replace({1.5: "not a number"}))
+        self.assertEqual(AreaData.objects.count(), 4)
+
+    def test_handle_error(self):
+        df = pd.DataFrame({"gss": ["E10000001"], "float": ["x"], "text": ["one"]})
+        with mock.patch.object(self.command, "get_dataframe", return_value=df):
+            with self.assertRaises(CommandError):
+                self.command.handle(site="lih", quiet=True)
+        self.assertFalse(ImportRecord.objects.exists())
+
+    def test_own_delete_data(self):
+        df = pd.DataFrame({"gss": ["E10000001"], "float": [1.5], "text": ["one"]})
+        with mock.patch.object(
+            self.command, "get_dataframe", return_value=df
+        ), mock.patch.object(
+            BaseImportFromDataFrameCommand, "delete_data"
+        ) as delete_data:
+            self.command.handle(
+                site="lih", quiet=True, skip_new_areatype_conversion=True
+            )
+        delete_data.assert_called_once()
+
+    def test_person_profiles(self):
+        df = pd.DataFrame({"gss": ["E10000001"], "float": [1.5], "text": ["one"]})
+        with mock.patch.object(
+            self.command, "get_dataframe", return_value=df
+        ), mock.patch.object(self.command, "update_person_profiles") as update:
+            self.command.handle(
+                site="lih", quiet=True, skip_new_areatype_conversion=True
+            )
+        update.assert_not_called()
+
+        self.command.data_sets["test_float"]["defaults"]["table"] = "people__persondata"
+        self.assertTrue(self.command.has_person_data())
+
+
+class ImportConstituencyCountTestCase(TestCase):
+    fixtures = ["areas.json", "sites.json"]
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.command = BaseConstituencyCountImportCommand()
+        self.command.stdout = OutputWrapper(StringIO())
+        self.command._quiet = True
+        self.command._chunk_size = None
+        self.command.site = Site.objects.get(name="lih")
+        self.command.message = "Importing test counts"
+        self.command.cons_col = "gss"
+        self.command.uses_gss = True
+        self.command.data_file = Path(self.tmp.name) / "counts.csv"
+        self.command.data_sets = {
+            "test_count": {
+                "defaults": {
+                    "label": "Test count",
+                    "data_type": "integer",
+                    "table": "areadata",
+                    "comparators": DataSet.numerical_comparators(),
+                },
+            },
+        }
+        self.command.add_data_sets()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get_counts(self):
+        return dict(
+            AreaData.objects.filter(data_type__name="test_count").values_list(
+                "area__gss", "int"
+            )
+        )
+
+    def test_process_data(self):
+        pd.DataFrame(
+            {"gss": ["E10000001", "E10000001,E10000002", "E40000001", "E10000002"]}
+        ).to_csv(self.command.data_file, index=False)
+
+        # one query to match the areas, one for the existing counts and one
+        # to write them, however many rows there are
+        with self.assertNumQueries(3):
+            self.command.process_data(self.command.get_df())
+        self.assertEqual(self.get_counts(), {"E10000001": 2, "E10000002": 2})
+
+        # counts are added to any that are already there
+        self.command._chunk_size = 1
+        self.command.process_data(self.command.get_df())
+        self.assertEqual(self.get_counts(), {"E10000001": 4, "E10000002": 4})
+
+    def test_process_data_by_name(self):
+        self.command.uses_gss = False
+        self.command.cons_col = "constituency"
+        pd.DataFrame(
+            {"constituency": ["south borsetshire", "Borsetshire West", "Nowhere"]}
+        ).to_csv(self.command.data_file, index=False)
+
+        self.command.process_data(self.command.get_df())
+        self.assertEqual(self.get_counts(), {"E10000001": 1, "E10000002": 1})
+
+    def test_skip_unchanged(self):
+        pd.DataFrame({"gss": ["E10000001", "E10000002"]}).to_csv(
+            self.command.data_file, index=False
+        )
+        self.command.handle(site="lih", quiet=True)
+        self.assertEqual(
+            self.get_counts(), {"E10000001": 1, "E10000002": 1, "E10000003": 0}
+        )
+
+        # the import is skipped if the file hasn't changed
+        AreaData.objects.filter(area__gss="E10000001").update(int=10)
+        self.command.handle(site="lih", quiet=True)
+        self.assertEqual(
+            self.get_counts(), {"E10000001": 10, "E10000002": 1, "E10000003": 0}
+        )
+
+        self.command.handle(site="lih", quiet=True, force=True)
+        self.assertEqual(
+            self.get_counts(), {"E10000001": 1, "E10000002": 1, "E10000003": 0}
+        )
+
+        # but not if the imported data has been removed
+        AreaData.objects.filter(area__gss="E10000001").delete()
+        self.command.handle(site="lih", quiet=True)
+        self.assertEqual(
+            self.get_counts(), {"E10000001": 1, "E10000002": 1, "E10000003": 0}
+        )
+
+        pd.DataFrame({"gss": ["E10000001"]}).to_csv(self.command.data_file, index=False)
+        self.command.handle(site="lih", quiet=True)
+        self.assertEqual(
+            self.get_counts(), {"E10000001": 1, "E10000002": 0, "E10000003": 0}
+        )
+
+    def test_skip_unchanged_keeps_caches(self):
+        pd.DataFrame({"gss": ["E10000001"]}).to_csv(self.command.data_file, index=False)
+        self.command.handle(site="lih", quiet=True)
+        area_type = AreaType.objects.get(code="WMC")
+        self.assertTrue(area_type.matrix_is_current)
+        last_update = DataType.objects.get(name="test_count").last_update
+
+        # a skipped import doesn't touch the data types, so the matrix and
+        # anything cached against them is still up to date
+        self.command.handle(site="lih", quiet=True)
+        self.assertEqual(
+            DataType.objects.get(name="test_count").last_update, last_update
+        )
+        area_type.refresh_from_db()
+        self.assertTrue(area_type.matrix_is_current)
+
+    def test_staged(self):
+        pd.DataFrame({"gss": ["E10000001"]}).to_csv(self.command.data_file, index=False)
+        self.command.handle(site="lih", quiet=True, staged=True)
+
+        # the existing data is kept if a staged import fails part way through
+        pd.DataFrame({"gss": ["E10000002"]}).to_csv(self.command.data_file, index=False)
+        with mock.patch.object(
+            self.command, "update_max_min", side_effect=Exception("import failed")
+        ):
+            with self.assertRaises(Exception):
+                self.command.handle(site="lih", quiet=True, staged=True)
+        self.assertEqual(
+            self.get_counts(), {"E10000001": 1, "E10000002": 0, "E10000003": 0}
+        )
+
+
+class ImportLatLongTestCase(TestCase):
+    fixtures = ["areas.json"]
+
+    @mock.patch("utils.mapit.MapIt.points_to_gss_many")
+    def test_process_lat_longs(self, points_to_gss_many):
+        points_to_gss_many.return_value = [
+            {"WMC": "E10000001", "DIS": "E10000101"},
+            {"WMC": "E10000001"},
+            NotFoundException("Point not found"),
+        ]
+        command = BaseLatLongImportCommand()
+        command.data_type = DataType.objects.create(
+            data_set=DataSet.objects.create(name="test_count"),
+            name="test_count",
+            area_type=AreaType.objects.get(code="WMC"),
+        )
+        with mock.patch("sys.stdout", new_callable=StringIO) as out:
+            command.process_lat_longs(
+                [1.0, 2.0, 3.0, None], [1.0, 2.0, 3.0, 4.0], [0, 1, 2, 3]
+            )
+
+        self.assertEqual(
+            out.getvalue(),
+            "missing lat or lon for row 3\n"
+            "Error fetching row 2 with 3.0, 3.0: Point not found\n",
+        )
+        self.assertEqual(
+            dict(
+                AreaData.objects.filter(data_type=command.data_type).values_list(
+                    "area__gss", "int"
+                )
+            ),
+            {"E10000001": 2, "E10000101": 1},
+        )
+
 
 class ImportAgeDataTestCase(ImportTestCase):
     command = "import_area_age_data"
@@ -1,3 +1,5 @@
+import shutil
+from pathlib import Path
 from unittest import mock
 
 from django.core.management import call_command
@@ -6,6 +8,8 @@ from django.test import TestCase
 from hub.models import Area
 from utils.mapit import MapIt
 
+BASE_DIR = Path(__file__).resolve().parent
+
 
 def mock_areas_of_type(types, generation=None):
     if "WMC" in types and generation is None:
@@ -31,17 +35,23 @@ def mock_areas_of_type(types, generation=None):
 
 class ImportAreasTestCase(TestCase):
     quiet_parameter: bool = False
+    geometry_root = BASE_DIR / "geometry"
+
+    def tearDown(self):
+        if self.geometry_root.exists():
+            shutil.rmtree(self.geometry_root)
 
     @mock.patch.object(MapIt, "areas_of_type")
     @mock.patch.object(MapIt, "area_geometry")
     def test_import(self, mapit_geom, mapit_areas):
         mapit_geom.return_value = {
             "type": "Polygon",
-            "coordinates": [[1, 2], [2, 1]],
+            "coordinates": [[[1, 2], [2, 1], [2, 2], [1, 2]]],
         }
         mapit_areas.side_effect = mock_areas_of_type
 
-        call_command("import_areas", quiet=self.quiet_parameter)
+        with self.settings(GEOMETRY_CACHE_ROOT=self.geometry_root):
+            call_command("import_areas", quiet=self.quiet_parameter)
 
         expected_calls = [
             mock.call(["WMC"], generation=54),  # pre-2024 constituencies
@@ -62,9 +72,12 @@ class ImportAreasTestCase(TestCase):
         self.assertEqual(first.gss, "E10000001")
         self.assertEqual(
             first.geometry,
-            '{"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [[1, 2], [2, 1]]}, "properties": {"PCON13CD": "E10000001", "name": "South Borsetshire", "type": "WMC23"}}',
+            '{"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [[[1, 2], [2, 1], [2, 2], [1, 2]]]}, "properties": {"PCON13CD": "E10000001", "name": "South Borsetshire", "type": "WMC23"}}',
         )
 
+        for suffix in ["full.json.gz", "low.json.gz", "low.topojson.gz"]:
+            self.assertTrue((self.geometry_root / f"WMC23-{suffix}").exists())
+
 
 class ImportAreasTestCaseQuietFlag(ImportAreasTestCase):
     """
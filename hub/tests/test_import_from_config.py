@@ -1,4 +1,6 @@
 from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import mock
 
 from django.core.management import call_command
@@ -138,3 +140,83 @@ class ImportAgeDataTestCase(ImportTestCase):
 
         self.assertEqual(south_data[0].data_type.average, 12.75)
         self.assertEqual(south_data[1].data_type.average, 11.95)
+
+
+class ImportChunkedDataTestCase(ImportTestCase):
+    command = "import_from_config"
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.data_file = Path(self.tmp.name) / "data.csv"
+        self.config = [
+            {
+                "name": "test_percent",
+                "label": "Test percent",
+                "data_type": "percent",
+                "category": "place",
+                "subcategory": "",
+                "release_date": "2024",
+                "is_range": False,
+                "source_label": "",
+                "source": "",
+                "data_url": "",
+                "exclude_countries": None,
+                "fill_blanks": False,
+                "source_type": "csv",
+                "file_type": "csv",
+                "uses_gss": True,
+                "data_file": str(self.data_file),
+                "table": "areadata",
+                "default_value": 50,
+                "is_filterable": True,
+                "is_public": True,
+                "comparators": DataSet.numerical_comparators(),
+                "unit_type": "percentage",
+                "unit_distribution": "people_in_area",
+                "area_type": "WMC",
+                "constituency_col": "code",
+                "data_col": "percent",
+                "gss_map": {"OLD1": "E10000001"},
+                "chunk_size": 2,
+            }
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get_values(self):
+        return dict(
+            AreaData.objects.filter(data_type__name="test_percent").values_list(
+                "area__gss", "float"
+            )
+        )
+
+    @mock.patch("hub.management.commands.import_from_config.json.load")
+    def test_import(self, patch_get_json):
+        patch_get_json.return_value = self.config
+        pd.DataFrame(
+            {
+                "code": ["OLD1", "E40000001", "E10000002", "E10000003"],
+                "percent": ["10%", "20%", "30%", "40%"],
+            }
+        ).to_csv(self.data_file, index=False)
+
+        out = self.call_command(
+            import_name="test_percent", skip_new_areatype_conversion=True
+        )
+        self.assertEqual(out, "Failed to find area with code E40000001\n")
+        self.assertEqual(
+            self.get_values(), {"E10000001": 10, "E10000002": 30, "E10000003": 40}
+        )
+
+        # values for areas in any chunk are kept when the data changes
+        pd.DataFrame(
+            {
+                "code": ["OLD1", "E10000002", "E10000003"],
+                "percent": ["15%", "30%", "45%"],
+            }
+        ).to_csv(self.data_file, index=False)
+        self.call_command(import_name="test_percent", skip_new_areatype_conversion=True)
+        self.assertEqual(
+            self.get_values(), {"E10000001": 15, "E10000002": 30, "E10000003": 45}
+        )
@@ -1,4 +1,6 @@
 import json
+import shutil
+from pathlib import Path
 from unittest import mock
 
 from django.core.management import call_command
@@ -6,6 +8,8 @@ from django.test import TestCase
 
 from hub.models import Area, AreaOverlap, AreaType
 
+BASE_DIR = Path(__file__).resolve().parent
+
 # Mock CSV data from ONS
 MOCK_ONS_CSV = """LAD23CD,LAD23NM,CSP23CD,CSP23NM,PFA23CD,PFA23NM,ObjectId
 E06000001,Hartlepool,E22000027,Hartlepool,E23000013,Cleveland,1
@@ -23,6 +27,11 @@ def mock_ons_csv_response(*args, **kwargs):
 
 class ImportPolicingAreasTestCase(TestCase):
     quiet_parameter: bool = False
+    geometry_root = BASE_DIR / "geometry"
+
+    def tearDown(self):
+        if self.geometry_root.exists():
+            shutil.rmtree(self.geometry_root)
 
     def setUp(self):
         # Create test area types
@@ -146,7 +155,8 @@ class ImportPolicingAreasTestCase(TestCase):
 
     @mock.patch("requests.get", side_effect=mock_ons_csv_response)
     def test_import_policing_areas(self, mock_get):
-        call_command("import_policing_areas", quiet=self.quiet_parameter)
+        with self.settings(GEOMETRY_CACHE_ROOT=self.geometry_root):
+            call_command("import_policing_areas", quiet=self.quiet_parameter)
 
         # Check that PFA area type was created
         pfa_type = AreaType.objects.get(code="PFA")
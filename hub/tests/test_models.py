@@ -1,6 +1,16 @@
+from django.contrib.sites.models import Site
 from django.test import TestCase
 
-from hub.models import Area, AreaData, DataSet, DataType, Person
+from hub.models import (
+    Area,
+    AreaData,
+    AreaType,
+    DataSet,
+    DataType,
+    Person,
+    PersonData,
+    SiteDataSet,
+)
 
 
 class TestDataSet(TestCase):
@@ -46,6 +56,16 @@ class TestDataSet(TestCase):
 
         self.assertEqual(dataset.source_url, "http://example.com/some/data")
 
+    def test_shade_indexes(self):
+        dataset = DataSet(name="dataset_name")
+        values = [10, "20", 30.0, "", None, "n/a"]
+        indexes = dataset.shade_indexes(values, 10, 30)
+        self.assertEqual(indexes.tolist(), [0, 3, 8, -1, -1, -1])
+        for value, index in zip(values[:3], indexes):
+            self.assertEqual(dataset.shade(float(value), 10, 30), dataset.shades[index])
+
+        self.assertEqual(dataset.shade_indexes([5, ""], 5, 5).tolist(), [3, -1])
+
 
 class TestDataType(TestCase):
     def setUp(self):
@@ -139,6 +159,78 @@ class TestDataType(TestCase):
         self.assertTrue(datatype.is_url)
 
 
+class TestDataTypeStats(TestCase):
+    fixtures = ["areas.json"]
+
+    def setUp(self):
+        self.dataset = DataSet.objects.create(name="dataset_name")
+        self.area_type = AreaType.objects.get(code="WMC")
+        self.areas = list(Area.objects.filter(area_type=self.area_type))
+
+    def test_update_stats(self):
+        float_type = DataType.objects.create(
+            data_set=self.dataset,
+            name="float_type",
+            data_type="percent",
+            area_type=self.area_type,
+        )
+        int_type = DataType.objects.create(
+            data_set=self.dataset,
+            name="int_type",
+            data_type="integer",
+            area_type=self.area_type,
+        )
+        empty_type = DataType.objects.create(
+            data_set=self.dataset,
+            name="empty_type",
+            data_type="integer",
+            area_type=self.area_type,
+            average=10,
+        )
+        for i, area in enumerate(self.areas):
+            AreaData.objects.create(area=area, data_type=float_type, float=i + 0.5)
+            AreaData.objects.create(area=area, data_type=int_type, int=i * 2)
+
+        # data for other area types is not included
+        other_area = Area.objects.exclude(area_type=self.area_type).first()
+        AreaData.objects.create(area=other_area, data_type=int_type, int=100)
+
+        with self.assertNumQueries(2):
+            DataType.update_stats([float_type, int_type, empty_type])
+
+        float_type.refresh_from_db()
+        self.assertEqual(float_type.average, 1.5)
+        self.assertEqual(float_type.maximum, 2.5)
+        self.assertEqual(float_type.minimum, 0.5)
+
+        int_type.refresh_from_db()
+        self.assertEqual(int_type.average, 2)
+        self.assertEqual(int_type.maximum, 4)
+        self.assertEqual(int_type.minimum, 0)
+
+        empty_type.refresh_from_db()
+        self.assertIsNone(empty_type.average)
+        self.assertIsNone(empty_type.maximum)
+
+    def test_update_stats_fields(self):
+        data_type = DataType.objects.create(
+            data_set=self.dataset,
+            name="int_type",
+            data_type="integer",
+            area_type=self.area_type,
+            average=10,
+        )
+        AreaData.objects.create(area=self.areas[0], data_type=data_type, int=4)
+        last_update = data_type.last_update
+
+        DataType.update_stats([data_type], ["maximum", "minimum"])
+        data_type.refresh_from_db()
+        self.assertEqual(data_type.average, 10)
+        self.assertEqual(data_type.maximum, 4)
+        self.assertEqual(data_type.minimum, 4)
+        self.assertGreater(data_type.last_update, last_update)
+
+
 class TestCommonData(TestCase):
     fixtures = ["areas.json"]
 
@@ -258,3 +350,74 @@ class TestPerson(TestCase):
         p = Person.objects.create(name="A Person")
 
         self.assertEqual(str(p), "A Person")
+
+
+class TestPersonProfile(TestCase):
+    fixtures = ["areas.json"]
+
+    def setUp(self):
+        self.site = Site.objects.create(name="test", domain="test.example.org")
+        self.area_type = AreaType.objects.get(code="WMC")
+        self.person = Person.objects.create(name="A Person", person_type="MP")
+
+        public = DataSet.objects.create(name="party", is_public=True)
+        members = DataSet.objects.create(name="first_elected", is_public=False)
+        other_site = DataSet.objects.create(name="other_site", is_public=True)
+        for ds in [public, members]:
+            SiteDataSet.objects.create(site=self.site, dataset=ds)
+
+        party = DataType.objects.create(data_set=public, name="party")
+        first_elected = DataType.objects.create(
+            data_set=members,
+            name="first_elected",
+            data_type="date",
+            area_type=self.area_type,
+        )
+        other = DataType.objects.create(data_set=other_site, name="other_site")
+        PersonData.objects.create(person=self.person, data_type=party, data="Party")
+        PersonData.objects.create(
+            person=self.person, data_type=first_elected, data="2005-05-05"
+        )
+        PersonData.objects.create(person=self.person, data_type=other, data="Other")
+
+    def test_update_profiles(self):
+        self.assertEqual(Person.update_profiles([self.person]), 1)
+
+        self.person.refresh_from_db()
+        public = [entry["name"] for entry in self.person.profile["public"]]
+        members = [entry["name"] for entry in self.person.profile["members"]]
+        self.assertEqual(public, ["party", "other_site"])
+        self.assertEqual(members, ["first_elected"])
+
+    def test_profile_data(self):
+        Person.update_profiles([self.person])
+        self.person.refresh_from_db()
+
+        with self.assertNumQueries(0):
+            data = self.person.profile_data(site=self.site, area_type=self.area_type)
+        self.assertEqual([entry["name"] for entry in data], ["party", "first_elected"])
+        self.assertEqual(data[1]["value"].date().isoformat(), "2005-05-05")
+
+        data = self.person.profile_data(site=self.site, is_non_member=True)
+        self.assertEqual([entry["name"] for entry in data], ["party"])
+
+        other_area_type = AreaType.objects.exclude(pk=self.area_type.pk).first()
+        data = self.person.profile_data(area_type=other_area_type)
+        self.assertEqual([entry["name"] for entry in data], ["party", "other_site"])
+
+        self.assertEqual(self.person.party(), "Party")
+
+    def test_profile_not_built_on_read(self):
+        self.assertEqual(self.person.profile_data(), [])
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.profile, {})
+
+    def test_profile_rebuilt_on_data_set_change(self):
+        Person.update_profiles([self.person])
+        data_set = DataSet.objects.get(name="first_elected")
+        data_set.is_public = True
+        data_set.save()
+
+        self.person.refresh_from_db()
+        data = self.person.profile_data(site=self.site, is_non_member=True)
+        self.assertEqual([entry["name"] for entry in data], ["party", "first_elected"])
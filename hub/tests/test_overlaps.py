@@ -0,0 +1,119 @@
+from unittest import mock
+
+from django.test import TestCase
+
+import pandas as pd
+
+from hub.models import Area, AreaData, AreaOverlap, AreaType, DataSet, DataType
+from hub.overlaps import OverlapMatrix, load_overlaps
+from hub.transformers import CouncilToPFADataTypeConverter
+from utils.constituency_mapping import convert_data_geographies
+
+OVERLAPS = pd.DataFrame(
+    {
+        "PARL10": ["A1", "A1", "A2", "A3"],
+        "PARL25": ["B1", "B2", "B2", "B2"],
+        "overlap_pop": [600, 400, 1000, 500],
+        "overlap_area": [10, 20, 30, 40],
+        "original_pop": [1000, 1000, 1000, 500],
+    }
+)
+
+
+def fetch_overlaps(url, usecols):
+    return OVERLAPS[usecols]
+
+
+@mock.patch("utils.constituency_mapping.get_overlap_df", return_value=OVERLAPS)
+@mock.patch("hub.overlaps.fetch_df", side_effect=fetch_overlaps)
+class TestOverlapMatrix(TestCase):
+    def test_matches_convert_data_geographies(self, fetch_df, _):
+        df = pd.DataFrame(
+            {"PARL10": ["A1", "A2", "A4"], "one": [0.5, 0.1, 0.9], "two": [10, 20, 30]}
+        )
+        for values_type in ["percentage", "absolute"]:
+            expected = convert_data_geographies(
+                df,
+                input_geography="PARL10",
+                output_geography="PARL25",
+                input_values_type=values_type,
+            ).set_index("PARL25")
+            matrix = OverlapMatrix.from_overlap_csv(
+                "PARL10", "PARL25", input_values_type=values_type
+            )
+            actual = matrix.convert(
+                df.set_index("PARL10"), average=values_type == "percentage"
+            )
+            pd.testing.assert_frame_equal(
+                actual, expected, check_names=False, check_dtype=False
+            )
+
+    def test_load_overlaps(self, fetch_df, _):
+        overlaps = load_overlaps("PARL10", "PARL25")
+        self.assertTrue(
+            fetch_df.call_args.args[0].endswith("PARL10_PARL25_combo_overlap.csv")
+        )
+        pd.testing.assert_frame_equal(overlaps, OVERLAPS[overlaps.columns])
+
+    def test_missing_values(self, fetch_df, _):
+        matrix = OverlapMatrix.from_overlap_csv("PARL10", "PARL25")
+        df = pd.DataFrame({"one": [0.5, None], "two": [None, None]}, index=["A1", "A2"])
+        actual = matrix.convert(df)
+        # areas with no values for a data type are left out of its averages
+        self.assertEqual(actual["one"].to_dict(), {"B1": 0.5, "B2": 0.5})
+        self.assertTrue(actual["two"].isna().all())
+
+
+class TestAreaOverlapMatrix(TestCase):
+    fixtures = ["areas.json"]
+
+    def setUp(self):
+        pfa = AreaType.objects.create(code="PFA", area_type="policing_area")
+        self.police = Area.objects.create(gss="E23000001", name="Police", area_type=pfa)
+        for gss, population in [("E10000101", 100), ("E10000102", 50)]:
+            AreaOverlap.objects.create(
+                area_from=Area.objects.get(gss=gss),
+                area_to=self.police,
+                population_overlap=population,
+            )
+        self.df = pd.DataFrame(
+            {"value": [10.0, 40.0]}, index=["E10000101", "E10000102"]
+        )
+
+    def test_average(self):
+        matrix = OverlapMatrix.from_area_overlaps(
+            ["DIS", "STC"], self.police.area_type, overlap_measure="population"
+        )
+        self.assertEqual(
+            matrix.convert(self.df).to_dict(), {"value": {"E23000001": 20}}
+        )
+
+    def test_sum(self):
+        matrix = OverlapMatrix.from_area_overlaps(["DIS", "STC"], self.police.area_type)
+        self.assertEqual(
+            matrix.convert(self.df, average=False).to_dict(),
+            {"value": {"E23000001": 50}},
+        )
+
+    def test_pfa_converter(self):
+        dis = Area.objects.get(gss="E10000101")
+        data_type = DataType.objects.create(
+            data_set=DataSet.objects.create(
+                name="test_count", unit_type="raw", table="areadata"
+            ),
+            name="test_count",
+            area_type=dis.area_type,
+            data_type="integer",
+        )
+        AreaData.objects.create(area=dis, data_type=data_type, int=12)
+
+        converter = CouncilToPFADataTypeConverter()
+        converter.convert_datatypes_to_new_geography([data_type], method="sum")
+        converted = AreaData.objects.get(area=self.police)
+        self.assertEqual(converted.value(), 12)
+        self.assertTrue(converted.data_type.auto_converted)
+
+        # converting again updates the existing values
+        AreaData.objects.filter(area=dis).update(int=20)
+        converter.convert_datatypes_to_new_geography([data_type], method="sum")
+        self.assertEqual(AreaData.objects.get(area=self.police).value(), 20)
@@ -0,0 +1,90 @@
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from hub.postcodes import PostcodeIndex, get_postcode_index, postcode_index_path
+
+ONSPD = """pcd,pcds,doterm,oscty,oslaua,pcon,pfa
+SE173HE,SE17 3HE,,E99999999,E10000002,E10000005,E23000001
+SE1 1AA,SE1 1AA,,E10000002,E10000101,E10000005,E23000001
+SE1 1AB,SE1 1AB,202001,E99999999,E10000002,E10000005,E23000001
+SE1 1AC,SE1 1AC,,,E10000002,E10000005,
+"""
+
+
+class TestPostcodeIndex(TestCase):
+    fixtures = ["sites.json", "areas.json", "areas_23.json", "mps_23.json"]
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.settings = override_settings(
+            POSTCODE_INDEX_ROOT=Path(self.tmp.name) / "postcodes"
+        )
+        self.settings.enable()
+
+        onspd = Path(self.tmp.name) / "onspd.csv"
+        onspd.write_text(ONSPD)
+        call_command("build_postcode_index", str(onspd), stdout=StringIO())
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmp.cleanup()
+
+    def test_lookup(self):
+        index = get_postcode_index()
+        self.assertEqual(len(index), 3)
+        self.assertEqual(
+            index.lookup("se17 3he"),
+            {"WMC23": "E10000005", "STC": "E10000002", "PFA": "E23000001"},
+        )
+        self.assertEqual(
+            index.lookup("SE11AA"),
+            {
+                "WMC23": "E10000005",
+                "STC": "E10000002",
+                "DIS": "E10000101",
+                "PFA": "E23000001",
+            },
+        )
+        # blank codes are left out like pseudo codes
+        self.assertEqual(
+            index.lookup("SE1 1AC"), {"WMC23": "E10000005", "STC": "E10000002"}
+        )
+        # terminated postcodes are left out by default
+        self.assertIsNone(index.lookup("SE1 1AB"))
+        self.assertIsNone(index.lookup("SE17 3HEX"))
+        self.assertEqual(
+            [codes is None for codes in index.lookup_many(["SE1 1AA", "", "ZZ1 1ZZ"])],
+            [False, True, True],
+        )
+
+    def test_save_and_load(self):
+        index = PostcodeIndex.from_codes(
+            ["AB1 2CD", "AB1 2CE"], {"WMC23": ["E10000005", None]}
+        )
+        index.save(postcode_index_path())
+        loaded = PostcodeIndex.load(postcode_index_path())
+        self.assertEqual(loaded.lookup("AB12CD"), {"WMC23": "E10000005"})
+        self.assertEqual(loaded.lookup("AB12CE"), {})
+        self.assertIsNone(loaded.lookup("SE17 3HE"))
+
+    @patch("utils.mapit.MapIt.postcode_point_to_gss_codes")
+    def test_area_search(self, mapit_areas):
+        self.client.force_login(User.objects.create(username="user@example.com"))
+        url = reverse("area_search")
+        response = self.client.get(
+            url, {"search": "SE17 3HE", "area_type": "WMC23"}, follow=True
+        )
+        self.assertRedirects(response, "/area/WMC23/New%20South%20Borsetshire")
+
+        # postcodes that aren't in the index are looked up in MapIt
+        mapit_areas.return_value = ["E10000005"]
+        response = self.client.get(url, {"search": "SE1 1AB"}, follow=True)
+        self.assertRedirects(response, "/area/WMC23/New%20South%20Borsetshire")
+        mapit_areas.assert_called_once_with("SE1 1AB")
@@ -0,0 +1,107 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from hub.management.commands.run_all_import_scripts import Command
+
+IMPORTS = [
+    "import_area_countries",
+    "import_areas",
+    "import_mp_job_titles",
+    "import_mps",
+    "import_mps_election_results",
+]
+
+
+class RunAllImportScriptsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.command = Command()
+        self.command.state_file = Path(self.tmp.name) / "state.json"
+        self.command.log_dir = Path(self.tmp.name) / "logs"
+        self.command.get_executor = lambda workers: ThreadPoolExecutor(workers)
+        self.run_order = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fake_call_command(self, fail=()):
+        def call_command(importer, *args, **kwargs):
+            self.run_order.append(importer)
+            if importer in fail:
+                raise Exception("import failed")
+
+        return call_command
+
+    def run_imports(self, fail=(), resume=False):
+        with mock.patch(
+            "hub.management.commands.run_all_import_scripts.call_command",
+            self.fake_call_command(fail),
+        ), mock.patch("sys.stdout", new_callable=StringIO):
+            self.command.run_importer_scripts(list(IMPORTS), workers=1, resume=resume)
+
+    def test_dependencies(self):
+        dependencies = self.command.get_dependencies(IMPORTS)
+        self.assertEqual(dependencies["import_areas"], set())
+        self.assertEqual(dependencies["import_mps"], {"import_areas"})
+        self.assertEqual(dependencies["import_mp_job_titles"], {"import_mps"})
+        self.assertEqual(dependencies["import_area_countries"], {"import_areas"})
+
+    def test_data_dependencies(self):
+        # importers that read data types written by other importers
+        readers = {
+            "import_womens_refuge_calculations": {
+                "import_from_config",
+                "import_council_data",
+            },
+            "import_mp_edm_signatures": {"import_mps_election_results"},
+            "import_mps_relevant_votes": {"import_mps_election_results"},
+            "import_2024_ppcs": {"import_mps"},
+        }
+        imports = set(readers).union(*readers.values())
+        dependencies = self.command.get_dependencies(imports)
+        for importer, writers in readers.items():
+            self.assertLessEqual(writers, dependencies[importer], importer)
+
+    def test_run_order(self):
+        self.run_imports()
+        self.assertEqual(self.run_order[0], "import_areas")
+        self.assertLess(
+            self.run_order.index("import_mps"),
+            self.run_order.index("import_mp_job_titles"),
+        )
+        self.assertLess(
+            self.run_order.index("import_mps"),
+            self.run_order.index("import_mps_election_results"),
+        )
+
+    def test_failure_and_resume(self):
+        self.run_imports(fail=["import_mps"])
+        self.assertNotIn("import_mp_job_titles", self.run_order)
+        self.assertNotIn("import_mps_election_results", self.run_order)
+
+        state = json.loads(self.command.state_file.read_text())
+        self.assertEqual(state["import_areas"]["status"], "done")
+        self.assertEqual(state["import_mps"]["status"], "failed")
+        self.assertEqual(state["import_mps"]["error"], "import failed")
+        self.assertEqual(state["import_mp_job_titles"]["status"], "skipped")
+        self.assertIn(
+            "import failed", (self.command.log_dir / "import_mps.log").read_text()
+        )
+
+        # only the failed importer and the ones depending on it are run again
+        self.run_order = []
+        self.run_imports(resume=True)
+        self.assertEqual(self.run_order[0], "import_mps")
+        self.assertEqual(
+            sorted(self.run_order[1:]),
+            ["import_mp_job_titles", "import_mps_election_results"],
+        )
+
+        state = json.loads(self.command.state_file.read_text())
+        self.assertTrue(all(s["status"] == "done" for s in state.values()))
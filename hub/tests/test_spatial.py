@@ -0,0 +1,101 @@
+import json
+from math import nan
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase, override_settings
+
+from hub.models import Area, AreaType
+from hub.spatial import (
+    AreaIndex,
+    AreaLookup,
+    build_spatial_index,
+    get_spatial_index,
+    spatial_index_path,
+)
+
+
+def square(x, y, size=1):
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [
+                [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+            ],
+        },
+        "properties": {},
+    }
+
+
+class TestSpatialIndex(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.settings = override_settings(GEOMETRY_CACHE_ROOT=Path(self.tmp.name))
+        self.settings.enable()
+
+        self.area_type = AreaType.objects.create(
+            code="STC", area_type="single_tier_council"
+        )
+        for gss, name, geometry in [
+            ("E06000001", "Left Council", square(0, 0)),
+            ("E06000002", "Right Council", square(1, 0)),
+            ("E06000003", "No Boundary Council", None),
+        ]:
+            Area.objects.create(
+                gss=gss,
+                name=name,
+                area_type=self.area_type,
+                geometry=json.dumps(geometry) if geometry else None,
+            )
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmp.cleanup()
+
+    def test_no_index(self):
+        lookup = AreaLookup(["STC"])
+        self.assertFalse(lookup.is_available)
+        self.assertEqual(lookup.point_to_gss_codes(0.5, 0.5), {})
+
+    def test_build_and_load(self):
+        index = build_spatial_index(self.area_type)
+        self.assertEqual(len(index), 2)
+        self.assertTrue(spatial_index_path("STC").exists())
+
+        loaded = AreaIndex.load(spatial_index_path("STC"))
+        self.assertEqual(loaded.gss.tolist(), ["E06000001", "E06000002"])
+        self.assertEqual(loaded.names.tolist(), ["Left Council", "Right Council"])
+        self.assertEqual(get_spatial_index("STC").gss.tolist(), loaded.gss.tolist())
+
+    def test_point_to_gss_codes(self):
+        build_spatial_index(self.area_type)
+        lookup = AreaLookup(["STC"])
+        self.assertTrue(lookup.is_available)
+        self.assertEqual(lookup.point_to_gss_codes(0.5, 0.5), {"STC": "E06000001"})
+        self.assertEqual(lookup.point_to_gss_codes(1.5, 0.5), {"STC": "E06000002"})
+        self.assertEqual(lookup.point_to_gss_codes(5, 5), {})
+
+    def test_missing_index(self):
+        build_spatial_index(self.area_type)
+        # points can't be looked up locally unless every area type has an index
+        lookup = AreaLookup(["DIS", "STC"])
+        self.assertFalse(lookup.is_available)
+
+    def test_points_to_areas(self):
+        build_spatial_index(self.area_type)
+        lookup = AreaLookup(["STC"])
+        areas = lookup.points_to_areas(
+            [0.5, 1.5, 5, nan], [0.5, 0.5, 5, 0.5], field="names"
+        )
+        self.assertEqual(
+            areas["STC"].tolist(), ["Left Council", "Right Council", None, None]
+        )
+
+    def test_rebuilt_index_is_reloaded(self):
+        build_spatial_index(self.area_type)
+        self.assertEqual(len(get_spatial_index("STC")), 2)
+
+        Area.objects.filter(gss="E06000002").delete()
+        build_spatial_index(self.area_type)
+        self.assertEqual(len(get_spatial_index("STC")), 1)
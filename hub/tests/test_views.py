@@ -1,23 +1,38 @@
+import gzip
+import json
+import shutil
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
-from django.test import TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from hub.geometry import build_geometry_cache
+from hub.metadata import bump_version, registry
 from hub.models import (
     Area,
     AreaAction,
+    AreaData,
+    AreaMatrix,
     AreaOverlap,
     AreaType,
     DataSet,
+    DataType,
     Person,
     PersonArea,
     SiteAreaAction,
     SiteAreaType,
+    SiteDataSet,
     UserDataSets,
     UserProperties,
 )
+from hub.views.explore import ExploreCSV
+
+BASE_DIR = Path(__file__).resolve().parent
 
 
 class Test404Page(TestCase):
@@ -80,6 +95,8 @@ class TestExploreDatasetsPage(TestCase):
     )
 
     def setUp(self):
+        # earlier tests' changes are rolled back without sending any signals
+        registry.clear()
         u = User.objects.create(username="user@example.com")
         self.client.force_login(u)
 
@@ -97,6 +114,42 @@ class TestExploreDatasetsPage(TestCase):
         datasets = response.json()
         self.assertEqual(6, len(datasets))
 
+    def test_explore_datasets_json_cached(self):
+        bump_version()
+        url = reverse("explore_datasets_json")
+        response = self.client.get(url)
+        self.assertEqual(13, len(response.json()))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(13, len(json.loads(gzip.decompress(response.content))))
+        self.assertFalse(any("hub_dataset" in q["sql"] for q in queries))
+
+        # changing a data set means the list is rebuilt
+        data_set = DataSet.objects.get(name="constituency_age_distribution")
+        data_set.label = "Ages"
+        data_set.save()
+        response = self.client.get(url)
+        titles = [d["title"] for d in response.json()]
+        self.assertIn("Ages", titles)
+
+    def test_explore_favourites_json(self):
+        url = reverse("explore_favourites_json")
+        response = self.client.get(url)
+        self.assertEqual(response.json(), [])
+
+        UserDataSets.objects.create(
+            user=User.objects.get(username="user@example.com"),
+            data_set=DataSet.objects.get(name="constituency_age_distribution"),
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.json(), ["constituency_age_distribution"])
+
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(response.json(), [])
+
     def test_explore_view_with_many_to_one(self):
         url = f"{reverse('explore_csv')}?mp_appg_membership__exact=MadeUpAPPG"
         response = self.client.get(url)
@@ -132,6 +185,31 @@ class TestExploreDatasetsPage(TestCase):
             output_csv,
         )
 
+    def test_explore_data_query_count(self):
+        request = RequestFactory().get(
+            reverse("explore_csv"),
+            {
+                "columns": "wind_support,fuel_poverty,ages_0-9,parlid,mp_election_majority"
+            },
+        )
+        request.user = User.objects.get(username="user@example.com")
+        request.site = Site.objects.get(domain="testserver")
+        view = ExploreCSV()
+        view.setup(request)
+
+        cols = view.columns()
+        area_ids = list(
+            Area.objects.filter(area_type__code="WMC").values_list("pk", flat=True)
+        )
+        # one query for area data, one for person data and one to map people
+        # to areas, however many columns there are
+        with self.assertNumQueries(3):
+            values = view.column_values(cols, area_ids)
+
+        self.assertEqual(values["wind_support"], [("South Borsetshire", "70.0")])
+        self.assertEqual(values["fuel_poverty"], [("South Borsetshire", "12.4321")])
+        self.assertEqual(values["parlid"], [("South Borsetshire", "1")])
+
     def test_explore_view_extra_columns_multiset(self):
         output_csv = str.encode(
             "Constituency name,APPG membership,Constituency Polling Data - Wind support,Constituency Age Distribution - Constituency Age 0-9 %age\r\nSouth Borsetshire,MadeUpAPPG; MadeUpAPPG2,70.0,10.1234\r\n"
@@ -224,6 +302,8 @@ class TestExploreFilteringPage(TestCase):
     ]
 
     def setUp(self):
+        # earlier tests' changes are rolled back without sending any signals
+        registry.clear()
         self.u = User.objects.create(username="user@example.com")
         self.client.force_login(self.u)
 
@@ -301,6 +381,34 @@ class TestExploreFilteringPage(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "#ff0000")
 
+    def test_shader_colours_cached(self):
+        shader = DataType.objects.get(name="wind_support")
+        areas = list(Area.objects.filter(area_type__code="WMC").order_by("pk"))
+        south, west, east = areas
+        south.areadata_set.filter(data_type=shader).update(float=70)
+        west.areadata_set.create(data_type=shader, data="30", float=30)
+        # as importers do, so any colours already cached are not used
+        shader.save()
+
+        colours = shader.colours_for_areas(areas)
+        self.assertEqual(colours[south.gss]["colour"], "#081d58")
+        self.assertEqual(colours[south.gss]["value"], 70)
+        self.assertEqual(colours[west.gss]["colour"], "#ffffd9")
+        self.assertEqual(colours[east.gss], {"colour": "#ed6832", "opacity": 0})
+        self.assertEqual(colours["properties"]["maximum"], "70.0%")
+        self.assertEqual(colours["properties"]["minimum"], "30.0%")
+
+        # the cached copy is found from the last updates, without any queries
+        # for the data
+        with self.assertNumQueries(0):
+            self.assertEqual(shader.colours_for_areas(areas), colours)
+
+        # and updating the data type means they are calculated again
+        east.areadata_set.create(data_type=shader, data="50", float=50)
+        shader.save()
+        colours = shader.colours_for_areas(areas)
+        self.assertEqual(colours[east.gss]["colour"], "#7fcdbb")
+
     def test_explore_persondata_area_type(self):
         url = reverse("explore_json")
         response = self.client.get(url + "?mp_election_majority__gt=1000")
@@ -312,6 +420,255 @@ class TestExploreFilteringPage(TestCase):
         self.assertContains(response, "New South Borsetshire")
         self.assertNotContains(response, '"South Borsetshire')
 
+    def test_explore_metadata_queries(self):
+        request = RequestFactory().get(
+            "/explore.csv?wind_support__gt=60&fuel_poverty__lt=20"
+            "&columns=constituency_age_distribution&shader=fuel_poverty"
+        )
+        request.user = self.u
+        request.site = Site.objects.get(domain="testserver")
+        view = ExploreCSV()
+        view.setup(request)
+        registry.get_index()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(view.area_type().code, "WMC")
+            filters = view.filters()
+            columns = view.columns()
+            shader = view.shader()
+        self.assertEqual([f["name"] for f in filters], ["wind_support", "fuel_poverty"])
+        self.assertEqual(filters[0]["dataset"].name, "constituency_polling_data")
+        self.assertEqual(columns[0]["name"], "constituency_age_distribution")
+        self.assertEqual(shader.name, "fuel_poverty")
+
+        # saving metadata means it's reloaded
+        data_set = DataSet.objects.get(name="constituency_age_distribution")
+        data_set.label = "Ages"
+        data_set.save()
+        self.assertEqual(view.columns()[0]["label"], "Ages")
+
+        data_set.visible = False
+        data_set.save()
+        self.assertEqual(view.columns(), [])
+
+    def test_explore_stacked_filters(self):
+        request = RequestFactory().get(
+            "/explore.csv?wind_support__gt=60&fuel_poverty__lt=20"
+            "&mp_last_elected__year__gte=2019"
+        )
+        request.user = self.u
+        request.site = Site.objects.get(domain="testserver")
+        view = ExploreCSV()
+        view.setup(request)
+
+        query = view.query()
+        sql = str(query.query)
+        self.assertEqual(sql.count("EXISTS"), 3)
+        self.assertNotIn("DISTINCT", sql)
+        self.assertEqual(
+            list(query.values_list("name", flat=True)), ["South Borsetshire"]
+        )
+
+    def test_explore_area_matrix(self):
+        area_type = AreaType.objects.get(code="WMC")
+        AreaMatrix.refresh(area_type)
+        area_type.refresh_from_db()
+
+        self.assertTrue(area_type.matrix_is_current)
+        self.assertIn("wind_support", area_type.matrix_data_types)
+        self.assertEqual(
+            AreaMatrix.objects.get(area__name="South Borsetshire").data["wind_support"],
+            70.0,
+        )
+        self.assertEqual(AreaMatrix.objects.get(area__name="Borsetshire West").data, {})
+
+        url = reverse("explore_csv")
+        response = self.client.get(url + "?wind_support__gt=60&fuel_poverty__lt=20")
+        self.assertContains(response, "South Borsetshire")
+        self.assertNotContains(response, "Borsetshire West")
+
+        response = self.client.get(url + "?wind_support__gt=80")
+        self.assertNotContains(response, "South Borsetshire")
+
+        # areas with no data are not removed by negated filters
+        response = self.client.get(reverse("explore_json") + "?wind_support__not_gt=60")
+        self.assertNotContains(response, "South Borsetshire")
+        self.assertContains(response, "Borsetshire West")
+        self.assertContains(response, "Borsetshire East")
+
+    def test_explore_area_matrix_columns(self):
+        area_type = AreaType.objects.get(code="WMC")
+        AreaMatrix.refresh(area_type)
+
+        # columns are read from the matrix while it's up to date
+        AreaData.objects.filter(data_type__name="wind_support").update(float=10)
+        url = reverse("explore_csv")
+        response = self.client.get(url + "?columns=wind_support,fuel_poverty")
+        self.assertContains(response, "South Borsetshire,70.0,12.4321")
+
+    def test_area_matrix_refresh_data_types(self):
+        area_type = AreaType.objects.get(code="WMC")
+        AreaMatrix.refresh(area_type)
+        wind_support = DataType.objects.get(name="wind_support")
+        fuel_poverty = DataType.objects.get(name="fuel_poverty")
+        AreaData.objects.filter(data_type=wind_support).update(float=10)
+        AreaData.objects.filter(data_type=fuel_poverty).update(float=1)
+
+        # only the columns for the data types are rebuilt
+        wind_support.save()
+        AreaMatrix.refresh(area_type, [wind_support])
+        data = AreaMatrix.objects.get(area__name="South Borsetshire").data
+        self.assertEqual(data["wind_support"], 10.0)
+        self.assertEqual(data["fuel_poverty"], 12.4321)
+        self.assertTrue(area_type.matrix_is_current)
+
+        # unless the rest of the matrix is out of date too
+        fuel_poverty.save()
+        AreaMatrix.refresh(area_type, [wind_support])
+        data = AreaMatrix.objects.get(area__name="South Borsetshire").data
+        self.assertEqual(data["fuel_poverty"], 1.0)
+
+    def test_explore_area_matrix_out_of_date(self):
+        area_type = AreaType.objects.get(code="WMC")
+        AreaMatrix.refresh(area_type)
+        area_type.refresh_from_db()
+
+        # updated data is not in the matrix so fall back to filtering AreaData
+        area = Area.objects.get(name="Borsetshire West")
+        area.areadata_set.create(
+            data_type=DataType.objects.get(name="wind_support"), data="90"
+        )
+        DataType.objects.get(name="wind_support").update_max_min()
+        self.assertFalse(area_type.matrix_is_current)
+
+        url = reverse("explore_csv")
+        response = self.client.get(url + "?wind_support__gt=80")
+        self.assertNotContains(response, "South Borsetshire")
+        self.assertContains(response, "Borsetshire West")
+
+
+class TestExploreGeometry(TestCase):
+    fixtures = ["sites.json", "areas.json", "areas_23.json"]
+    geometry_root = BASE_DIR / "geometry"
+
+    def tearDown(self):
+        if self.geometry_root.exists():
+            shutil.rmtree(self.geometry_root)
+
+    def test_cached_geometry(self):
+        with self.settings(GEOMETRY_CACHE_ROOT=self.geometry_root):
+            build_geometry_cache(AreaType.objects.get(code="WMC"))
+            url = reverse("exploregeometry_cached_json", args=["WMC"])
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertTrue((self.geometry_root / "WMC-full.json.gz").exists())
+
+            uncached = self.client.get(
+                reverse("exploregeometry_json") + "?area_type=WMC"
+            )
+            self.assertEqual(gzip.decompress(response.content), uncached.content)
+            features = json.loads(uncached.content)["features"]
+            self.assertEqual(len(features), 3)
+
+            response = self.client.get(url)
+            self.assertNotIn("Content-Encoding", response)
+            self.assertEqual(response.content, uncached.content)
+
+    def test_cached_geometry_etag(self):
+        with self.settings(GEOMETRY_CACHE_ROOT=self.geometry_root):
+            build_geometry_cache(AreaType.objects.get(code="WMC"))
+            url = reverse("exploregeometry_cached_json", args=["WMC"])
+            response = self.client.get(url)
+            etag = response["ETag"]
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            # the gzipped body has its own ETag
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING="gzip"
+            )
+            self.assertEqual(response.status_code, 200)
+            gzip_etag = response["ETag"]
+            self.assertNotEqual(gzip_etag, etag)
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=gzip_etag, HTTP_ACCEPT_ENCODING="gzip"
+            )
+            self.assertEqual(response.status_code, 304)
+
+            Area.objects.filter(name="Borsetshire East").update(geometry=None)
+            build_geometry_cache(AreaType.objects.get(code="WMC"))
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(json.loads(response.content)["features"]), 2)
+
+    def test_geometry_not_built(self):
+        with self.settings(GEOMETRY_CACHE_ROOT=self.geometry_root):
+            # the full GeoJSON comes from the database, without building the
+            # cache in the request
+            url = reverse("exploregeometry_cached_json", args=["WMC"])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(json.loads(response.content)["features"]), 3)
+            self.assertFalse(self.geometry_root.exists())
+
+            response = self.client.get(url + "?format=topojson")
+            self.assertEqual(response.status_code, 404)
+
+    def test_geometry_with_shader_not_cached(self):
+        with self.settings(GEOMETRY_CACHE_ROOT=self.geometry_root):
+            url = reverse("exploregeometry_cached_json", args=["WMC"])
+            response = self.client.get(url + "?shader=party")
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(self.geometry_root.exists())
+
+    def set_square_geometry(self, name, x, y):
+        ring = [[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]
+        if name == "South Borsetshire":
+            # an extra point half way along the edge shared with the area
+            # to the east, so there is something to simplify away
+            ring.insert(2, [x + 1, y + 0.5])
+        elif name == "Borsetshire West":
+            ring.insert(4, [x, y + 0.5])
+        geometry = {
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {"name": name},
+        }
+        Area.objects.filter(name=name, area_type__code="WMC").update(
+            geometry=json.dumps(geometry)
+        )
+
+    def test_topojson_geometry(self):
+        self.set_square_geometry("South Borsetshire", 0, 0)
+        self.set_square_geometry("Borsetshire West", 1, 0)
+        self.set_square_geometry("Borsetshire East", 0, 1)
+
+        with self.settings(GEOMETRY_CACHE_ROOT=self.geometry_root):
+            build_geometry_cache(AreaType.objects.get(code="WMC"))
+            url = reverse("exploregeometry_cached_json", args=["WMC"])
+            response = self.client.get(url + "?format=topojson")
+            self.assertEqual(response.status_code, 200)
+            topology = json.loads(response.content)
+
+            self.assertEqual(topology["type"], "Topology")
+            geometries = topology["objects"]["WMC"]["geometries"]
+            self.assertEqual(
+                [g["properties"]["name"] for g in geometries],
+                ["South Borsetshire", "Borsetshire West", "Borsetshire East"],
+            )
+            # the two shared edges are only stored once
+            self.assertEqual(len(topology["arcs"]), 5)
+            self.assertTrue(any(arc < 0 for arc in geometries[1]["arcs"][0]))
+
+            response = self.client.get(url + "?detail=low")
+            features = json.loads(response.content)["features"]
+            self.assertEqual(len(features[0]["geometry"]["coordinates"][0]), 5)
+            self.assertEqual(len(features[1]["geometry"]["coordinates"][0]), 5)
+            self.assertNotIn([1, 0.5], features[0]["geometry"]["coordinates"][0])
+            self.assertNotIn([1, 0.5], features[1]["geometry"]["coordinates"][0])
+
 
 class TestAreaPage(TestCase):
     fixtures = [
@@ -323,6 +680,11 @@ class TestAreaPage(TestCase):
         "area_data.json",
     ]
 
+    @classmethod
+    def setUpTestData(cls):
+        # profiles are built by the importers, which the fixtures stand in for
+        Person.update_profiles()
+
     def setUp(self):
         self.u = User.objects.create(username="user@example.com")
         self.client.force_login(self.u)
@@ -386,6 +748,54 @@ class TestAreaPage(TestCase):
         self.assertEqual(len(support["data"]), 2)
         self.assertEqual(support["data"][0].value(), 75)
 
+    def test_area_page_opinion_range_order(self):
+        DataSet.objects.filter(name="constituency_polling_data").update(is_range=True)
+        DataType.objects.filter(name="wind_support").update(
+            order=1, label="A wind support"
+        )
+
+        # ranges are in name order, even for opinion data
+        url = reverse("area", args=("WMC", "South Borsetshire"))
+        response = self.client.get(url)
+        support = response.context["categories"]["opinion"][0]
+        self.assertEqual(
+            [datum.data_type.name for datum in support["data"]],
+            ["solar_support", "wind_support"],
+        )
+
+    def test_area_page_query_count(self):
+        url = reverse("area", args=("WMC", "South Borsetshire"))
+        # the first request caches the site so isn't representative
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        # more data sets shouldn't mean more queries
+        area = Area.objects.get(name="South Borsetshire")
+        site = Site.objects.get(pk=1)
+        for i in range(3):
+            ds = DataSet.objects.create(
+                name=f"extra_data_set_{i}",
+                data_type="integer",
+                table="areadata",
+                category="place",
+                is_public=True,
+            )
+            ds.areas_available.add(area.area_type)
+            SiteDataSet.objects.create(dataset=ds, site=site)
+            dt = DataType.objects.create(
+                data_set=ds,
+                name=f"extra_data_type_{i}",
+                data_type="integer",
+                area_type=area.area_type,
+            )
+            AreaData.objects.create(area=area, data_type=dt, int=i)
+
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["categories"]["place"]), 5)
+
     def test_area_page_no_mp(self):
         url = reverse("area", args=("WMC", "Borsetshire East"))
         response = self.client.get(url)
@@ -1,19 +1,17 @@
 import pandas as pd
-from mysoc_dataset import get_dataset_df
-from tqdm import tqdm
 
-from hub.models import Area, AreaData, AreaOverlap, AreaType, DataType
-from utils.constituency_mapping import convert_data_geographies
+from hub.downloads import fetch_dataset_df
+from hub.models import Area, AreaData, AreaType, DataType
+from hub.overlaps import OverlapMatrix, get_overlap_matrix
 
 
 class DataTypeConverter:
     def fetch_parl25_gss_map(self):
-        df = get_dataset_df(
+        df = fetch_dataset_df(
             repo_name="2025-constituencies",
             package_name="parliament_con_2025",
             version_name="latest",
             file_name="parl_constituencies_2025.csv",
-            done_survey=True,
         )
         return df.set_index("short_code").gss_code.to_dict()
 
@@ -30,30 +28,49 @@ class DataTypeConverter:
         )
         return df
 
-    def get_df_from_datatype(self, dt):
-        if dt.data_set.table == "areadata":
-            data = AreaData.objects.filter(
-                data_type=dt, area__area_type=self.old_con_at
-            )
+    def get_input_code(self, gss):
+        return gss
 
-        data_list = []
-        for d in data:
-            data_list.append([d.area.gss, d.value()])
+    def get_values_df(self, dts, **filters):
+        """
+        the values of all of dts in one query, with a column for each data
+        type indexed by the GSS code of the area
+        """
+        data = AreaData.objects.filter(data_type__in=dts, **filters).values_list(
+            "area__gss", "data_type_id", "int", "float", "data"
+        )
+        df = pd.DataFrame(
+            list(data), columns=["gss", "data_type", "int", "float", "data"]
+        )
+        value_cols = df["data_type"].map({dt.pk: dt.value_col for dt in dts})
+        # the same as AreaData.value(), where missing numbers are 0
+        df["value"] = pd.to_numeric(df["data"], errors="coerce")
+        df.loc[value_cols == "int", "value"] = df["int"].fillna(0)
+        df.loc[value_cols == "float", "value"] = df["float"].fillna(0)
+
+        return df.drop_duplicates(["gss", "data_type"], keep="last").pivot(
+            index="gss", columns="data_type", values="value"
+        )
 
-        df = pd.DataFrame(data_list)
-        df.columns = [self.input_geo, "value"]
+    def get_df_from_datatypes(self, dts):
+        """
+        the values of all of dts, indexed by the code of the area in the input
+        geography
+        """
+        df = self.get_values_df(dts, area__area_type=self.old_con_at)
+        df.index = df.index.map(self.get_input_code)
+        df.index.name = self.input_geo
+        return df[df.index.notna()]
 
-        return df
+    def get_input_values_type(self, dt):
+        if dt.data_set.unit_type != "percentage":
+            return "absolute"
+        return "percentage"
 
     def delete_old_data(self, dt):
         AreaData.objects.filter(data_type=dt).delete()
 
-    def get_area_type(self, gss_code):
-        a = Area.objects.get(gss=gss_code, area_type=self.new_con_at)
-
-        return a
-
-    def create_data_for_new_con(self, old_dt, df):
+    def get_new_datatype(self, old_dt):
         try:
             dt = DataType.objects.get(
                 name=old_dt.name, data_set=old_dt.data_set, area_type=self.new_con_at
@@ -70,42 +87,80 @@ class DataTypeConverter:
         dt.auto_converted = True
         dt.save()
 
+        return dt
+
+    def save_values(self, dt, values):
+        """
+        write values, keyed by the GSS code of the area in the new area type,
+        in one bulk upsert, skipping codes without an area
+        """
+        area_ids = dict(
+            Area.objects.filter(area_type=self.new_con_at).values_list("gss", "id")
+        )
+        value_col = dt.value_col
+        AreaData.objects.bulk_create(
+            [
+                AreaData(area_id=area_ids[gss], data_type=dt, **{value_col: value})
+                for gss, value in values.items()
+                if gss in area_ids
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["area", "data_type"],
+            update_fields=[value_col],
+        )
+
+    def create_data_for_new_con(self, old_dt, df):
+        dt = self.get_new_datatype(old_dt)
+
         if self.delete_old:
             self.delete_old_data(dt)
 
-        value_col = dt.value_col
-        for _, row in tqdm(df.iterrows(), disable=self._quiet, total=df.shape[0]):
-            a = self.get_area_type(row[self.export_geo])
-            if a is None:
-                continue
-            AreaData.objects.update_or_create(
-                area=a,
-                data_type=dt,
-                defaults={
-                    value_col: row["value"],
-                },
-            )
+        self.save_values(dt, df.set_index(self.export_geo)["value"])
         dt.data_set.areas_available.add(self.new_con_at)
-        dt.update_average()
-        dt.update_max_min()
+        DataType.update_stats([dt])
 
-    def convert_datatype_to_new_geography(self, dt, delete_old=False, quiet=True):
+    def convert_datatypes_to_new_geography(self, dts, delete_old=False, quiet=True):
+        """
+        convert all of dts at once, with one matrix multiply for the data
+        types with percentages and one for those with absolute values
+        """
         self.delete_old = delete_old
         self._quiet = quiet
 
-        df = self.get_df_from_datatype(dt)
-        input_values_type = "percentage"
-        if dt.data_set.unit_type != "percentage":
-            input_values_type = "absolute"
+        df = self.get_df_from_datatypes(dts)
+        for input_values_type in ["percentage", "absolute"]:
+            group = [
+                dt
+                for dt in dts
+                if dt.pk in df.columns
+                and self.get_input_values_type(dt) == input_values_type
+            ]
+            if not group:
+                continue
+
+            matrix = get_overlap_matrix(
+                self.input_geo, self.export_geo, "population", input_values_type
+            )
+            converted = matrix.convert(
+                df[[dt.pk for dt in group]],
+                average=input_values_type == "percentage",
+            )
+            for dt in group:
+                new_df = (
+                    converted[dt.pk]
+                    .dropna()
+                    .rename("value")
+                    .rename_axis(self.export_geo)
+                    .reset_index()
+                )
+                new_df = self.apply_parl25_gss_to_df(new_df)
+                self.create_data_for_new_con(dt, new_df)
 
-        new_df = convert_data_geographies(
-            df=df,
-            input_geography=self.input_geo,
-            output_geography=self.export_geo,
-            input_values_type=input_values_type,
+    def convert_datatype_to_new_geography(self, dt, delete_old=False, quiet=True):
+        self.convert_datatypes_to_new_geography(
+            [dt], delete_old=delete_old, quiet=quiet
         )
-        new_df = self.apply_parl25_gss_to_df(new_df)
-        self.create_data_for_new_con(dt, new_df)
 
     @property
     def old_area_type(self):
@@ -114,12 +169,11 @@ class DataTypeConverter:
 
 class WMCToDISDataTypeConverter(DataTypeConverter):
     def fetch_parl25_gss_map(self):
-        df = get_dataset_df(
+        df = fetch_dataset_df(
             repo_name="2025-constituencies",
             package_name="parliament_con_2025",
             version_name="latest",
             file_name="parl_constituencies_2025.csv",
-            done_survey=True,
         )
         return df.set_index("gss_code").short_code.to_dict()
 
@@ -130,21 +184,8 @@ class WMCToDISDataTypeConverter(DataTypeConverter):
         self.export_geo = "LAD23"
         self.parl25_gss_map = self.fetch_parl25_gss_map()
 
-    def get_area_type(self, gss_code):
-        try:
-            a = Area.objects.get(gss=gss_code, area_type__code="DIS")
-        except Area.DoesNotExist:
-            return None
-
-        return a
-
-    def get_df_from_datatype(self, dt):
-        df = super().get_df_from_datatype(dt)
-
-        df["PARL25"] = df["PARL25"].apply(
-            lambda name: self.parl25_gss_map.get(name, None)
-        )
-        return df
+    def get_input_code(self, gss):
+        return self.parl25_gss_map.get(gss, None)
 
     def apply_parl25_gss_to_df(self, df):
         return df
@@ -158,14 +199,6 @@ class WMCToSTCDataTypeConverter(WMCToDISDataTypeConverter):
         self.export_geo = "LAD23"
         self.parl25_gss_map = self.fetch_parl25_gss_map()
 
-    def get_area_type(self, gss_code):
-        try:
-            a = Area.objects.get(gss=gss_code, area_type__code="STC")
-        except Area.DoesNotExist:
-            return None
-
-        return a
-
 
 class CouncilToPFADataTypeConverter(DataTypeConverter):
     """Converts data from local authority areas (DIS/STC) to policing areas (PFA)"""
@@ -175,35 +208,22 @@ class CouncilToPFADataTypeConverter(DataTypeConverter):
         self.old_con_at = None  # We accept both DIS and STC
         self.source_area_types = ["DIS", "STC"]
 
-    def get_df_from_datatype(self, dt):
-        """Extract existing data from a DataType as a DataFrame"""
-        data_list = []
-        for area_data in AreaData.objects.filter(
-            data_type=dt, area__area_type__code__in=self.source_area_types
-        ):
-            data_list.append([area_data.area.gss, area_data.value()])
-
-        df = pd.DataFrame(data_list, columns=["gss", "value"])
-        return df
-
-    def get_area_type(self, gss_code):
-        """Get PFA area by GSS code"""
-        try:
-            return Area.objects.get(gss=gss_code, area_type__code="PFA")
-        except Area.DoesNotExist:
-            return None
+    def get_df_from_datatypes(self, dts):
+        """Extract existing data from DataTypes as a DataFrame indexed by GSS code"""
+        return self.get_values_df(dts, area__area_type__code__in=self.source_area_types)
 
-    def convert_datatype_to_new_geography(
-        self, dt, delete_old=False, quiet=True, method="average"
+    def convert_datatypes_to_new_geography(
+        self, dts, delete_old=False, quiet=True, method="average"
     ):
         """
-        Convert a DataType from local authority level to policing area level.
+        Convert DataTypes from local authority level to policing area level.
         Uses AreaOverlap relationships to aggregate data, rather than the CSV
-        file that convert_data_geographies() would use.
+        file that convert_data_geographies() would use, converting all the
+        DataTypes with one matrix multiply.
 
         Args:
-            dt: DataType to convert
-            delete_old: Whether to delete existing PFA data for this DataType
+            dts: DataTypes to convert
+            delete_old: Whether to delete existing PFA data for the DataTypes
             quiet: Suppress progress output
             method: Aggregation method - "average" for weighted average, "sum" for total
         """
@@ -211,82 +231,39 @@ class CouncilToPFADataTypeConverter(DataTypeConverter):
         self._quiet = quiet
 
         # Get source data
-        df = self.get_df_from_datatype(dt)
-        if df.empty:
-            if not quiet:
-                print(f"No data found for {dt.name}")
-            return
-
-        # Create or get the PFA version of this DataType
-        try:
-            new_dt = DataType.objects.get(
-                name=dt.name, data_set=dt.data_set, area_type=self.new_con_at
-            )
-        except DataType.DoesNotExist:
-            new_dt = DataType.objects.get(pk=dt.id)
-            new_dt.pk = None
-            new_dt._state.adding = True
-            new_dt.area_type = self.new_con_at
-            new_dt.save()
+        df = self.get_df_from_datatypes(dts)
+
+        # Aggregate data to PFA level using AreaOverlap, weighting averages by
+        # the share of each LA's population in the PFA
+        matrix = OverlapMatrix.from_area_overlaps(
+            self.source_area_types,
+            self.new_con_at,
+            overlap_measure=None if method == "sum" else "population",
+        )
+        converted = matrix.convert(df, average=method != "sum")
 
-        new_dt.auto_converted = True
-        new_dt.save()
+        for dt in dts:
+            if dt.pk not in df.columns:
+                if not quiet:
+                    print(f"No data found for {dt.name}")
+                continue
 
-        if self.delete_old:
-            self.delete_old_data(new_dt)
+            # Create or get the PFA version of this DataType
+            new_dt = self.get_new_datatype(dt)
 
-        # Aggregate data to PFA level using AreaOverlap
-        pfa_data = {}
-        for _, row in df.iterrows():
-            la_gss = row["gss"]
-            value = row["value"]
+            if self.delete_old:
+                self.delete_old_data(new_dt)
 
-            # Find which PFA(s) this LA belongs to
-            overlaps = AreaOverlap.objects.filter(
-                area_from__gss=la_gss, area_to__area_type=self.new_con_at
-            )
+            # Save aggregated data
+            self.save_values(new_dt, converted[dt.pk].dropna())
 
-            for overlap in overlaps:
-                pfa_area = overlap.area_to
-
-                if pfa_area.gss not in pfa_data:
-                    pfa_data[pfa_area.gss] = {
-                        "area": pfa_area,
-                        "sum": 0,
-                        "weighted_sum": 0,
-                        "weight_total": 0,
-                    }
-
-                if method == "sum":
-                    # For raw counts, just sum them up
-                    pfa_data[pfa_area.gss]["sum"] += value
-                else:
-                    # For percentages/averages, do weighted average
-                    weight = overlap.population_overlap / 100.0
-                    pfa_data[pfa_area.gss]["weighted_sum"] += value * weight
-                    pfa_data[pfa_area.gss]["weight_total"] += weight
-
-        # Save aggregated data
-        value_col = new_dt.value_col
-        for pfa_gss, data in tqdm(
-            pfa_data.items(), disable=self._quiet, total=len(pfa_data)
-        ):
-            if method == "sum":
-                aggregated_value = data["sum"]
-            else:
-                # Calculate weighted average
-                if data["weight_total"] > 0:
-                    aggregated_value = data["weighted_sum"] / data["weight_total"]
-                else:
-                    aggregated_value = data["weighted_sum"]
-
-            AreaData.objects.update_or_create(
-                area=data["area"],
-                data_type=new_dt,
-                defaults={value_col: aggregated_value},
-            )
+            # Update dataset metadata
+            new_dt.data_set.areas_available.add(self.new_con_at)
+            DataType.update_stats([new_dt])
 
-        # Update dataset metadata
-        new_dt.data_set.areas_available.add(self.new_con_at)
-        new_dt.update_average()
-        new_dt.update_max_min()
+    def convert_datatype_to_new_geography(
+        self, dt, delete_old=False, quiet=True, method="average"
+    ):
+        self.convert_datatypes_to_new_geography(
+            [dt], delete_old=delete_old, quiet=quiet, method=method
+        )
@@ -1,7 +1,7 @@
 from collections import defaultdict
 
 from django.conf import settings
-from django.db.models import Count, Q
+from django.db.models import Case, Count, F, When
 from django.http import Http404, HttpResponsePermanentRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.utils.text import slugify
@@ -16,9 +16,10 @@ from hub.models import (
     DataSet,
     DataType,
     Person,
-    PersonData,
     UserDataSets,
 )
+from hub.postcodes import get_postcode_index
+from hub.spatial import AreaLookup
 from utils import is_valid_postcode
 from utils.mapit import (
     BadRequestException,
@@ -109,17 +110,45 @@ class BaseAreaView(TitleMixin, DetailView):
     def get_auto_convered_datasets(self):
         auto_converted = {}
 
-        for ds in DataType.objects.filter(area_type=self.object.area_type):
+        for ds in DataType.objects.filter(
+            area_type=self.object.area_type
+        ).select_related("area_type"):
             auto_converted[ds.data_set_id] = ds.auto_conversion_disclaimer
 
         return auto_converted
 
-    def process_dataset(self, data_set, favs, auto_converted):
-        base_qs = AreaData.objects.filter(
-            area=self.object,
-            data_type__data_set=data_set,
-            data_type__area_type=self.object.area_type,
+    def get_area_data(self):
+        """
+        all of the area's data, in one query, as lists of AreaData keyed by
+        data set id. Each list is in the order process_dataset shows it in,
+        with opinion data sets that aren't ranges ordered by label rather
+        than name
+        """
+        area_data = defaultdict(list)
+        data = (
+            AreaData.objects.filter(
+                area=self.object,
+                data_type__area_type=self.object.area_type,
+            )
+            .select_related("data_type")
+            .order_by(
+                "data_type__order",
+                Case(
+                    When(
+                        data_type__data_set__category="opinion",
+                        data_type__data_set__is_range=False,
+                        then=F("data_type__label"),
+                    ),
+                    default=F("data_type__name"),
+                ),
+            )
         )
+        for datum in data:
+            area_data[datum.data_type.data_set_id].append(datum)
+
+        return area_data
+
+    def process_dataset(self, data_set, favs, auto_converted, area_data):
         data = {
             "name": str(data_set),
             "db_name": data_set.name,
@@ -138,27 +167,14 @@ class BaseAreaView(TitleMixin, DetailView):
             "is_favourite": favs.get(data_set.id, False),
             "is_public": data_set.is_public,
         }
+        data_range = area_data.get(data_set.id, [])
         if data_set.is_range:
             data["is_range"] = True
-            data_range = base_qs.select_related("data_type").order_by(
-                "data_type__order", "data_type__name"
-            )
-
-            d = data_range.all()
-            if len(d) == 0:
-                d = None
-
-            data["data"] = d
+            data["data"] = data_range or None
         elif data_set.category == "opinion":
-            data_range = base_qs.select_related("data_type").order_by(
-                "data_type__order", "data_type__label"
-            )
-
-            data["data"] = data_range.all()
-        else:
-            area_data = base_qs.select_related("data_type")
-            if area_data:
-                data["data"] = area_data[0]
+            data["data"] = data_range
+        elif data_range:
+            data["data"] = data_range[0]
 
         return data
 
@@ -239,38 +255,17 @@ class AreaView(CobrandTemplateMixin, BaseAreaView):
             }
 
             context["no_mp"] = False
-            data = PersonData.objects.filter(
-                data_type__data_set__visible=True,
-                person=context["mp"]["person"],
-                data_type__data_set__sites=site,
-                data_type__data_set__sitedataset__enabled=True,
-            ).select_related("data_type")
-
-            area_type_q = Q(data_type__area_type=area_type) | Q(
-                data_type__area_type__isnull=True
+            data = context["mp"]["person"].profile_data(
+                site=site, area_type=area_type, is_non_member=is_non_member
             )
-
-            data = data.filter(area_type_q)
-            if is_non_member:
-                data = data.exclude(data_type__data_set__is_public=False)
-            for item in data.all():
-                if (
-                    item.data_type.name == "select_committee_membership"
-                    and "select_committee_memberships" not in context["mp"]
-                ):
-                    context["mp"]["select_committee_memberships"] = [
-                        datum["data"]
-                        for datum in PersonData.objects.filter(
-                            person=context["mp"]["person"]
-                        )
-                        .filter(data_type__name="select_committee_membership")
-                        .values()
-                    ]
+            for item in data:
+                if item["name"] == "select_committee_membership":
+                    context["mp"].setdefault("select_committee_memberships", [])
+                    context["mp"]["select_committee_memberships"].append(item["value"])
                 else:
-                    context["mp"][item.data_type.name] = item.value()
+                    context["mp"][item["name"]] = item["value"]
             context["mp"]["appg_memberships"] = [
-                item.value()
-                for item in data.filter(data_type__name="mp_appg_memberships")
+                item["value"] for item in data if item["name"] == "mp_appg_memberships"
             ]
 
             bill_map = {
@@ -278,44 +273,38 @@ class AreaView(CobrandTemplateMixin, BaseAreaView):
                 "1116": "2021-10-20c.869.2",
             }
 
-            votes = data.filter(data_type__data_set__subcategory="vote")
-            if is_non_member:
-                votes = votes.exclude(data_type__data_set__is_public=False)
             context["mp"]["votes"] = [
                 {
-                    "name": item.data_type.data_set.label,
-                    "vote": item.value(),
-                    "url": f"https://www.theyworkforyou.com/debates/?id={bill_map[item.data_type.name.split('_')[0]]}",
+                    "name": item["label"],
+                    "vote": item["value"],
+                    "url": f"https://www.theyworkforyou.com/debates/?id={bill_map[item['name'].split('_')[0]]}",
                 }
-                for item in votes
+                for item in data
+                if item["subcategory"] == "vote"
             ]
 
-            stances = data.filter(data_type__data_set__subcategory="stance")
-            if is_non_member:
-                stances = stances.exclude(data_type__data_set__is_public=False)
             context["mp"]["stances"] = [
                 {
-                    "name": item.data_type.data_set.label,
-                    "vote": item.value(),
+                    "name": item["label"],
+                    "vote": item["value"],
                     "url": "https://www.theyworkforyou.com/",
                 }
-                for item in stances
+                for item in data
+                if item["subcategory"] == "stance"
             ]
 
-            support = data.filter(data_type__data_set__subcategory="supporter")
-            if is_non_member:
-                support = support.exclude(data_type__data_set__is_public=False)
             context["mp"]["support"] = [
                 {
-                    "name": item.data_type.data_set.label,
-                    "position": item.value(),
-                    "url": f"https://edm.parliament.uk/early-day-motion/{item.data_type.name.split('_')[0]}",
+                    "name": item["label"],
+                    "position": item["value"],
+                    "url": f"https://edm.parliament.uk/early-day-motion/{item['name'].split('_')[0]}",
                 }
-                for item in support
+                for item in data
+                if item["subcategory"] == "supporter"
             ]
-            wrans = data.filter(data_type__name="mp_wrans")
-            if wrans.count() > 0:
-                context["mp"]["wrans"] = wrans.first().value()
+            wrans = [item["value"] for item in data if item["name"] == "mp_wrans"]
+            if wrans:
+                context["mp"]["wrans"] = wrans[0]
 
         except Person.DoesNotExist:
             context["no_mp"] = True
@@ -328,27 +317,25 @@ class AreaView(CobrandTemplateMixin, BaseAreaView):
                 .order_by("-end_date")
                 .first()
             }
-            data = PersonData.objects.filter(
-                person=context["mp"]["person"],
-                data_type__name__in=[
-                    "party",
-                    "last_election",
-                    "second_party",
-                    "mp_last_elected",
-                    "mp_first_elected",
-                    "mp_election_majority",
-                    "parlid",
-                    "twfyid",
-                    "wikipedia",
-                    "mp_email",
-                    "mp_phone",
-                ],
-            ).select_related("data_type")
-
-            if is_non_member:
-                data = data.exclude(data_type__data_set__is_public=False)
-            for item in data.all():
-                context["mp"][item.data_type.name] = item.value()
+            names = [
+                "party",
+                "last_election",
+                "second_party",
+                "mp_last_elected",
+                "mp_first_elected",
+                "mp_election_majority",
+                "parlid",
+                "twfyid",
+                "wikipedia",
+                "mp_email",
+                "mp_phone",
+            ]
+            if context["mp"]["person"] is not None:
+                for item in context["mp"]["person"].profile_data(
+                    is_non_member=is_non_member
+                ):
+                    if item["name"] in names:
+                        context["mp"][item["name"]] = item["value"]
 
         if area_type.code == "PFA":
             try:
@@ -360,19 +347,11 @@ class AreaView(CobrandTemplateMixin, BaseAreaView):
                     )
                 }
 
-                data = PersonData.objects.filter(
-                    person=context["pcc"]["person"],
-                    data_type__name__in=[
-                        "pcc_last_elected",
-                        "pcc_election_majority",
-                    ],
-                ).select_related("data_type")
-
-                if is_non_member:
-                    data = data.exclude(data_type__data_set__is_public=False)
-
-                for item in data.all():
-                    context["pcc"][item.data_type.name] = item.value()
+                for item in context["pcc"]["person"].profile_data(
+                    is_non_member=is_non_member
+                ):
+                    if item["name"] in ["pcc_last_elected", "pcc_election_majority"]:
+                        context["pcc"][item["name"]] = item["value"]
 
             except Person.DoesNotExist:
                 context["no_pcc"] = True
@@ -391,8 +370,9 @@ class AreaView(CobrandTemplateMixin, BaseAreaView):
         if is_non_member:
             data_sets = data_sets.exclude(is_public=False)
 
+        area_data = self.get_area_data()
         for data_set in data_sets:
-            data = self.process_dataset(data_set, favs, auto_converted)
+            data = self.process_dataset(data_set, favs, auto_converted, area_data)
 
             if data.get("data", None) is not None and data["data"]:
                 if data_set.category is not None:
@@ -492,6 +472,34 @@ class AreaSearchView(CobrandTemplateMixin, TemplateView):
 
         return super().render_to_response(context)
 
+    def point_to_gss_codes(self, lon, lat):
+        # policing areas aren't in MapIt so are found from the local
+        # authorities, as for postcodes
+        codes = {*settings.AREA_SEARCH_AREA_CODES, "STC", "DIS"} - {"PFA"}
+        lookup = AreaLookup(sorted(codes))
+        if lookup.is_available:
+            try:
+                lon, lat = float(lon), float(lat)
+            except ValueError:
+                raise BadRequestException("Bad location")
+            return list(lookup.point_to_gss_codes(lon, lat).values())
+
+        return MapIt().wgs84_point_to_gss_codes(lon, lat)
+
+    def postcode_to_gss_codes(self, pc, area_type=None):
+        codes = get_postcode_index().lookup(pc)
+        # only fall back to MapIt for postcodes that aren't in the index
+        if codes is not None and (area_type is None or area_type in codes):
+            if area_type:
+                return [codes[area_type]]
+            return list(codes.values())
+
+        mapit = MapIt()
+        if area_type:
+            gss_codes = mapit.postcode_point_to_gss_codes_with_type(pc)
+            return [gss_codes[mapit.type_map.get(area_type, area_type)]]
+        return mapit.postcode_point_to_gss_codes(pc)
+
     def get_areas_from_mapit(self, **kwargs):
         areas = None
         err = None
@@ -499,18 +507,12 @@ class AreaSearchView(CobrandTemplateMixin, TemplateView):
         site = self.request.site
 
         try:
-            mapit = MapIt()
             if kwargs.get("lon") and kwargs.get("lat"):
-                gss_codes = mapit.wgs84_point_to_gss_codes(kwargs["lon"], kwargs["lat"])
+                gss_codes = self.point_to_gss_codes(kwargs["lon"], kwargs["lat"])
             elif kwargs.get("pc"):
-                if kwargs.get("area_type"):
-                    area_type = kwargs.get("area_type")
-                    gss_codes = mapit.postcode_point_to_gss_codes_with_type(
-                        kwargs["pc"]
-                    )
-                    gss_codes = [gss_codes[mapit.type_map.get(area_type, area_type)]]
-                else:
-                    gss_codes = mapit.postcode_point_to_gss_codes(kwargs["pc"])
+                gss_codes = self.postcode_to_gss_codes(
+                    kwargs["pc"], kwargs.get("area_type")
+                )
 
             areas = Area.objects.filter(
                 gss__in=gss_codes,
@@ -534,7 +536,8 @@ class AreaSearchView(CobrandTemplateMixin, TemplateView):
                         area_type__sites=site,
                         area_type__siteareatype__enabled=True,
                     )
-                    areas.extend(list(policing_areas))
+                    # the postcode index has the policing area of postcodes
+                    areas.extend(area for area in policing_areas if area not in areas)
         except (
             NotFoundException,
             BadRequestException,
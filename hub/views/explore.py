@@ -1,14 +1,20 @@
 import csv
+import gzip
 import json
 import math
 from collections import defaultdict
 from operator import itemgetter
 
-from django.http import HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_control
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 
+from hub.geometry import DETAIL_LEVELS, FORMATS, geometry_etag, get_geometry_cache
+from hub.metadata import MAX_AGE, current_version
 from hub.mixins import CobrandTemplateMixin, FilterMixin, TitleMixin
 from hub.models import AreaType, DataSet, DataType, UserDataSets
 
@@ -49,20 +55,63 @@ class ExploreAreaTypesJSON(TemplateView):
         )
 
 
-class ExploreDatasetsJSON(TemplateView):
-    def render_to_response(self, context, **response_kwargs):
-        site = self.request.site
+class ExploreDatasetsJSON(View):
+    """serve the list of data sets that can be used on the explore page
 
-        types = (
-            DataType.objects.exclude(data_set__is_range=True)
-            .filter(data_set__sites=site, data_set__sitedataset__enabled=True)
-            .select_related(
-                "data_set",
-                "area_type",
+    The list only depends on the site and whether the user is a member, so
+    it is built once for each and kept gzipped in the cache until the
+    metadata changes. The user's favourites come from ExploreFavouritesJSON
+    so that the list can be shared.
+    """
+
+    def get(self, request, *args, **kwargs):
+        site = request.site
+        is_non_member = request.user.is_anonymous
+        tier = "public" if is_non_member else "member"
+
+        key = f"explore_datasets:{site.pk}:{tier}:{current_version()}"
+        content = cache.get(key)
+        if content is None:
+            datasets = self.get_datasets(site, is_non_member)
+            content = gzip.compress(
+                json.dumps(datasets, cls=DjangoJSONEncoder).encode("utf-8")
             )
+            cache.set(key, content, MAX_AGE)
+
+        response = HttpResponse(content_type="application/json")
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            response["Content-Encoding"] = "gzip"
+        else:
+            content = gzip.decompress(content)
+        response.content = content
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+    def get_datasets(self, site, is_non_member):
+        data_sets = list(
+            DataSet.objects.filter(
+                visible=True, sites=site, sitedataset__enabled=True
+            ).prefetch_related("areas_available")
         )
+
         type_map = defaultdict(dict)
+        range_types = defaultdict(list)
+        types = (
+            DataType.objects.filter(data_set__in=data_sets)
+            .select_related("data_set", "area_type")
+            .order_by("pk")
+        )
         for t in types:
+            if t.data_set.is_range:
+                range_types[t.data_set_id].append(
+                    {
+                        "name": t.name,
+                        "title": t.label,
+                        "area_type": t.area_type.code if t.area_type else None,
+                    }
+                )
+                continue
+
             avg = t.average
             maximum = t.maximum
             minimum = t.minimum
@@ -87,12 +136,8 @@ class ExploreDatasetsJSON(TemplateView):
 
             type_map[t.data_set.name]["stats"] = stats
 
-        is_non_member = self.request.user.is_anonymous
-
         datasets = []
-        for d in DataSet.objects.filter(
-            visible=True, sites=site, sitedataset__enabled=True
-        ):
+        for d in data_sets:
             try:
                 options = list(map(itemgetter("title"), d.options))
             # catch bad options and ignore them for now
@@ -106,13 +151,6 @@ class ExploreDatasetsJSON(TemplateView):
             if scope == "private" and is_non_member:
                 continue
 
-            is_favourite = False
-            if not is_non_member:
-                is_favourite = UserDataSets.objects.filter(
-                    data_set=d,
-                    user=self.request.user,
-                ).exists()
-
             ds = dict(
                 scope=scope,
                 name=d.name,
@@ -121,7 +159,7 @@ class ExploreDatasetsJSON(TemplateView):
                 category=d.category or "mp",
                 source=d.source,
                 source_label=d.source_label,
-                is_favourite=is_favourite,
+                is_favourite=False,
                 is_filterable=d.is_filterable,
                 is_shadable=d.is_shadable,
                 is_featured=d.featured,
@@ -145,16 +183,7 @@ class ExploreDatasetsJSON(TemplateView):
             ):
                 ds = {**ds, **type_map[d.name]}
             if d.is_range:
-                ds["types"] = [
-                    {
-                        "name": dt.name,
-                        "title": dt.label,
-                        "area_type": dt.area_type.code if dt.area_type else None,
-                    }
-                    for dt in DataType.objects.filter(data_set=d).select_related(
-                        "area_type"
-                    )
-                ]
+                ds["types"] = range_types[d.pk]
             datasets.append(ds)
 
         datasets.append(
@@ -218,7 +247,23 @@ class ExploreDatasetsJSON(TemplateView):
             }
         )
 
-        return JsonResponse(list(datasets), safe=False)
+        return datasets
+
+
+class ExploreFavouritesJSON(View):
+    """the names of the data sets the user has favourited, which the explore
+    page merges into the list from ExploreDatasetsJSON"""
+
+    def get(self, request, *args, **kwargs):
+        favourites = []
+        if not request.user.is_anonymous:
+            favourites = list(
+                UserDataSets.objects.filter(user=request.user)
+                .order_by("data_set__name")
+                .values_list("data_set__name", flat=True)
+            )
+
+        return JsonResponse(favourites, safe=False)
 
 
 class ExploreGeometryJSON(FilterMixin, TemplateView):
@@ -260,9 +305,50 @@ class ExploreGeometryCachedJSON(ExploreGeometryJSON):
     This is here entirely to allow using a second path with the area type
     as a slug in the URL rather than as a query param and hence to make
     caching a bit clearer.
+
+    Without any filters or shader the response is the same for everyone so
+    it is served from the prebuilt and gzipped copy in GEOMETRY_CACHE_ROOT,
+    at the level of detail and in the format asked for with the detail and
+    format parameters. If that hasn't been built the full GeoJSON is served
+    from the database instead.
     """
 
-    pass
+    def get(self, request, *args, **kwargs):
+        area_type = self.area_type()
+        detail = request.GET.get("detail", "full")
+        format = request.GET.get("format", "geojson")
+        if (
+            area_type is None
+            or set(request.GET.keys()) - {"detail", "format"}
+            or detail not in DETAIL_LEVELS
+            or format not in FORMATS
+        ):
+            return super().get(request, *args, **kwargs)
+
+        path = get_geometry_cache(area_type, detail, format)
+        if path is None:
+            # only the full GeoJSON can be served without the prebuilt copy
+            if detail == "full" and format == "geojson":
+                return super().get(request, *args, **kwargs)
+            raise Http404("Geometry not found")
+
+        # the gzipped and plain bodies differ, so they need different ETags
+        gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+        etag = geometry_etag(path)
+        if gzipped:
+            etag = etag[:-1] + '-gz"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content = path.read_bytes()
+            response = HttpResponse(content_type="application/json")
+            if gzipped:
+                response["Content-Encoding"] = "gzip"
+            else:
+                content = gzip.decompress(content)
+            response.content = content
+        response["ETag"] = etag
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
 
 
 class ExploreJSON(FilterMixin, TemplateView):
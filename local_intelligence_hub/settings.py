@@ -34,6 +34,7 @@ env = environ.Env(
     MAILCHIMP_TCC_LIST_ID=(str, ""),
     PARTY_CONTROL_URL=(str, ""),
     AREA_SEARCH_AREA_CODES=(list, ["DIS", "STC", "WMC23", "PFA"]),
+    DOWNLOAD_CACHE_OFFLINE=(bool, False),
 )
 environ.Env.read_env(BASE_DIR / ".env")
 
@@ -186,6 +187,16 @@ USE_TZ = True
 MEDIA_ROOT = BASE_DIR / ".media"
 MEDIA_URL = "/media/"
 
+# prebuilt area geometry served by the explore page
+GEOMETRY_CACHE_ROOT = BASE_DIR / ".geometry"
+
+# postcode to area lookup built from the ONS postcode directory
+POSTCODE_INDEX_ROOT = BASE_DIR / ".postcodes"
+
+# remote data used by the importers, which only use the stored copies if offline
+DOWNLOAD_CACHE_ROOT = BASE_DIR / ".downloads"
+DOWNLOAD_CACHE_OFFLINE = env("DOWNLOAD_CACHE_OFFLINE")
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
@@ -39,6 +39,11 @@ urlpatterns = [
         explore.ExploreDatasetsJSON.as_view(),
         name="explore_datasets_json",
     ),
+    path(
+        "explore/favourites.json",
+        explore.ExploreFavouritesJSON.as_view(),
+        name="explore_favourites_json",
+    ),
     path(
         "exploregeometry.json",
         explore.ExploreGeometryJSON.as_view(),
@@ -9,6 +9,9 @@ It has minimal dependencies beyond pandas.
 Ideally it uses parquet and pyarrow - but if this is an obstacle,
 adjust the parquet references to csv.
 
+Here the overlap files are fetched with hub.downloads so they are only
+downloaded again when they change.
+
 Note, when converting to LAD23, this is the lower level geography.
 
 Additional conversion for higher level is in convert_specific_polling.py
@@ -22,6 +25,8 @@ from typing import Literal, get_args
 
 import pandas as pd
 
+from hub.downloads import fetch_df
+
 ValidGeographies = Literal["LSOA11", "PARL10", "PARL25", "LAD23"]
 DataValues = Literal["percentage", "absolute"]
 OverlapTypes = Literal["area", "population"]
@@ -36,21 +41,29 @@ def get_dataset_url(
     return f"https://pages.mysociety.org/{repo_name}/data/{package_name}/{version_name}/{file_name}"
 
 
-def get_overlap_df(
+def get_overlap_url(
     input_geography: ValidGeographies, output_geography: ValidGeographies
-) -> pd.DataFrame:
+) -> str:
     """
-    Get a df from the mySociety repo with the percentage overlap between geographies
+    Get the url of the overlap CSV between geographies in the mySociety repo
     """
-
-    url = get_dataset_url(
+    return get_dataset_url(
         repo_name="2025-constituencies",
         package_name="geographic_overlaps",
         version_name="latest",
         file_name=f"{input_geography}_{output_geography}_combo_overlap.csv",
     )
 
-    return pd.read_csv(url)
+
+def get_overlap_df(
+    input_geography: ValidGeographies, output_geography: ValidGeographies
+) -> pd.DataFrame:
+    """
+    Get a df from the mySociety repo with the percentage overlap between geographies,
+    from the download cache if it hasn't changed
+    """
+
+    return fetch_df(get_overlap_url(input_geography, output_geography))
 
 
 def convert_data_geographies(
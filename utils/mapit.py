@@ -1,10 +1,76 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from json.decoder import JSONDecodeError
+from time import monotonic, sleep
 
 from django.conf import settings
 
+from requests.adapters import HTTPAdapter
 from requests_cache import CachedSession
 
+# the most requests that will be made to MapIt at the same time
+MAX_WORKERS = 8
+
 session = CachedSession(cache_name=settings.CACHE_FILE, expire_after=86400)
+# keep a connection open for each worker rather than reconnecting each time
+session.mount("https://", HTTPAdapter(pool_maxsize=MAX_WORKERS))
+session.mount("http://", HTTPAdapter(pool_maxsize=MAX_WORKERS))
+
+
+class RateLimiter:
+    """
+    A token bucket shared by all the threads making requests, allowing bursts
+    of up to burst requests and on average rate requests a second
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            # if there wasn't a token left wait until one will have been added,
+            # the lock is held so others queue up behind this request
+            if self.tokens < 0:
+                sleep(-self.tokens / self.rate)
+
+
+class LRUCache(OrderedDict):
+    """
+    A dict that only keeps the maxsize most recently used items
+    """
+
+    def __init__(self, maxsize=10000):
+        super().__init__()
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self:
+                return default
+            self.move_to_end(key)
+            return self[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self[key] = value
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
+
+
+rate_limiter = RateLimiter(rate=5, burst=MAX_WORKERS)
 
 
 class BaseException(Exception):
@@ -46,14 +112,20 @@ class MapIt(object):
     wgs84_url = "%s/point/4326/%s,%s?api_key=%s"
     areas_url = "%s/areas/%s?api_key=%s"
     geometry_url = "%s/area/%s.geojson?simplify_tolerance=0.001&api_key=%s"
-    cache = {}
+    cache = LRUCache()
 
     type_map = {
         "WMC23": "WMC",
     }
 
-    def __init__(self, disable_cache=False):
+    # retries of rate limited requests, waiting backoff seconds before the
+    # first and twice as long before each one after that
+    max_retries = 4
+    backoff = 2
+
+    def __init__(self, disable_cache=False, workers=MAX_WORKERS):
         self.disable_cache = disable_cache
+        self.workers = min(workers, MAX_WORKERS)
         self.base = settings.MAPIT_URL
 
     def gss_code_to_mapit_id(self, gss_code):
@@ -121,31 +193,74 @@ class MapIt(object):
         data = self.get(url)
         return data
 
-    def get(self, url):
-        data = None
-        if self.disable_cache or url not in self.cache:
-            resp = session.get(url)
+    def areas_geometry_many(self, areas):
+        """
+        the geometry of each of the areas, fetched at the same time, with the
+        exception raised in place of the geometry of areas it failed for
+        """
+        return self.get_many(self.area_geometry, [(area,) for area in areas])
+
+    def points_to_gss_many(self, points):
+        """
+        the gss codes, keyed by MapIt area type, of the areas each (lon, lat)
+        point is in, fetched at the same time, with the exception raised in
+        place of the codes of points it failed for
+        """
+        return self.get_many(self.wgs84_point_to_gss_codes_with_type, points)
+
+    def get_many(self, method, args_list):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(method, *args) for args in args_list]
+
+        results = []
+        for future in futures:
             try:
-                data = resp.json()
-            except JSONDecodeError as error:
-                data = {"error": str(error)}
-
-            if resp.status_code == 403 and resp.content == b"Rate limit exceeded":
-                raise RateLimitException("Rate limit exceeded")
-            if resp.status_code == 403:
-                raise ForbiddenException(data["error"])
-            if resp.status_code == 500:
-                raise InternalServerErrorException(data["error"])
-            if resp.status_code == 404:
-                raise NotFoundException(data["error"])
-            if resp.status_code == 400:
-                raise BadRequestException(data["error"])
-            if data.get("error", None) is not None:
-                raise BadRequestException(data["error"])
-            if not self.disable_cache:
-                self.cache[url] = data
-
-        if self.disable_cache:
+                results.append(future.result())
+            except BaseException as error:
+                results.append(error)
+
+        return results
+
+    def fetch(self, url):
+        resp = session.get(url)
+        try:
+            data = resp.json()
+        except JSONDecodeError as error:
+            data = {"error": str(error)}
+
+        if resp.status_code == 403 and resp.content == b"Rate limit exceeded":
+            raise RateLimitException("Rate limit exceeded")
+        if resp.status_code == 403:
+            raise ForbiddenException(data["error"])
+        if resp.status_code == 500:
+            raise InternalServerErrorException(data["error"])
+        if resp.status_code == 404:
+            raise NotFoundException(data["error"])
+        if resp.status_code == 400:
+            raise BadRequestException(data["error"])
+        if data.get("error", None) is not None:
+            raise BadRequestException(data["error"])
+
+        return data
+
+    def get(self, url):
+        data = None if self.disable_cache else self.cache.get(url)
+        if data is not None:
             return data
-        else:
-            return self.cache[url]
+
+        for attempt in range(self.max_retries + 1):
+            # responses cached by the session don't count towards the limit
+            if not session.cache.has_url(url):
+                rate_limiter.wait()
+            try:
+                data = self.fetch(url)
+                break
+            except RateLimitException:
+                if attempt == self.max_retries:
+                    raise
+                sleep(self.backoff * 2**attempt)
+
+        if not self.disable_cache:
+            self.cache.set(url, data)
+
+        return data
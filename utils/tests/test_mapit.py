@@ -1,4 +1,4 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from django.test import TestCase
 
@@ -6,8 +6,10 @@ from utils.mapit import (
     BadRequestException,
     ForbiddenException,
     InternalServerErrorException,
+    LRUCache,
     MapIt,
     NotFoundException,
+    RateLimitException,
 )
 
 
@@ -211,3 +213,56 @@ class TestMapitResponses(TestCase):
         mapit = MapIt(disable_cache=True)
         with self.assertRaises(InternalServerErrorException):
             mapit.mapit_id_to_touches(2440)
+
+    @patch("utils.mapit.sleep")
+    @patch("utils.mapit.session")
+    def test_rate_limit_retry(self, mapit_session, mapit_sleep):
+        limited = MagicMock(status_code=403, content=b"Rate limit exceeded")
+        found = MagicMock(status_code=200)
+        found.json.return_value = {"id": 2650}
+        mapit_session.get.side_effect = [limited, limited, found]
+
+        mapit = MapIt(disable_cache=True)
+        self.assertEqual(mapit.gss_code_to_mapit_id("S12000033"), 2650)
+        self.assertEqual(
+            [c.args[0] for c in mapit_sleep.call_args_list],
+            [MapIt.backoff, MapIt.backoff * 2],
+        )
+
+        mapit_session.get.side_effect = None
+        mapit_session.get.return_value = limited
+        with self.assertRaises(RateLimitException):
+            mapit.gss_code_to_mapit_id("S12000033")
+        self.assertEqual(mapit_session.get.call_count, 3 + MapIt.max_retries + 1)
+
+    @patch("utils.mapit.session")
+    def test_points_to_gss_many(self, mapit_session):
+        def get(url):
+            response = MagicMock(status_code=200)
+            if "/1.0,2.0" in url:
+                response.status_code = 404
+                response.json.return_value = {"error": "Point not found"}
+            else:
+                response.json.return_value = {
+                    "1": {"codes": {"gss": url.split("/")[-1][:3]}, "type": "WMC"}
+                }
+            return response
+
+        mapit_session.get.side_effect = get
+        mapit = MapIt(disable_cache=True)
+        actual = mapit.points_to_gss_many([(3.0, 4.0), (1.0, 2.0), (5.0, 6.0)])
+        self.assertEqual(actual[0], {"WMC": "3.0"})
+        self.assertIsInstance(actual[1], NotFoundException)
+        self.assertEqual(actual[2], {"WMC": "5.0"})
+
+
+class TestLRUCache(TestCase):
+    def test_bounded(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)